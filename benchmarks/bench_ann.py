@@ -0,0 +1,130 @@
+"""
+Benchmark for the local ANN index (src/tools/ann_index.py).
+
+Builds the IVF/int8 index over a corpus of vectors and, for each --nlist and
+--nprobe, reports against exact float32 search over the same vectors:
+
+- mb_per_million:  resident memory per million vectors (int8 codes, IDs,
+                   tags, centroids), next to exact search's float32 matrix
+- queries_per_s:   single queries, sequentially
+- recall@k:        share of the exact top-k the index returned
+
+The corpus is synthetic (clusters of normalized 384-dimensional vectors, shaped
+like sentence embeddings of many similar manuals) unless --npy gives a matrix
+of real embeddings. Either way --queries rows are held out as the queries.
+
+Usage: python -m benchmarks.bench_ann [--vectors 200000] [--nprobe 1 4 8 16 32] [--npy vectors.npy]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from src.tools.ann_index import IVFIndex, ID_BYTES, default_nlist, normalize
+from src.utils.embeddings import EMBEDDING_DIM
+
+DEFAULT_NPROBES = (1, 2, 4, 8, 16, 32)
+
+
+def synthetic_vectors(n: int, dim: int = EMBEDDING_DIM, seed: int = 0, spread: float = 1.2) -> np.ndarray:
+    """n normalized vectors around n / 100 random topics."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(1, n // 100), dim)).astype(np.float32)
+    return normalize(topics[rng.integers(0, len(topics), n)] + spread * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def exact_search(corpus: np.ndarray, queries: np.ndarray, k: int) -> tuple:
+    """(top-k row indices per query, queries/s) of brute-force float32 search, one query at a time."""
+    rows = []
+    start = time.perf_counter()
+    for q in queries:
+        scores = corpus @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        rows.append(top[np.argsort(-scores[top])])
+    return np.asarray(rows), len(queries) / (time.perf_counter() - start)
+
+
+def measure(index: IVFIndex, queries: np.ndarray, exact_ids: list, k: int, nprobe: int, rescore: int) -> dict:
+    latencies, recalls = [], []
+    for q, expected in zip(queries, exact_ids):
+        start = time.perf_counter()
+        found = index.search(q, k, nprobe=nprobe, rescore=rescore)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {i for i, _ in found}) / len(expected))
+    return {
+        "nprobe": nprobe,
+        "queries_per_s": len(queries) / (sum(latencies) / 1000),
+        "p50_ms": statistics.median(latencies),
+        "recall": float(np.mean(recalls)),
+    }
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, k: int = 10, nlists=None, nprobes=DEFAULT_NPROBES,
+        rescore: int = 4) -> dict:
+    corpus, queries = normalize(corpus), normalize(queries)
+    ids = [f"v{i}" for i in range(len(corpus))]
+    exact_rows, exact_qps = exact_search(corpus, queries, k)
+    exact_ids = [{ids[r] for r in rows} for rows in exact_rows]
+    report = {
+        "vectors": len(corpus),
+        "dim": corpus.shape[1],
+        "queries": len(queries),
+        "k": k,
+        "exact": {
+            "queries_per_s": exact_qps,
+            "mb_per_million": (corpus.shape[1] * 4 + ID_BYTES) * 1e6 / 2 ** 20,
+        },
+        "ivf": [],
+    }
+    for nlist in nlists or [default_nlist(len(corpus))]:
+        start = time.perf_counter()
+        index = IVFIndex.build(ids, corpus, nlist=nlist)
+        build_s = time.perf_counter() - start
+        report["ivf"].append({
+            "nlist": index.nlist,
+            "build_s": build_s,
+            "mb_per_million": index.stats()["mb_per_million"],
+            "by_nprobe": [measure(index, queries, exact_ids, k, p, rescore) for p in nprobes if p <= index.nlist],
+        })
+    return report
+
+
+def print_report(report: dict):
+    exact = report["exact"]
+    print(f"\n🗂️ {report['vectors']:,} vectors x {report['dim']}, {report['queries']} queries, recall@{report['k']}")
+    print(f"exact float32: {exact['queries_per_s']:,.0f} queries/s, {exact['mb_per_million']:,.0f} MB per million vectors")
+    print(f"{'nlist':>6} {'build s':>8} {'MB/M':>6} {'nprobe':>7} {'queries/s':>10} {'p50 ms':>7} {'recall':>7}")
+    for ivf in report["ivf"]:
+        for r in ivf["by_nprobe"]:
+            print(f"{ivf['nlist']:>6} {ivf['build_s']:>8.1f} {ivf['mb_per_million']:>6.0f} {r['nprobe']:>7} "
+                  f"{r['queries_per_s']:>10,.0f} {r['p50_ms']:>7.2f} {r['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall, speed and memory of the local ANN index.")
+    parser.add_argument("--vectors", type=int, default=200000, help="Synthetic corpus size")
+    parser.add_argument("--npy", help="Corpus of real embeddings (.npy matrix) instead of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, nargs="+", help="List counts to build (default: about 4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=list(DEFAULT_NPROBES))
+    parser.add_argument("--rescore", type=int, default=4, help="Candidates re-scored in float32 per result")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    # Queries are held-out rows, so they come from the corpus's distribution
+    if args.npy:
+        matrix = np.load(args.npy).astype(np.float32)
+    else:
+        matrix = synthetic_vectors(args.vectors + args.queries, seed=args.seed)
+    corpus, queries = matrix[args.queries:], matrix[:args.queries]
+
+    report = run(corpus, queries, args.k, args.nlist, args.nprobe, args.rescore)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Wrote {args.output}")
@@ -0,0 +1,172 @@
+"""
+Benchmark and equivalence check for the embedding backends.
+
+Each backend runs in its own process, so import time and memory are measured
+from a cold start:
+
+- import_s:       importing src.utils.embeddings and building the model
+- queries_per_s:  embed_query on single questions, sequentially and from
+                  --concurrency threads (the ONNX backend batches those)
+- chunks_per_s:   embed_documents on 2000-character manual chunks
+- rss_mb:         resident memory after the run, and the peak
+
+The ONNX vectors are compared with the PyTorch ones by cosine similarity. The
+run fails (exit status 1) if any probe text falls below --tolerance. The
+result is recorded next to the ONNX model (validation.json); the backend only
+loads a model with a passing record.
+
+Usage: python -m benchmarks.bench_embeddings [--backends torch onnx] [--queries 200] [--chunks 256]
+(build the ONNX model first: pip install -r requirements-onnx.txt; python -m src.utils.onnx_embeddings export)
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+QUESTIONS = [
+    "What is the recommended tire pressure?",
+    "How do I reset the oil life indicator?",
+    "What engine oil does the 2024 Hyundai Creta take?",
+    "Where is the spare wheel stored?",
+    "How much boot space is there with the rear seats folded?",
+    "What does the tire pressure warning light mean?",
+    "How often should the cabin air filter be replaced?",
+    "What is the towing capacity?",
+]
+
+CHUNK = (
+    "Tire pressure (cold): front 240 kPa (35 psi), rear 230 kPa (33 psi). "
+    "Use SAE 0W-20 engine oil meeting API Latest and ILSAC Latest. "
+    "Wheel lug nut torque: 11~13 kgf.m (79~94 lbf.ft, 107~127 N.m). "
+)
+
+# Short, long (past the 256-token limit) and non-English inputs for the equivalence check
+PROBES = QUESTIONS + [
+    "oil",
+    CHUNK * 2,
+    CHUNK * 12,
+    "Reifendruck vorne 2,4 bar, hinten 2,3 bar.",
+    "ABS warning lamp stays on after engine start — what should I do?",
+]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def worker(backend: str, n_queries: int, n_chunks: int, concurrency: int) -> dict:
+    """Runs inside a fresh process with EMBEDDING_BACKEND set."""
+    start = time.perf_counter()
+    from src.utils.embeddings import get_embeddings
+    model = get_embeddings()
+    model.embed_query("warm up")
+    import_s = time.perf_counter() - start
+
+    queries = [QUESTIONS[i % len(QUESTIONS)] + f" #{i}" for i in range(n_queries)]
+    start = time.perf_counter()
+    for q in queries:
+        model.embed_query(q)
+    sequential_qps = n_queries / (time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(model.embed_query, queries))
+        concurrent_qps = n_queries / (time.perf_counter() - start)
+
+    chunks = [f"Page {i}. " + CHUNK * 10 for i in range(n_chunks)]
+    start = time.perf_counter()
+    model.embed_documents(chunks)
+    chunks_per_s = n_chunks / (time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "import_s": import_s,
+        "queries_per_s": sequential_qps,
+        "concurrent_queries_per_s": concurrent_qps,
+        "chunks_per_s": chunks_per_s,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "probe_vectors": model.embed_documents(PROBES),
+        "model_dir": str(getattr(model, "model_dir", "")) or None,
+    }
+
+
+def run_backend(backend: str, args) -> dict:
+    # The comparison this run makes is what validates the ONNX model
+    env = {**os.environ, "EMBEDDING_BACKEND": backend, "EMBEDDING_ONNX_UNVALIDATED": "1"}
+    cmd = [sys.executable, "-m", "benchmarks.bench_embeddings", "--worker", backend,
+           "--queries", str(args.queries), "--chunks", str(args.chunks), "--concurrency", str(args.concurrency)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{backend} worker failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def cosine_rows(a: list, b: list) -> np.ndarray:
+    a, b = np.asarray(a), np.asarray(b)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def print_report(results: list):
+    print(f"\n{'backend':<8} {'import s':>9} {'q/s':>8} {'q/s conc':>9} {'chunks/s':>9} {'RSS MB':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['import_s']:>9.2f} {r['queries_per_s']:>8.1f} "
+              f"{r['concurrent_queries_per_s']:>9.1f} {r['chunks_per_s']:>9.1f} {r['rss_mb']:>8.0f} {r['peak_rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.99, help="Minimum cosine similarity to the torch vectors")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.queries, args.chunks, args.concurrency)))
+        sys.exit(0)
+
+    results = [run_backend(b, args) for b in args.backends]
+    print_report(results)
+
+    by_name = {r["backend"]: r for r in results}
+    if "torch" in by_name and len(by_name) > 1:
+        failed = False
+        reference = by_name["torch"]["probe_vectors"]
+        for r in results:
+            if r["backend"] == "torch":
+                continue
+            sims = cosine_rows(reference, r["probe_vectors"])
+            ok = sims.min() >= args.tolerance
+            failed |= not ok
+            print(f"\n{'✅' if ok else '❌'} {r['backend']} vs torch: min cosine {sims.min():.4f}, "
+                  f"mean {sims.mean():.4f} over {len(sims)} probes (tolerance {args.tolerance})")
+            if r["backend"] == "onnx" and r.get("model_dir"):
+                from src.utils.onnx_embeddings import record_validation
+                record_validation(r["model_dir"], float(sims.min()), float(sims.mean()), len(sims), args.tolerance)
+                print(f"   📝 Recorded in {r['model_dir']}")
+            for text, sim in zip(PROBES, sims):
+                if sim < args.tolerance:
+                    print(f"   {sim:.4f}  {text[:60]}")
+        sys.exit(1 if failed else 0)
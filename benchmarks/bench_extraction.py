@@ -0,0 +1,87 @@
+"""
+Benchmark for review-page HTML extraction.
+
+Runs every extraction engine over the saved pages in benchmarks/corpus/review_pages
+and reports time and peak traced memory per page, plus whether each engine's
+output matches the full-tree reference.
+
+Usage: python -m benchmarks.bench_extraction [--repeats 20]
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from src.tools.article_extract import EXTRACTORS, HAS_LXML
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus" / "review_pages"
+
+
+def load_corpus(corpus_dir=CORPUS_DIR) -> dict:
+    """Returns {page name: raw bytes} for every saved page."""
+    return {p.name: p.read_bytes() for p in sorted(Path(corpus_dir).glob("*.html"))}
+
+
+def measure(extract, html: bytes, repeats: int) -> dict:
+    """Median wall time and peak traced memory for one engine on one page."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extract(html)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    output = extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "peak_kb": peak / 1024,
+        "output": output,
+    }
+
+
+def run(repeats: int = 20, corpus_dir=CORPUS_DIR) -> list:
+    engines = [e for e in EXTRACTORS if e != "lxml" or HAS_LXML]
+    rows = []
+    for name, html in load_corpus(corpus_dir).items():
+        reference = None
+        for engine in engines:
+            result = measure(EXTRACTORS[engine], html, repeats)
+            if engine == "full":
+                reference = result["output"]
+            rows.append({
+                "page": name,
+                "engine": engine,
+                "bytes": len(html),
+                "median_ms": result["median_ms"],
+                "peak_kb": result["peak_kb"],
+                "chars": len(result["output"]),
+                "matches_reference": result["output"] == reference,
+            })
+    return rows
+
+
+def print_report(rows: list):
+    print(f"{'page':<42} {'engine':<9} {'ms':>8} {'peak KB':>9} {'chars':>6}  match")
+    print("-" * 84)
+    for r in rows:
+        match = "✅" if r["matches_reference"] else "❌"
+        print(f"{r['page']:<42} {r['engine']:<9} {r['median_ms']:>8.2f} {r['peak_kb']:>9.0f} {r['chars']:>6}  {match}")
+
+    print("\n📈 Totals per engine:")
+    for engine in dict.fromkeys(r["engine"] for r in rows):
+        mine = [r for r in rows if r["engine"] == engine]
+        total_ms = sum(r["median_ms"] for r in mine)
+        max_peak = max(r["peak_kb"] for r in mine)
+        matched = sum(r["matches_reference"] for r in mine)
+        print(f"   {engine:<9} {total_ms:>8.2f} ms total, {max_peak:>7.0f} KB max peak, {matched}/{len(mine)} match reference")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    print_report(run(args.repeats))
@@ -0,0 +1,260 @@
+"""
+Concurrent load test of the agent graph against local stand-ins.
+
+Simulates N users, each holding its own conversation, who ask manual (rag),
+recall and review questions in a configurable mix with exponential think
+time between turns. The real ChatGroq and Pinecone clients talk to the
+stand-in in benchmarks/standin_server.py, so HTTP clients, serialization,
+scheduling and the graph itself are all on the measured path. NHTSA and the
+review sites are answered by the HTTP stubs in benchmarks/stubs.py.
+
+Reports throughput, p50/p95/p99 turn latency per question kind and the error
+rate. A turn counts as an error when it raises or comes back with a degraded
+answer (deadline, open circuit, admission control). Use it to find how many
+concurrent conversations one worker sustains: raise --users until p95 or the
+error rate passes the target.
+
+Usage:
+    python -m benchmarks.load_test --users 20 --duration 60 [--mix rag=0.6,recall=0.25,review=0.15]
+    python -m benchmarks.load_test --standin http://127.0.0.1:8765   # external stand-in
+    python -m benchmarks.load_test --with-scheduler --tpm 6000       # include Groq quota scheduling
+    python -m benchmarks.load_test --index local                     # manuals from the local ANN index
+
+Like the stubs, this must set up the environment before src.agent.graph is imported.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.run import percentile, quiet
+
+QUESTIONS = {
+    "rag": [
+        "What is the tire pressure for the 2024 Hyundai Creta?",
+        "How do I reset the oil life indicator?",
+        "What engine oil does the 2024 Hyundai Creta take?",
+        "Where is the spare wheel stored?",
+        "How often should the cabin air filter be replaced?",
+        "What does the tire pressure warning light mean?",
+    ],
+    "recall": [
+        "Any recalls for 2020 Honda Civic?",
+        "Are there recalls on the 2019 Toyota Camry?",
+        "Check NHTSA recalls for a 2021 Ford F-150",
+        "Is my 2018 Tesla Model 3 under any recall?",
+    ],
+    "review": [
+        "BMW X5 vs Mercedes GLE review",
+        "Is the 2024 Toyota RAV4 reliable? Owner reviews",
+        "Honda Accord review and road test",
+    ],
+}
+
+DEFAULT_MIX = "rag=0.6,recall=0.25,review=0.15"
+
+# Fragments of the fallback answers the nodes give when a backend is unavailable
+DEGRADED_MARKERS = (
+    "temporarily unavailable",
+    "isn't responding right now",
+    "I encountered an error",
+    "couldn't generate a response",
+    "couldn't extract the vehicle information",
+)
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in QUESTIONS:
+            raise ValueError(f"unknown question kind {kind!r}, expected one of {sorted(QUESTIONS)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def setup_environment(base_url: str, with_scheduler: bool, chunk_texts: str):
+    """Points the clients at the stand-in; must run before the graph is imported."""
+    os.environ["GROQ_API_BASE"] = base_url
+    os.environ["PINECONE_HOST"] = base_url
+    for var in ("GROQ_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX_NAME"):
+        os.environ.setdefault(var, "standin")
+    for flag in ("REVIEW_CACHE_DISABLED", "REVIEW_SUMMARY_STORE_DISABLED", "REVIEW_INDEX_DISABLED"):
+        os.environ.setdefault(flag, "1")
+    if not with_scheduler:
+        os.environ["AUTOINTEL_GROQ_SCHEDULER"] = "0"
+    if chunk_texts == "metadata":
+        os.environ["CHUNK_STORE_DISABLED"] = "1"
+    else:
+        # The stand-in's chunks, in a store of their own
+        from benchmarks.standin_server import seed_chunk_store
+        from src.tools.chunk_store import ChunkStore
+        os.environ["CHUNK_STORE_DIR"] = tempfile.mkdtemp(prefix="autointel_chunks_")
+        seed_chunk_store(ChunkStore(os.environ["CHUNK_STORE_DIR"]))
+
+
+def build_local_index():
+    """The stand-in's chunks in a local ANN index (RAG_INDEX=local); run once embeddings are set up."""
+    from benchmarks.standin_server import CORPUS
+    from src.tools.ann_index import IVFIndex
+    from src.tools.chunk_store import chunk_id
+    from src.utils.embeddings import get_embeddings
+
+    path = os.path.join(tempfile.mkdtemp(prefix="autointel_ann_"), "index")
+    vectors = get_embeddings().embed_documents([doc.page_content for doc in CORPUS])
+    IVFIndex.build([chunk_id(doc) for doc in CORPUS], vectors).save(path)
+    os.environ["ANN_INDEX_DIR"] = path
+    os.environ["RAG_INDEX"] = "local"
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turns = defaultdict(list)   # kind -> latency ms
+        self.errors = defaultdict(int)   # kind -> count
+        self.samples = []                # first error messages, for the report
+
+    def record(self, kind: str, ms: float, error: str = None):
+        with self.lock:
+            self.turns[kind].append(ms)
+            if error:
+                self.errors[kind] += 1
+                if len(self.samples) < 5:
+                    self.samples.append(f"{kind}: {error[:160]}")
+
+
+def user(user_id: int, app, mix: dict, args, stop_at: float, results: Results):
+    from langchain_core.messages import HumanMessage
+
+    rng = random.Random(args.seed + user_id)
+    kinds, weights = list(mix), list(mix.values())
+    config = {"configurable": {"thread_id": f"load_{user_id}_{time.time_ns()}"}}
+    # Spread arrivals over the ramp-up instead of starting everyone at once
+    time.sleep(args.ramp_up * user_id / max(1, args.users))
+
+    while time.monotonic() < stop_at:
+        kind = rng.choices(kinds, weights)[0]
+        question = rng.choice(QUESTIONS[kind])
+        start = time.perf_counter()
+        error = None
+        try:
+            out = app.invoke({"messages": [HumanMessage(content=question)]}, config)
+            answer = str(out["messages"][-1].content)
+            if any(marker in answer for marker in DEGRADED_MARKERS):
+                error = f"degraded answer: {answer}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        results.record(kind, (time.perf_counter() - start) * 1000, error)
+
+        if args.think_time > 0:
+            time.sleep(max(0.0, min(rng.expovariate(1 / args.think_time), stop_at - time.monotonic())))
+
+
+def summarize(results: Results, elapsed: float, args) -> dict:
+    def stats(latencies: list, errors: int) -> dict:
+        return {
+            "turns": len(latencies),
+            "errors": errors,
+            "error_rate": errors / len(latencies) if latencies else 0.0,
+            "p50_ms": percentile(latencies, 0.50) if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) if latencies else None,
+        }
+
+    everything = [ms for latencies in results.turns.values() for ms in latencies]
+    return {
+        "users": args.users,
+        "duration_s": elapsed,
+        "profile": args.profile,
+        "turns_per_s": len(everything) / elapsed if elapsed else 0.0,
+        "overall": stats(everything, sum(results.errors.values())),
+        "by_kind": {kind: stats(latencies, results.errors[kind]) for kind, latencies in sorted(results.turns.items())},
+        "error_samples": results.samples,
+    }
+
+
+def print_report(summary: dict):
+    def ms(value):
+        return f"{value:>9.0f}" if value is not None else f"{'-':>9}"
+
+    print(f"\n📊 {summary['users']} users for {summary['duration_s']:.0f}s ({summary['profile']} profile): "
+          f"{summary['turns_per_s']:.2f} turns/s")
+    print(f"{'kind':<8} {'turns':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    rows = list(summary["by_kind"].items()) + [("all", summary["overall"])]
+    for kind, s in rows:
+        print(f"{kind:<8} {s['turns']:>6} {ms(s['p50_ms'])} {ms(s['p95_ms'])} {ms(s['p99_ms'])} "
+              f"{s['error_rate']:>6.1%}")
+    for sample in summary["error_samples"]:
+        print(f"   ⚠️ {sample}")
+
+
+def main(args) -> dict:
+    mix = parse_mix(args.mix)
+    base_url = args.standin
+    if not base_url:
+        from benchmarks.standin_server import Standin, start_background
+        base_url = start_background(Standin(args.profile, tpm=args.tpm, seed=args.seed))
+    setup_environment(base_url, args.with_scheduler, args.chunk_texts)
+
+    from benchmarks.stubs import install_fake_embeddings, install_http_stubs
+    from benchmarks.standin_server import load_profile
+
+    install_http_stubs(latency=load_profile(args.profile).get("http"), seed=args.seed)
+    if args.embeddings == "fake":
+        install_fake_embeddings()
+    if args.index == "local":
+        build_local_index()
+
+    from src.agent.graph import app
+
+    print(f"🚀 {args.users} users for {args.duration:.0f}s against {base_url} (mix {mix})")
+    results = Results()
+    with quiet():
+        start = time.monotonic()
+        stop_at = start + args.duration
+        threads = [
+            threading.Thread(target=user, args=(i, app, mix, args, stop_at, results), daemon=True)
+            for i in range(args.users)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - start
+
+    summary = summarize(results, elapsed, args)
+    print_report(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Wrote {args.output}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test against local stand-ins.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to keep sending turns")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which users join")
+    parser.add_argument("--think-time", type=float, default=2, help="Mean seconds between a user's turns")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Question kinds and weights")
+    parser.add_argument("--profile", default="production", help="Stand-in latency profile: fast, production or a JSON file")
+    parser.add_argument("--standin", help="URL of a running stand-in (default: start one in-process)")
+    parser.add_argument("--tpm", type=float, default=0, help="Tokens-per-minute quota the in-process stand-in emulates")
+    parser.add_argument("--with-scheduler", action="store_true", help="Keep the Groq scheduler on")
+    parser.add_argument("--embeddings", choices=["model", "fake"], default="model",
+                        help="Embed with the configured model, or with hash vectors to leave the CPU to the graph")
+    parser.add_argument("--chunk-texts", choices=["store", "metadata"], default="store",
+                        help="Resolve chunk texts from a local chunk store (ID-only queries) or from query metadata")
+    parser.add_argument("--index", choices=["pinecone", "local"], default="pinecone",
+                        help="Search the manuals through the Pinecone client or the local ANN index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the summary as JSON")
+    args = parser.parse_args()
+    if args.index == "local" and args.chunk_texts != "store":
+        parser.error("--index local reads chunk texts from the store")
+    main(args)
@@ -0,0 +1,360 @@
+"""
+Offline performance suite.
+
+Runs against the stub backends in benchmarks/stubs.py (or a recorded cassette,
+see src/utils/cassette.py) and writes one JSON file of metrics:
+
+    python -m benchmarks.run run --output benchmarks/baseline.json
+    python -m benchmarks.run run --output benchmarks/results.json
+    python -m benchmarks.run compare benchmarks/baseline.json benchmarks/results.json --threshold 0.10
+    python -m benchmarks.run run --only memory --memory-budget-mb 16
+
+`compare` exits with status 1 when any metric regressed by more than the
+threshold (relative), so it can gate CI. Baselines are machine specific;
+record the baseline on the same hardware that runs the comparison. The memory
+benchmark traces allocations per node (src/utils/memprof.py) and, with
+--memory-budget-mb, fails the run as soon as one turn peaks above the budget.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from src.utils.memprof import MemoryBudgetExceeded
+
+ROUTER_QUERIES = [
+    "What is the recommended tire pressure?",
+    "BMW X5 vs Mercedes GLE review",
+    "Any recalls for 2020 Honda Civic?",
+    "How do I reset the oil life indicator?",
+    "Which SUV is the most reliable under 40k?",
+    "Check VIN service history for my car",
+]
+
+GRAPH_QUERIES = [
+    "What is the recommended tire pressure?",
+    "Any recalls for 2020 Honda Civic?",
+    "BMW X5 vs Mercedes GLE review",
+]
+
+
+def metric(value: float, unit: str, higher_is_better: bool) -> dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Sends the nodes' progress output to /dev/null while timing."""
+    from src.utils import log
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            yield
+        finally:
+            # Records still queued would otherwise reach the terminal afterwards
+            log.flush()
+
+
+def bench_router(scale: float) -> dict:
+    from langchain_core.messages import HumanMessage
+    from src.agent.graph import router_node
+    from src.agent.prefetch import prefetcher
+
+    states = [{"messages": [HumanMessage(content=q)]} for q in ROUTER_QUERIES]
+    n = int(20000 * scale)
+    # Routing cost only; prefetching is measured as part of the graph benchmark
+    enabled, prefetcher.enabled = prefetcher.enabled, False
+    try:
+        with quiet():
+            start = time.perf_counter()
+            for i in range(n):
+                router_node(states[i % len(states)])
+            elapsed = time.perf_counter() - start
+    finally:
+        prefetcher.enabled = enabled
+    return {"router.routes_per_s": metric(n / elapsed, "routes/s", True)}
+
+
+def bench_retrieval(scale: float) -> dict:
+    from src.tools.pinecone_rag import pinecone_rag_tool
+
+    timings = []
+    with quiet():
+        for i in range(int(300 * scale)):
+            start = time.perf_counter()
+            pinecone_rag_tool.invoke(f"{ROUTER_QUERIES[i % len(ROUTER_QUERIES)]} #{i}")
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "retrieval.p50_ms": metric(percentile(timings, 0.5), "ms", False),
+        "retrieval.p95_ms": metric(percentile(timings, 0.95), "ms", False),
+    }
+
+
+def bench_extraction(scale: float) -> dict:
+    from src.tools.article_extract import extract_article_text
+    from benchmarks.bench_extraction import load_corpus
+
+    pages = list(load_corpus().values())
+    repeats = max(1, int(20 * scale))
+    total_bytes = sum(len(p) for p in pages) * repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for html in pages:
+            extract_article_text(html)
+    elapsed = time.perf_counter() - start
+    return {
+        "extraction.ms_per_page": metric(elapsed * 1000 / (repeats * len(pages)), "ms", False),
+        "extraction.mb_per_s": metric(total_bytes / elapsed / 1e6, "MB/s", True),
+    }
+
+
+def bench_ingest(scale: float) -> dict:
+    from langchain_core.documents import Document
+    from src.scripts.ingest_docs import prepare_chunks, dedup_chunks
+    from src.utils.embeddings import get_embeddings
+    from benchmarks.stubs import MANUAL_PASSAGE
+
+    embeddings = get_embeddings()
+    n_pages = int(200 * scale)
+    pages = [
+        Document(page_content=f"Page {i}\n\n" + MANUAL_PASSAGE * 25 + "• © garbled ®\n" * 5,
+                 metadata={"source": "bench.pdf", "page": i})
+        for i in range(n_pages)
+    ]
+    start = time.perf_counter()
+    chunks = prepare_chunks(pages)
+    embeddings.embed_documents([c.page_content for c in chunks])
+    elapsed = time.perf_counter() - start
+
+    # The synthetic pages are near-identical, so nearly every chunk is a duplicate
+    start = time.perf_counter()
+    dedup_chunks(chunks)
+    dedup_elapsed = time.perf_counter() - start
+    return {
+        "ingest.chunks_per_s": metric(len(chunks) / elapsed, "chunks/s", True),
+        "ingest.dedup_chunks_per_s": metric(len(chunks) / dedup_elapsed, "chunks/s", True),
+    }
+
+
+def bench_graph(scale: float) -> dict:
+    from langchain_core.messages import HumanMessage
+    from src.agent.graph import app
+
+    n = max(len(GRAPH_QUERIES), int(60 * scale))
+    timings = []
+    with quiet():
+        start = time.perf_counter()
+        for i in range(n):
+            config = {"configurable": {"thread_id": f"bench_{time.time_ns()}_{i}"}}
+            turn_start = time.perf_counter()
+            app.invoke({"messages": [HumanMessage(content=GRAPH_QUERIES[i % len(GRAPH_QUERIES)])]}, config)
+            timings.append((time.perf_counter() - turn_start) * 1000)
+        elapsed = time.perf_counter() - start
+    return {
+        "graph.turns_per_s": metric(n / elapsed, "turns/s", True),
+        "graph.p95_ms": metric(percentile(timings, 0.95), "ms", False),
+    }
+
+
+def bench_memory(scale: float, budget_mb: float = None) -> dict:
+    from langchain_core.messages import HumanMessage
+    from src.agent.graph import app
+    from src.utils.memprof import profiler
+
+    profiler.turns.clear()
+    profiler.enable(budget_mb=budget_mb)
+    try:
+        with quiet():
+            for i in range(max(len(GRAPH_QUERIES), int(30 * scale))):
+                config = {"configurable": {"thread_id": f"bench_mem_{time.time_ns()}_{i}"}}
+                query = GRAPH_QUERIES[i % len(GRAPH_QUERIES)]
+                with profiler.turn(label=query, enforce=budget_mb is not None):
+                    app.invoke({"messages": [HumanMessage(content=query)]}, config)
+    finally:
+        print(profiler.report())
+        turns = list(profiler.turns)
+        profiler.disable()
+
+    return {
+        "memory.turn_peak_p95_kb": metric(percentile([t.peak_kb for t in turns], 0.95), "KB", False),
+        "memory.retained_per_turn_kb": metric(sum(t.retained_kb for t in turns) / len(turns), "KB", False),
+    }
+
+
+def bench_ann(scale: float) -> dict:
+    from benchmarks.bench_ann import synthetic_vectors, run
+    from src.tools.ann_index import NPROBE
+
+    n_queries = 200
+    matrix = synthetic_vectors(int(50000 * scale) + n_queries)
+    report = run(matrix[n_queries:], matrix[:n_queries], k=10, nprobes=[NPROBE])
+    ivf = report["ivf"][0]
+    return {
+        "ann.queries_per_s": metric(ivf["by_nprobe"][0]["queries_per_s"], "queries/s", True),
+        "ann.recall_at_10": metric(ivf["by_nprobe"][0]["recall"], "recall", True),
+        "ann.mb_per_million": metric(ivf["mb_per_million"], "MB", False),
+    }
+
+
+def bench_logging(scale: float) -> dict:
+    from src.utils import log
+
+    n = int(50000 * scale)
+    logger = log.get_logger("benchmarks.logging")
+
+    def per_call_us(call) -> float:
+        start = time.perf_counter()
+        for i in range(n):
+            call(i)
+        return (time.perf_counter() - start) * 1e6 / n
+
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        try:
+            for fmt in ("text", "json"):
+                # Queue large enough that nothing is dropped while the listener catches up
+                log.configure(level="INFO", fmt=fmt, sample="bench.sampled=0", stream=devnull,
+                              queue_size=n + 1, force=True)
+                results[f"log.emit_{fmt}_us"] = per_call_us(
+                    lambda i: logger.info("bench.emit", "🔍 Searching manuals for: %s", i, chars=i))
+                log.flush(timeout=30)
+            results["log.sampled_out_us"] = per_call_us(lambda i: logger.info("bench.sampled", "%s", i))
+            results["log.filtered_us"] = per_call_us(lambda i: logger.debug("bench.debug", "%s", i))
+        finally:
+            log.configure(force=True)
+    return {key: metric(value, "µs", False) for key, value in results.items()}
+
+
+BENCHMARKS = {
+    "router": bench_router,
+    "retrieval": bench_retrieval,
+    "extraction": bench_extraction,
+    "ingest": bench_ingest,
+    "graph": bench_graph,
+    "memory": bench_memory,
+    "ann": bench_ann,
+    "logging": bench_logging,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names=None, scale: float = 1.0, rounds: int = 3, memory_budget_mb: float = None) -> dict:
+    """Runs the selected benchmarks `rounds` times and keeps the median of each metric."""
+    if os.getenv("AUTOINTEL_CASSETTE"):
+        print(f"📼 Using cassette {os.getenv('AUTOINTEL_CASSETTE')} instead of stubs")
+    else:
+        from benchmarks.stubs import install_stubs
+        install_stubs()
+
+    metrics = {}
+    for name in names or BENCHMARKS:
+        print(f"⏱️ {name}...")
+        if name == "memory":
+            # Tracing is slow and deterministic enough; one round is representative
+            samples = [bench_memory(scale, memory_budget_mb)]
+        else:
+            samples = [BENCHMARKS[name](scale) for _ in range(rounds)]
+        for key, first in samples[0].items():
+            value = statistics.median(s[key]["value"] for s in samples)
+            metrics[key] = {**first, "value": value}
+            print(f"   {key}: {value:,.3f} {first['unit']}")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "rounds": rounds,
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list:
+    """Returns rows for metrics present in both runs; `regressed` is set past `threshold`."""
+    rows = []
+    for key, base in baseline["metrics"].items():
+        cur = current["metrics"].get(key)
+        if cur is None or not base["value"]:
+            continue
+        change = (cur["value"] - base["value"]) / base["value"]
+        worse = -change if base["higher_is_better"] else change
+        rows.append({
+            "metric": key,
+            "baseline": base["value"],
+            "current": cur["value"],
+            "unit": base["unit"],
+            "change": change,
+            "regressed": worse > threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: list, threshold: float):
+    print(f"{'metric':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for r in rows:
+        flag = "❌" if r["regressed"] else "✅"
+        print(f"{r['metric']:<28} {r['baseline']:>12,.3f} {r['current']:>12,.3f} {r['change']:>+8.1%} {flag}")
+    regressions = [r for r in rows if r["regressed"]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {threshold:.0%}")
+    else:
+        print(f"\n✅ No regressions beyond {threshold:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="Run the suite and write a results JSON")
+    run_p.add_argument("--output", default="benchmarks/results.json")
+    run_p.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Subset of benchmarks")
+    run_p.add_argument("--scale", type=float, default=1.0, help="Multiplier on iterations (e.g. 0.1 for a smoke run)")
+    run_p.add_argument("--rounds", type=int, default=3)
+    run_p.add_argument("--memory-budget-mb", type=float, default=None,
+                       help="Fail if any profiled turn peaks above this many MB")
+
+    cmp_p = sub.add_parser("compare", help="Compare results against a baseline")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        try:
+            results = run_suite(args.only, args.scale, args.rounds, args.memory_budget_mb)
+        except MemoryBudgetExceeded as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 Results saved to: {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        print_comparison(rows, args.threshold)
+        sys.exit(1 if any(r["regressed"] for r in rows) else 0)
@@ -0,0 +1,305 @@
+"""
+Local stand-in for Groq and Pinecone, for load tests.
+
+Serves the two HTTP APIs the agent's real clients speak, so ChatGroq and
+PineconeVectorStore run unmodified against it:
+
+- POST /openai/v1/chat/completions   Groq's OpenAI-style chat completions:
+  plain answers, tool calls for structured output (the VehicleDetails
+  extraction), JSON mode / json_schema, and SSE streaming
+- POST /query                        Pinecone's data-plane vector query, with
+  chunk texts in the metadata or (includeMetadata false) IDs and scores only
+
+Point the clients at it with:
+
+    GROQ_API_BASE=http://127.0.0.1:8765
+    PINECONE_HOST=http://127.0.0.1:8765
+
+Latency comes from a profile of latency specs (same format as
+src/utils/cassette.py): `llm_ttft` (time to first token), `llm_token` (time per
+generated token, i.e. the token rate), `vector` (query time) and `http` (the
+NHTSA and review-site stubs, applied by benchmarks/load_test.py). An optional
+tokens-per-minute quota answers with Groq's x-ratelimit-* headers and 429s
+once it is used up, so the scheduler in src/utils/llm_scheduler.py can be
+exercised too.
+
+Usage: python -m benchmarks.standin_server [--port 8765] [--profile production] [--tpm 0]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.documents import Document
+
+from src.tools.chunk_store import chunk_id
+from src.utils.cassette import sample_ms
+from src.utils.vehicles import extract_vehicles
+from benchmarks.stubs import ANSWER, MANUAL_PASSAGE
+
+PROFILES = {
+    "fast": {},
+    "production": {
+        "llm_ttft": {"dist": "lognormal", "median_ms": 350, "sigma": 0.5},
+        "llm_token": {"dist": "lognormal", "median_ms": 4, "sigma": 0.3},
+        "vector": {"dist": "lognormal", "median_ms": 120, "sigma": 0.4},
+        # Not served here: load_test.py applies it to the NHTSA and review-site stubs
+        "http": {"dist": "lognormal", "median_ms": 300, "sigma": 0.6},
+    },
+}
+
+# The manual chunks the vector query returns; seed_chunk_store() puts them in a
+# local chunk store so ID-only queries resolve
+CORPUS = [
+    Document(page_content=f"Page {i}. " + MANUAL_PASSAGE * 4,
+             metadata={"source": f"manual_{i % 7}.pdf", "page": i, "start_index": 0})
+    for i in range(64)
+]
+
+CHARS_PER_TOKEN = 4
+COMPLETION_TOKENS = 150
+QUESTION_RE = re.compile(r"Question:\s*(.+)")
+
+
+def load_profile(profile) -> dict:
+    if isinstance(profile, dict):
+        return profile
+    if profile in PROFILES:
+        return PROFILES[profile]
+    with open(profile) as f:
+        return json.load(f)
+
+
+def seed_chunk_store(store):
+    store.add(CORPUS)
+
+
+class _Quota:
+    """Server-side tokens-per-minute bucket that produces Groq's rate-limit headers."""
+
+    def __init__(self, tpm: float):
+        self.tpm = tpm
+        self.level = tpm
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens: int):
+        """Returns (allowed, headers)."""
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.tpm, self.level + (now - self.updated) * self.tpm / 60)
+            self.updated = now
+            allowed = self.level >= tokens
+            if allowed:
+                self.level -= tokens
+            reset = max(0.0, (tokens - self.level) / (self.tpm / 60)) if not allowed else 0.0
+            headers = {
+                "x-ratelimit-limit-tokens": str(int(self.tpm)),
+                "x-ratelimit-remaining-tokens": str(int(max(0, self.level))),
+                "x-ratelimit-reset-tokens": f"{reset:.2f}s",
+            }
+            if not allowed:
+                headers["retry-after"] = str(max(1, round(reset)))
+            return allowed, headers
+
+
+class Standin:
+    def __init__(self, profile="fast", tpm: float = 0, seed: int = 0, completion_tokens: int = COMPLETION_TOKENS):
+        self.profile = load_profile(profile)
+        self.quota = _Quota(tpm) if tpm else None
+        self.completion_tokens = completion_tokens
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sleep(self, kind: str, times: int = 1):
+        spec = self.profile.get(kind)
+        if not spec:
+            return
+        with self.lock:
+            ms = sum(sample_ms(spec, self.rng) for _ in range(times))
+        time.sleep(ms / 1000)
+
+    # --- chat completions ---
+
+    def answer_words(self) -> list:
+        words = ANSWER.split()
+        return [words[i % len(words)] for i in range(self.completion_tokens)]
+
+    @staticmethod
+    def vehicle_args(messages: list) -> dict:
+        text = str(messages[-1].get("content", "")) if messages else ""
+        question = QUESTION_RE.search(text)
+        vehicles = extract_vehicles(question.group(1) if question else text)
+        if not vehicles:
+            return {}
+        v = vehicles[0]
+        return {"year": v.year, "make": v.make.title(), "model": v.model.title() if v.model else None}
+
+    def completion(self, body: dict):
+        """Returns (status, headers, payload or chunk list) for a chat completion request."""
+        messages = body.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // CHARS_PER_TOKEN + 1
+
+        headers = {}
+        if self.quota:
+            allowed, headers = self.quota.take(prompt_tokens + self.completion_tokens)
+            if not allowed:
+                return 429, headers, {"error": {"message": "Rate limit reached for tokens", "type": "tokens",
+                                                "code": "rate_limit_exceeded"}}
+
+        tools = body.get("tools") or []
+        response_format = (body.get("response_format") or {}).get("type")
+        message = {"role": "assistant", "content": None}
+        finish = "stop"
+        if tools:
+            name = tools[0]["function"]["name"]
+            choice = body.get("tool_choice")
+            if isinstance(choice, dict):
+                name = choice.get("function", {}).get("name", name)
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(self.vehicle_args(messages))},
+            }]
+            finish = "tool_calls"
+            completion_tokens = 20
+        elif response_format in ("json_object", "json_schema"):
+            message["content"] = json.dumps(self.vehicle_args(messages))
+            completion_tokens = 20
+        else:
+            words = self.answer_words()
+            message["content"] = " ".join(words)
+            completion_tokens = len(words)
+
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:16]}", "created": int(time.time()),
+                "model": body.get("model", "standin")}
+
+        if not body.get("stream"):
+            self.sleep("llm_ttft")
+            self.sleep("llm_token", completion_tokens)
+            return 200, headers, {**base, "object": "chat.completion", "usage": usage,
+                                  "choices": [{"index": 0, "message": message, "finish_reason": finish}]}
+
+        def chunks():
+            self.sleep("llm_ttft")
+            chunk = {**base, "object": "chat.completion.chunk"}
+            if message.get("tool_calls"):
+                call = dict(message["tool_calls"][0], index=0)
+                yield {**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": [call]},
+                                             "finish_reason": None}]}
+            else:
+                for i, word in enumerate((message["content"] or "").split(" ")):
+                    self.sleep("llm_token")
+                    delta = {"content": word if i == 0 else " " + word}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    yield {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}],
+                   "x_groq": {"usage": usage}}
+
+        return 200, headers, chunks()
+
+    # --- vector query ---
+
+    def query(self, body: dict) -> dict:
+        self.sleep("vector")
+        vector = body.get("vector") or []
+        seed = int(hashlib.sha1(json.dumps(vector[:8]).encode("utf-8")).hexdigest()[:8], 16)
+        # Echo equality filters so vehicle-scoped searches find "their" manual
+        tags = {k: v for k, v in (body.get("filter") or {}).items() if not isinstance(v, dict)}
+        matches = []
+        for i in range(int(body.get("topK", 4))):
+            doc = CORPUS[(seed + i) % len(CORPUS)]
+            match = {"id": chunk_id(doc), "score": 0.9 - i * 0.05, "values": []}
+            if body.get("includeMetadata"):
+                match["metadata"] = {"text": doc.page_content, **doc.metadata, **tags}
+            matches.append(match)
+        return {"matches": matches, "namespace": body.get("namespace") or "", "usage": {"readUnits": 5}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    standin = None  # set by make_server
+
+    def _send_json(self, status: int, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, headers, chunks):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        for chunk in chunks:
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            status, headers, payload = self.standin.completion(body)
+            if status == 200 and body.get("stream"):
+                self._send_stream(headers, payload)
+            else:
+                self._send_json(status, payload, headers)
+        elif path == "/query":
+            self._send_json(200, self.standin.query(body))
+        else:
+            self._send_json(404, {"error": f"no stand-in for {path}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(standin: Standin, port: int = 0, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Builds the server (port 0 picks a free one); call serve_forever() to run it."""
+    handler = type("StandinHandler", (_Handler,), {"standin": standin})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_background(standin: Standin, port: int = 0) -> str:
+    """Serves on a daemon thread and returns the base URL."""
+    server = make_server(standin, port)
+    threading.Thread(target=server.serve_forever, name="standin-server", daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Groq and Pinecone stand-in.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", default="production", help="fast, production or a JSON file")
+    parser.add_argument("--tpm", type=float, default=0, help="Emulated tokens-per-minute quota (0: unlimited)")
+    parser.add_argument("--completion-tokens", type=int, default=COMPLETION_TOKENS)
+    args = parser.parse_args()
+
+    server = make_server(Standin(args.profile, args.tpm, completion_tokens=args.completion_tokens), args.port)
+    print(f"🧪 Stand-in listening on http://127.0.0.1:{args.port} (profile: {args.profile})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
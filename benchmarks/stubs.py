@@ -0,0 +1,191 @@
+"""
+Deterministic offline backends for benchmarks.
+
+`install_stubs()` replaces the same boundaries the cassette harness patches
+(src/utils/cassette.py) with synthetic responders, so the whole graph runs
+without network access or API keys and every run does identical work:
+
+- LLM:          canned answers, and vehicle details for structured output
+- Vector store: manual-like passages, no Pinecone connection
+- Embeddings:   hash-based vectors instead of the MiniLM model
+- HTTP:         NHTSA JSON, search result pages and the saved review pages
+                from benchmarks/corpus/review_pages
+
+Must be called before src.agent.graph is imported.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus" / "review_pages"
+
+MANUAL_PASSAGE = (
+    "Tire pressure (cold): front 240 kPa (35 psi), rear 230 kPa (33 psi). "
+    "Use SAE 0W-20 engine oil meeting API Latest and ILSAC Latest. "
+    "Wheel lug nut torque: 11~13 kgf.m (79~94 lbf.ft, 107~127 N.m). "
+)
+
+ANSWER = (
+    "According to the manual, the recommended tire pressure is 240 kPa (35 psi) at "
+    "the front and 230 kPa (33 psi) at the rear. Check the pressures when the tires "
+    "are cold and adjust them before long trips or when carrying heavy loads."
+)
+
+_installed = False
+
+
+def _stub_generate(self, messages, stop=None, run_manager=None, **kwargs):
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatResult, ChatGeneration
+    from src.utils.vehicles import extract_vehicles
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    tools = kwargs.get("tools")
+    if tools:
+        # Structured output: answer with a tool call carrying the vehicle details
+        vehicles = extract_vehicles(str(messages[-1].content))
+        v = vehicles[0] if vehicles else None
+        args = {"year": v.year, "make": v.make, "model": v.model} if v else {}
+        message = AIMessage(content="", tool_calls=[{
+            "name": tools[0]["function"]["name"], "args": args, "id": "call_stub",
+        }])
+    else:
+        message = AIMessage(content=ANSWER)
+    return ChatResult(generations=[ChatGeneration(message=message)],
+                      llm_output={"token_usage": usage, "model_name": self.model_name})
+
+
+def _stub_search(self, query, k=4, filter=None, namespace=None, **kwargs):
+    from langchain_core.documents import Document
+
+    seed = int(hashlib.sha1(query.encode("utf-8")).hexdigest()[:8], 16)
+    return [
+        (Document(page_content=MANUAL_PASSAGE * 4, metadata={"source": f"manual_{(seed + i) % 7}.pdf", "page": i}),
+         0.9 - i * 0.05)
+        for i in range(k)
+    ]
+
+
+def _article_pages() -> list:
+    return sorted(CORPUS_DIR.glob("*.html"))
+
+
+def _search_page(host: str) -> bytes:
+    pages = _article_pages()
+    if host.endswith("google.com"):
+        items = "".join(
+            f'<div class="g"><a href="/url?q=https://www.caranddriver.com/reviews/{p.stem}&sa=U">'
+            f'<h3>{p.stem.replace("_", " ").title()}</h3></a></div>'
+            for p in pages
+        )
+    else:
+        items = "".join(
+            f'<a href="/reviews/{p.stem}">{p.stem.replace("_", " ").title()} Review and Test</a>'
+            for p in pages
+        )
+    return f"<html><body>{items}</body></html>".encode("utf-8")
+
+
+def _nhtsa(url: str) -> bytes:
+    model = re.search(r"model=([^&]+)", url)
+    results = [
+        {"Component": "AIR BAGS", "Summary": "The passenger frontal air bag may not deploy as intended. " * 3},
+        {"Component": "FUEL SYSTEM", "Summary": "A fuel pump relay may fail, causing a stall while driving. " * 3},
+    ]
+    if model and model.group(1) == "UNKNOWN":
+        results = []
+    return json.dumps({"Count": len(results), "results": results}).encode("utf-8")
+
+
+def _stub_send(self, request, **kwargs):
+    import requests
+
+    parts = urlsplit(request.url)
+    response = requests.Response()
+    response.status_code = 200
+    response.url = request.url
+    response.request = request
+    response.encoding = "utf-8"
+
+    if parts.netloc == "api.nhtsa.gov":
+        response.headers["Content-Type"] = "application/json"
+        response._content = _nhtsa(request.url)
+    elif parts.path.startswith("/search"):
+        response.headers["Content-Type"] = "text/html"
+        response._content = _search_page(parts.netloc)
+    else:
+        page = CORPUS_DIR / f"{Path(parts.path).name}.html"
+        if page.exists():
+            response.headers["Content-Type"] = "text/html"
+            response._content = page.read_bytes()
+        else:
+            response.status_code = 404
+            response._content = b""
+    return response
+
+
+def install_stubs():
+    """Patches LLM, vector store, embeddings and HTTP with the stubs above."""
+    global _installed
+    if _installed:
+        return
+
+    for var in ("GROQ_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX_NAME"):
+        os.environ.setdefault(var, "stub")
+    # Every run should take the full path rather than whatever a local cache holds
+    for flag in ("REVIEW_CACHE_DISABLED", "REVIEW_SUMMARY_STORE_DISABLED", "REVIEW_INDEX_DISABLED",
+                 "CHUNK_STORE_DISABLED"):
+        os.environ.setdefault(flag, "1")
+    # Stubbed calls don't use the Groq quota
+    os.environ.setdefault("AUTOINTEL_GROQ_SCHEDULER", "0")
+
+    from langchain_groq import ChatGroq
+    from langchain_pinecone import PineconeVectorStore
+
+    ChatGroq._generate = _stub_generate
+    PineconeVectorStore.__init__ = lambda self, *args, **kwargs: setattr(self, "_embedding", kwargs.get("embedding"))
+    PineconeVectorStore.similarity_search_with_score = _stub_search
+    install_fake_embeddings()
+    install_http_stubs()
+
+    _installed = True
+
+
+def install_fake_embeddings():
+    """Hash-based vectors instead of the MiniLM model."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    import src.utils.embeddings as embeddings
+
+    embeddings.load_model = lambda backend: DeterministicFakeEmbedding(size=embeddings.EMBEDDING_DIM)
+    embeddings.get_embeddings.cache_clear()
+
+
+def install_http_stubs(latency: dict = None, seed: int = 0):
+    """
+    Answers NHTSA and review-site requests locally, optionally after a delay
+    drawn from `latency` (a latency spec as in src/utils/cassette.py).
+    """
+    import requests
+    import src.utils.http as http
+    from src.utils.cassette import sample_ms
+
+    send = _stub_send
+    if latency:
+        rng = random.Random(seed)
+        lock = threading.Lock()
+
+        def send(self, request, **kwargs):
+            with lock:
+                ms = sample_ms(latency, rng)
+            time.sleep(ms / 1000)
+            return _stub_send(self, request, **kwargs)
+
+    requests.Session.send = send
+    # No politeness delay against local stubs
+    http.host_limiter = http.HostRateLimiter(rate=1e9, burst=1_000_000)
@@ -1,40 +1,387 @@
-# diagnostic_pinecone.py
+"""
+Retrieval diagnostics for the manual index.
+
+Embeds a query file in one batch, runs every query against the index for each
+k in --k, and compares the results with an exact brute-force search over the
+same vectors (fetched from the index), so you can see what the approximate
+index costs in accuracy:
+
+- recall@k:   share of the exact top-k IDs the index returned
+- latency:    embedding (single queries and the batch) and index query
+              p50/p95/p99 per k
+- scores:     distribution of the top-1 and top-k similarity scores
+
+--chunk-configs re-chunks the PDFs in data/ with other size:overlap settings,
+embeds them locally and reports, per configuration and k, how many of each
+query's key facts the retrieved chunks contain, and how large the packed
+context gets. Speed versus accuracy, measured instead of guessed.
+
+--rerank over-fetches candidates per query, reranks them with the
+cross-encoder (src/tools/rerank.py) and compares the kept chunks' key-fact
+coverage and size with the first-stage top-n, along with the rerank latency.
+
+Queries come from an eval dataset (tests/eval_data, `question` and `key_facts`)
+or a text file with one query per line.
+
+Usage:
+    python check_pinecone.py [--queries tests/eval_data/golden.jsonl] [--k 1 3 5 10]
+    python check_pinecone.py --chunk-configs 2000:400 1000:200 500:100
+    python check_pinecone.py --show 3 --no-exact    # print the top matches of each query
+    ANN_NPROBE=16 python check_pinecone.py --backend local    # the local ANN index instead
+    python check_pinecone.py --rerank --no-exact    # cross-encoder reranking against first-stage order
+"""
+import argparse
+import json
 import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from src.utils.embeddings import get_embeddings
+from tests.eval_dataset import DEFAULT_DATASET, iter_samples
 
 load_dotenv()
 
-# Initialize
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("auto-intel-index")
-
-# Test queries
-test_queries = [
-    "What is the boot space capacity?",
-    "What engine oil is recommended?",
-    "tire pressure"
-]
-
-for query in test_queries:
-    print(f"\n{'='*60}")
-    print(f"Query: {query}")
-    print('='*60)
-    
-    query_embedding = embeddings.embed_query(query)
-    results = index.query(
-        vector=query_embedding,
-        top_k=3,
-        include_metadata=True
-    )
-    
-    for i, match in enumerate(results['matches'], 1):
-        print(f"\n[Match {i}] Score: {match['score']:.3f}")
-        print(f"ID: {match['id']}")
-        print(f"Metadata keys: {list(match['metadata'].keys())}")
-        
-        # Print the actual text
-        text = match['metadata'].get('text', match['metadata'].get('content', 'NO TEXT FOUND'))
-        print(f"Text: {text[:300]}...")  # First 300 chars
\ No newline at end of file
+BASE_DIR = Path(__file__).resolve().parent
+FETCH_BATCH = 100
+DEFAULT_KS = (1, 3, 5, 10)
+
+
+def load_queries(path) -> list:
+    """[{"question", "key_facts"}] from an eval dataset, or one query per line of a .txt file."""
+    path = Path(path)
+    if path.suffix == ".txt":
+        with open(path, encoding="utf-8") as f:
+            return [{"question": line.strip(), "key_facts": []} for line in f if line.strip()]
+    return [{"question": s["question"], "key_facts": s["key_facts"]} for s in iter_samples(path)]
+
+
+def percentiles(values, qs=(50, 95, 99)) -> dict:
+    if not len(values):
+        return {f"p{q}": None for q in qs}
+    return {f"p{q}": float(np.percentile(values, q)) for q in qs}
+
+
+def distribution(values) -> dict:
+    if not len(values):
+        return {}
+    values = np.asarray(values, dtype=np.float64)
+    return {"min": float(values.min()), **percentiles(values, (25, 50, 75)), "max": float(values.max()),
+            "mean": float(values.mean())}
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Row indices of the k most cosine-similar corpus vectors per query (both normalized)."""
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def embed_queries(embeddings, questions: list) -> tuple:
+    """Returns (vectors from one batch call, report of single-query and batch timings)."""
+    singles = []
+    for q in questions:
+        start = time.perf_counter()
+        embeddings.embed_query(q)
+        singles.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    batch_s = time.perf_counter() - start
+    return vectors, {
+        "single_ms": percentiles(singles),
+        "batch_s": batch_s,
+        "batch_queries_per_s": len(questions) / batch_s if batch_s else None,
+    }
+
+
+class PineconeBackend:
+    """The manual index in Pinecone, as retrieval uses it."""
+
+    name = "pinecone"
+
+    def __init__(self, index_name: str = None, namespace: str = ""):
+        from pinecone import Pinecone
+
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        self.index = pc.Index(index_name or os.getenv("PINECONE_INDEX_NAME", "auto-intel-index"))
+        self.namespace = namespace
+
+    def query(self, vector, k: int, include_metadata: bool = False) -> list:
+        response = self.index.query(vector=list(map(float, vector)), top_k=k, namespace=self.namespace,
+                                    include_metadata=include_metadata, include_values=False)
+        return response["matches"]
+
+    def vectors(self, limit: int) -> tuple:
+        """(ids, float32 matrix) of up to `limit` stored vectors, for the exact baseline."""
+        ids = []
+        for page in self.index.list(namespace=self.namespace):
+            ids.extend(page)
+            if len(ids) >= limit:
+                ids = ids[:limit]
+                break
+        rows = {}
+        for start in range(0, len(ids), FETCH_BATCH):
+            fetched = self.index.fetch(ids=ids[start:start + FETCH_BATCH], namespace=self.namespace)
+            rows.update({i: v.values for i, v in fetched.vectors.items()})
+        ids = [i for i in ids if i in rows]
+        return ids, np.asarray([rows[i] for i in ids], dtype=np.float32)
+
+
+class LocalBackend:
+    """The local ANN index ingest builds (src/tools/ann_index.py); ANN_NPROBE and ANN_RESCORE apply."""
+
+    name = "local"
+
+    def __init__(self):
+        from src.tools.ann_index import IVFIndex, index_dir, NPROBE, RESCORE
+
+        self.index = IVFIndex.load(index_dir(), nprobe=int(os.getenv("ANN_NPROBE", NPROBE)),
+                                   rescore=int(os.getenv("ANN_RESCORE", RESCORE)))
+
+    def query(self, vector, k: int, include_metadata: bool = False) -> list:
+        return [{"id": i, "score": score, "metadata": {}} for i, score in self.index.search(vector, k)]
+
+    def vectors(self, limit: int) -> tuple:
+        n = min(limit, len(self.index))
+        return [i.decode() for i in self.index.ids[:n]], np.asarray(self.index.vectors[:n], dtype=np.float32)
+
+
+BACKENDS = {"pinecone": PineconeBackend, "local": LocalBackend}
+
+
+def diagnose_index(backend, query_vectors: np.ndarray, ks: list, exact: bool, max_vectors: int) -> dict:
+    """recall@k against the exact baseline, query latency and score distributions per k."""
+    baseline = None
+    if exact:
+        start = time.perf_counter()
+        ids, matrix = backend.vectors(max_vectors)
+        print(f"📥 Fetched {len(ids)} vectors for the exact baseline in {time.perf_counter() - start:.1f}s")
+        if ids:
+            baseline = (np.asarray(ids), normalize(matrix))
+            if len(ids) == max_vectors:
+                print(f"   ⚠️ Stopped at --max-vectors {max_vectors}; recall is against that subset")
+
+    report = {}
+    for k in ks:
+        latencies, top1, all_scores, recalls = [], [], [], []
+        exact_ids = None
+        if baseline is not None:
+            exact_ids = baseline[0][exact_top_k(baseline[1], normalize(query_vectors), k)]
+        for qi, vector in enumerate(query_vectors):
+            start = time.perf_counter()
+            matches = backend.query(vector, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            scores = [m["score"] for m in matches]
+            if scores:
+                top1.append(scores[0])
+                all_scores.extend(scores)
+            if exact_ids is not None:
+                expected = set(exact_ids[qi])
+                recalls.append(len(expected & {m["id"] for m in matches}) / len(expected))
+        report[k] = {
+            "recall": float(np.mean(recalls)) if recalls else None,
+            "query_ms": percentiles(latencies),
+            "top1_score": distribution(top1),
+            "scores": distribution(all_scores),
+        }
+    return report
+
+
+def fact_coverage(texts: list, key_facts: list) -> float:
+    found = " ".join(texts).lower()
+    return sum(1 for fact in key_facts if fact.lower() in found) / len(key_facts)
+
+
+def sweep_chunking(configs: list, data_dir: Path, embeddings, queries: list, query_vectors: np.ndarray, ks: list) -> dict:
+    """Per size:overlap config: chunk count, embedding time, key-fact coverage and context size per k."""
+    from langchain_community.document_loaders import PyPDFLoader
+    from src.scripts.ingest_docs import prepare_chunks
+    from src.tools.context_pack import estimate_tokens
+
+    pdfs = sorted(data_dir.glob("*.pdf"))
+    if not pdfs:
+        print(f"⚠️ No PDFs in {data_dir}, skipping the chunking sweep")
+        return {}
+    pages = [page for pdf in pdfs for page in PyPDFLoader(str(pdf)).load()]
+    print(f"📚 Loaded {len(pages)} pages from {len(pdfs)} manuals")
+
+    with_facts = [i for i, q in enumerate(queries) if q["key_facts"]]
+    normalized_queries = normalize(query_vectors)
+    report = {}
+    for config in configs:
+        size, overlap = (int(n) for n in config.split(":"))
+        chunks = prepare_chunks(pages, chunk_size=size, chunk_overlap=overlap)
+        texts = [c.page_content for c in chunks]
+        start = time.perf_counter()
+        corpus = normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+        embed_s = time.perf_counter() - start
+
+        per_k = {}
+        for k in ks:
+            top = exact_top_k(corpus, normalized_queries, k)
+            per_k[k] = {
+                "fact_coverage": float(np.mean([
+                    fact_coverage([texts[j] for j in top[i]], queries[i]["key_facts"]) for i in with_facts
+                ])) if with_facts else None,
+                "context_tokens": float(np.mean([sum(estimate_tokens(texts[j]) for j in row) for row in top])),
+                "top1_score": float(np.mean([corpus[row[0]] @ q for row, q in zip(top, normalized_queries)])),
+            }
+        report[config] = {"chunks": len(texts), "embed_s": embed_s, "chunks_per_s": len(texts) / embed_s,
+                          "by_k": per_k}
+    return report
+
+
+def match_text(store, match: dict):
+    """A match's chunk text, from the chunk store or else its metadata."""
+    local = store.get(match["id"]) if store is not None else None
+    metadata = match.get("metadata") or {}
+    return local[0] if local else metadata.get("text", metadata.get("content"))
+
+
+def compare_rerank(backend, queries: list, query_vectors: np.ndarray, candidates: int, top_n: int) -> dict:
+    """
+    Key-fact coverage and raw context size of the first-stage top_n against
+    the cross-encoder's top_n of `candidates`, and the rerank latency.
+    """
+    from langchain_core.documents import Document
+    from src.tools.chunk_store import get_chunk_store
+    from src.tools.context_pack import estimate_tokens
+    from src.tools.rerank import Reranker
+
+    store = get_chunk_store()
+    # Nothing cached and no budget, so every query pays (and shows) the full forward pass
+    reranker = Reranker(top_n=top_n, budget_ms=1e9, cache_size=0)
+    latencies, changed = [], 0
+    stages = {"first_stage": {"coverage": [], "tokens": []}, "reranked": {"coverage": [], "tokens": []}}
+    for q, vector in zip(queries, query_vectors):
+        docs = [(Document(id=m["id"], page_content=match_text(store, m) or ""), m["score"])
+                for m in backend.query(vector, candidates, include_metadata=True)]
+        if not docs:
+            continue
+        start = time.perf_counter()
+        reranked = reranker.rerank(q["question"], docs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        changed += reranked[0][0].id != docs[0][0].id
+        for stage, picked in (("first_stage", docs[:top_n]), ("reranked", reranked)):
+            texts = [d.page_content for d, _ in picked]
+            stages[stage]["tokens"].append(sum(estimate_tokens(t) for t in texts))
+            if q["key_facts"]:
+                stages[stage]["coverage"].append(fact_coverage(texts, q["key_facts"]))
+    return {
+        "candidates": candidates,
+        "top_n": top_n,
+        "rerank_ms": percentiles(latencies),
+        "top1_changed": changed / len(latencies) if latencies else None,
+        **{stage: {"fact_coverage": float(np.mean(r["coverage"])) if r["coverage"] else None,
+                   "context_tokens": float(np.mean(r["tokens"])) if r["tokens"] else None}
+           for stage, r in stages.items()},
+    }
+
+
+def show_matches(backend, queries: list, query_vectors: np.ndarray, n: int):
+    """The old check: top matches per query with their text (from the chunk store, else metadata)."""
+    from src.tools.chunk_store import get_chunk_store
+
+    store = get_chunk_store()
+    for q, vector in zip(queries, query_vectors):
+        print(f"\n{'=' * 60}\nQuery: {q['question']}\n{'=' * 60}")
+        for i, match in enumerate(backend.query(vector, n, include_metadata=True), 1):
+            metadata = match.get("metadata") or {}
+            text = match_text(store, match) or "NO TEXT FOUND"
+            print(f"\n[Match {i}] Score: {match['score']:.3f}  ID: {match['id']}")
+            print(f"Metadata keys: {list(metadata.keys())}")
+            print(f"Text: {text[:300]}...")
+
+
+def fmt(value, spec: str = ".3f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(report: dict):
+    emb = report["embedding"]
+    print(f"\n🧮 Embedding: single p50 {fmt(emb['single_ms']['p50'], '.1f')} ms, "
+          f"p95 {fmt(emb['single_ms']['p95'], '.1f')} ms; batch {fmt(emb['batch_queries_per_s'], '.1f')} queries/s")
+
+    print(f"\n🔎 {report['backend']}: {report['queries']} queries")
+    print(f"{'k':>4} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'top1 p50':>9} {'top1 min':>9} {'score p25':>10}")
+    for k, r in report["index"].items():
+        print(f"{k:>4} {fmt(r['recall']):>7} {fmt(r['query_ms']['p50'], '.1f'):>8} {fmt(r['query_ms']['p95'], '.1f'):>8} "
+              f"{fmt(r['query_ms']['p99'], '.1f'):>8} {fmt(r['top1_score'].get('p50')):>9} "
+              f"{fmt(r['top1_score'].get('min')):>9} {fmt(r['scores'].get('p25')):>10}")
+
+    if report.get("rerank"):
+        r = report["rerank"]
+        print(f"\n🎯 Rerank: top {r['top_n']} of {r['candidates']} candidates, "
+              f"p50 {fmt(r['rerank_ms']['p50'], '.1f')} ms, p95 {fmt(r['rerank_ms']['p95'], '.1f')} ms, "
+              f"top-1 changed for {fmt(r['top1_changed'], '.0%')} of queries")
+        for stage in ("first_stage", "reranked"):
+            print(f"   {stage:<12} facts {fmt(r[stage]['fact_coverage'], '.2f')}, "
+                  f"context ~{fmt(r[stage]['context_tokens'], '.0f')} tokens")
+
+    if report.get("chunking"):
+        print("\n✂️ Chunking (exact search over a local re-embedding)")
+        print(f"{'size:overlap':>13} {'chunks':>7} {'chunks/s':>9} {'k':>3} {'facts':>6} {'ctx tok':>8} {'top1':>6}")
+        for config, r in report["chunking"].items():
+            for k, s in r["by_k"].items():
+                print(f"{config:>13} {r['chunks']:>7} {r['chunks_per_s']:>9.1f} {k:>3} {fmt(s['fact_coverage'], '.2f'):>6} "
+                      f"{s['context_tokens']:>8.0f} {s['top1_score']:>6.3f}")
+
+
+def main(args) -> dict:
+    queries = load_queries(args.queries)
+    if not queries:
+        print(f"❌ No queries in {args.queries}")
+        sys.exit(1)
+    embeddings = get_embeddings()
+    query_vectors, embedding_report = embed_queries(embeddings, [q["question"] for q in queries])
+
+    backend = BACKENDS[args.backend]()
+    if args.show:
+        show_matches(backend, queries, query_vectors, args.show)
+
+    ks = sorted(set(args.k))
+    report = {
+        "backend": backend.name,
+        "queries": len(queries),
+        "embedding": embedding_report,
+        "index": diagnose_index(backend, query_vectors, ks, not args.no_exact, args.max_vectors),
+    }
+    if args.rerank:
+        report["rerank"] = compare_rerank(backend, queries, query_vectors, args.rerank_candidates, args.rerank_top_n)
+    if args.chunk_configs:
+        report["chunking"] = sweep_chunking(args.chunk_configs, Path(args.data_dir), embeddings,
+                                            queries, query_vectors, ks)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Wrote {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency diagnostics.")
+    parser.add_argument("--queries", default=str(DEFAULT_DATASET), help="Eval dataset or .txt file of queries")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="pinecone")
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_KS))
+    parser.add_argument("--no-exact", action="store_true", help="Skip fetching vectors for the exact baseline")
+    parser.add_argument("--max-vectors", type=int, default=20000, help="Vectors fetched for the exact baseline")
+    parser.add_argument("--chunk-configs", nargs="*", metavar="SIZE:OVERLAP", help="Chunking settings to sweep")
+    parser.add_argument("--data-dir", default=str(BASE_DIR / "data"), help="Manual PDFs for the chunking sweep")
+    parser.add_argument("--rerank", action="store_true", help="Compare the first-stage top-n with the cross-encoder's")
+    parser.add_argument("--rerank-candidates", type=int, default=10, help="Chunks the cross-encoder reranks")
+    parser.add_argument("--rerank-top-n", type=int, default=3, help="Chunks kept after reranking")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="Print the top N matches per query")
+    parser.add_argument("--output", help="Write the report as JSON")
+    main(parser.parse_args())
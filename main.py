@@ -2,6 +2,7 @@ import os
 import uuid
 from dotenv import load_dotenv
 from src.agent.graph import app
+from src.utils.memprof import profiler
 from langchain_core.messages import HumanMessage
 
 load_dotenv()
@@ -20,6 +21,8 @@ def run_autointel_agent():
     while True:
         user_input = input("\n👤 User: ")
         if user_input.lower() in ["quit", "exit", "q"]:
+            if profiler.enabled:
+                print(profiler.report())
             print("Goodbye! Drive safely. 🚗")
             break
         
@@ -38,26 +41,29 @@ def run_autointel_agent():
 
         try:
             # Invoke the agent with stream
-            for event in app.stream(inputs, config, stream_mode="updates"):
-                for node_name, output in event.items():
-                    # LLMOps Logging: Show which node just fired
-                    print(f"   [Node: {node_name}]")
+            with profiler.turn(label=user_input[:60]) as turn:
+                for event in app.stream(inputs, config, stream_mode="updates"):
+                    for node_name, output in event.items():
+                        # LLMOps Logging: Show which node just fired
+                        print(f"   [Node: {node_name}]")
 
-                    # Check if output is not None and has messages
-                    if output is not None and "messages" in output and len(output.get("messages", [])) > 0:
-                        last_msg = output["messages"][-1]
+                        # Check if output is not None and has messages
+                        if output is not None and "messages" in output and len(output.get("messages", [])) > 0:
+                            last_msg = output["messages"][-1]
                         
-                        # Handle both tuple and Message object formats
-                        if isinstance(last_msg, tuple):
-                            content = last_msg[1]
-                        elif hasattr(last_msg, 'content'):
-                            content = last_msg.content
-                        else:
-                            content = str(last_msg)
+                            # Handle both tuple and Message object formats
+                            if isinstance(last_msg, tuple):
+                                content = last_msg[1]
+                            elif hasattr(last_msg, 'content'):
+                                content = last_msg.content
+                            else:
+                                content = str(last_msg)
                         
-                        # Only print if it's from assistant (not echoing user input)
-                        if node_name not in ["router", "safety_node"]:
-                            print(f"\n🤖 Assistant: {content}\n")
+                            # Only print if it's from assistant (not echoing user input)
+                            if node_name not in ["router", "safety_node"]:
+                                print(f"\n🤖 Assistant: {content}\n")
+            if turn is not None:
+                print(f"   🧠 Turn memory: peak {turn.peak_kb:.0f} KB, retained {turn.retained_kb:.0f} KB")
                             
         except GeneratorExit:
             print("⚠️ Stream was interrupted")
@@ -1,76 +1,220 @@
 import os 
-from typing import TypedDict, Annotated, Sequence
-from langchain_groq import ChatGroq
+from src.utils.cassette import install_from_env
+
+# Record/replay external calls when AUTOINTEL_CASSETTE is set; must run before
+# the nodes build their clients
+install_from_env()
+
+import re
+from typing import TypedDict, Annotated, Sequence, List, Dict
 from langgraph.graph import StateGraph, END, START   
 from langchain_core.messages import BaseMessage, AIMessage
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
+try:
+    from langgraph.types import Send
+except ImportError:  # langgraph < 0.2.30
+    from langgraph.constants import Send
 
 from src.agent.safety import is_content_safe
-from src.agent.nodes import call_rag, call_api, call_review
+from src.agent.nodes import call_rag, call_api, call_review, vehicle_context
+from src.agent.prefetch import prefetcher
+from src.utils.llm import make_llm
+from src.utils.metrics import instrument_node, start_from_env
+from src.utils.memprof import profile_node, enable_from_env
+from src.utils.resilience import deadline_node, new_deadline
+from src.utils.vehicles import extract_vehicles
+from src.utils.log import get_logger, log_node
+
+log = get_logger(__name__)
 
 # Initialize the LLM
-llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+llm = make_llm()
+
+def collect_branch_results(existing, update):
+    """Parallel branches append their answers; the router resets the list each turn."""
+    if update is None:
+        return []
+    return (existing or []) + update
 
 # Define Agent State
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     next_action: str
+    intents: List[str]
+    questions: Dict[str, str]
+    question: str
+    branch_results: Annotated[list, collect_branch_results]
+    deadline: float
+
+# Enhanced review keywords
+REVIEW_KEYWORDS = [
+    "review", "reviews", 
+    "comparison", "compare", "vs", "versus",
+    "better", "best", "top",
+    "rating", "ratings",
+    "opinion", "thoughts",
+    "worth it", "worth buying",
+    "should i buy", "should i get",
+    "recommend", "recommendation",
+    "alternatives", "options",
+    "which car", "which suv", "which sedan",
+    "luxury", "affordable", "budget",
+    "reliable", "most reliable"
+]
+
+# API keywords
+API_KEYWORDS = [
+    "recall", "recalls", "recalled",
+    "vin", 
+    "service history", 
+    "mileage",
+    "safety issue", "safety issues",
+    "defect", "defects",
+    "nhtsa"
+]
+
+# A question is split into parts at '?', ';' and at "and"/"also"/"plus" that start a new question
+CLAUSE_SPLIT_RE = re.compile(
+    r"[?;]|\b(?:and|also|plus)\b(?=\s+(?:are|is|any|what|how|does|do|can|should|which|when|where|tell))",
+    re.IGNORECASE,
+)
+QUESTION_CUE_RE = re.compile(r"\b(?:what|how|which|where|when|why|does|do|can|is|are|should|tell|explain)\b",
+                             re.IGNORECASE)
+
+def classify_intent(text: str) -> str:
+    """Single-intent routing: review keywords win, then API keywords, else RAG."""
+    if any(keyword in text for keyword in REVIEW_KEYWORDS):
+        return "review"
+    if any(keyword in text for keyword in API_KEYWORDS):
+        return "api"
+    return "rag"
+
+def detect_intents(msg: str) -> list:
+    """
+    Classifies each part of a multi-part question and returns (intent, clause)
+    pairs, e.g. "what oil does my 2024 Creta take and are there any recalls?"
+    -> [('rag', 'what oil does my 2024 Creta take'), ('api', 'are there any recalls')].
+    Parts with the same intent are joined into one clause. Parts that match
+    no keyword only count as a manual question when they ask something, so a
+    trailing "thanks!" doesn't start a RAG branch.
+    """
+    clauses = [c.strip() for c in CLAUSE_SPLIT_RE.split(msg) if c and c.strip()]
+    if len(clauses) <= 1:
+        return [(classify_intent(msg.lower()), msg)]
+
+    parts = {}
+    for clause in clauses:
+        intent = classify_intent(clause.lower())
+        if intent == "rag" and not QUESTION_CUE_RE.search(clause):
+            continue
+        parts.setdefault(intent, []).append(clause)
+    if not parts:
+        return [(classify_intent(msg.lower()), msg)]
+    return [(intent, " and ".join(texts)) for intent, texts in parts.items()]
+
+def branch_question(intent: str, clause: str, question: str) -> str:
+    """
+    The question a branch answers: its clause, plus for manual and recall
+    lookups the vehicle named in another part ("...and are there any recalls"
+    needs the Creta from the first part). Review clauses are left alone so a
+    comparison isn't narrowed to one of its cars.
+    """
+    if intent == "review" or clause == question or extract_vehicles(clause):
+        return clause
+    vehicles = extract_vehicles(question)
+    if not vehicles:
+        return clause
+    v = vehicles[0]
+    return f"{clause} ({' '.join(str(p) for p in (v.year, v.make, v.model) if p)})"
 
 # Router Node
 def router_node(state: AgentState):
     """
-    Analyses the user query and decides: 'rag', 'api', or 'review'.
+    Analyses the user query and decides which of 'rag', 'api' and 'review'
+    should answer it; multi-part questions get several.
     """
     messages = state.get("messages", [])
     if not messages or len(messages) == 0:
-        return {"next_action": "rag"}
+        return {"next_action": "rag", "intents": ["rag"], "questions": {}, "branch_results": None,
+                "deadline": new_deadline()}
     
     if hasattr(messages[-1], 'content'):
-        msg = messages[-1].content.lower()
+        question = messages[-1].content
     else:
-        msg = str(messages[-1]).lower()
+        question = str(messages[-1])
+    msg = question.lower()
 
-    print(f"🔀 Router analyzing: {msg[:100]}...")
-    
-    # Enhanced review keywords
-    review_keywords = [
-        "review", "reviews", 
-        "comparison", "compare", "vs", "versus",
-        "better", "best", "top",
-        "rating", "ratings",
-        "opinion", "thoughts",
-        "worth it", "worth buying",
-        "should i buy", "should i get",
-        "recommend", "recommendation",
-        "alternatives", "options",
-        "which car", "which suv", "which sedan",
-        "luxury", "affordable", "budget",
-        "reliable", "most reliable"
-    ]
-    
-    if any(keyword in msg for keyword in review_keywords):
-        print(f"   → Routing to REVIEW")
-        return {"next_action": "review"}
-    
-    # API keywords
-    api_keywords = [
-        "recall", "recalls", "recalled",
-        "vin", 
-        "service history", 
-        "mileage",
-        "safety issue", "safety issues",
-        "defect", "defects",
-        "nhtsa"
-    ]
-    
-    if any(keyword in msg for keyword in api_keywords):
-        print(f"   → Routing to API")
-        return {"next_action": "api"}
-    
-    # Default to RAG
-    print(f"   → Routing to RAG")
-    return {"next_action": "rag"}
+    # External calls in the rest of the turn share one latency budget
+    deadline = new_deadline()
+
+    log.info("router.analyze", "🔀 Router analyzing: %s...", msg[:100])
+
+    routes = detect_intents(question)
+    intents = [intent for intent, _ in routes]
+    questions = {intent: branch_question(intent, clause, question) for intent, clause in routes}
+
+    # Start retrieval (and a recall lookup for a named vehicle) as soon as the
+    # route is known; the branches take the results if they need them
+    prefetcher.start(question, vehicle_context(messages), deadline, query=questions.get("rag"))
+
+    log.info("router.route", "   → Routing to %s", " + ".join(i.upper() for i in intents), intents=intents)
+    return {"next_action": intents[0], "intents": intents, "questions": questions,
+            "branch_results": None, "deadline": deadline}
+
+def route_intents(state: AgentState):
+    """
+    Fans out to one tool node per intent; they run concurrently. Each branch
+    gets its own part of the question in `question`.
+    """
+    intents = state.get("intents") or [state.get("next_action", "rag")]
+    questions = state.get("questions") or {}
+    sends = []
+    for intent in intents:
+        branch_state = dict(state)
+        if intent in questions:
+            branch_state["question"] = questions[intent]
+        sends.append(Send(f"{intent}_node", branch_state))
+    return sends
+
+def as_branch(intent: str, node):
+    """Runs a tool node as a fan-out branch, collecting its answer for merge_node."""
+    def branch(state):
+        update = node(state) or {}
+        results = []
+        for message in update.get("messages", [])[-1:]:
+            content = message.content if hasattr(message, 'content') else str(message)
+            results.append({"intent": intent, "content": content})
+        return {"branch_results": results}
+    branch.__name__ = getattr(node, "__name__", intent)
+    return branch
+
+BRANCH_TITLES = {
+    "rag": "🔧 From the owner's manual",
+    "api": "🛡️ Safety recalls",
+    "review": "📰 Expert reviews",
+}
+
+# Merge Node
+def merge_node(state: AgentState):
+    """
+    Combines the branch answers into one assistant message, in the order the
+    parts were asked. A single branch's answer is passed through unchanged.
+    """
+    messages = state.get("messages", [])
+    if messages and hasattr(messages[-1], 'content'):
+        prefetcher.discard(messages[-1].content)
+
+    results = state.get("branch_results") or []
+    if not results:
+        return {"messages": [AIMessage(content="I apologize, but I couldn't generate a response. Please try again.")]}
+    if len(results) == 1:
+        return {"messages": [AIMessage(content=results[0]["content"])]}
+
+    order = state.get("intents") or []
+    results = sorted(results, key=lambda r: order.index(r["intent"]) if r["intent"] in order else len(order))
+    sections = [f"**{BRANCH_TITLES.get(r['intent'], r['intent'])}**\n\n{r['content']}" for r in results]
+    return {"messages": [AIMessage(content="\n\n---\n\n".join(sections))]}
 
 # Safety Check Node
 def safety_check_node(state: AgentState):
@@ -93,43 +237,47 @@ def safety_check_node(state: AgentState):
             redacted_msg = AIMessage(content="⚠️ I'm sorry, but I cannot provide that information as it violates my safety policy regarding vehicle security or dangerous procedures.")
             return {"messages": [redacted_msg]}
     except Exception as e:
-        print(f"⚠️ Safety check failed: {e}")
+        log.warning("safety.failed", "⚠️ Safety check failed: %s", e)
         # If safety check fails, allow the message through
         pass
     
     # If safe, return empty dict (no changes)
     return {}
 
+def wrap_node(name: str, fn):
+    """Adds metrics, log context, (opt-in) memory profiling and the turn deadline around a node."""
+    return instrument_node(name, log_node(name, profile_node(name, deadline_node(fn))))
+
 # Build the Graph
 workflow = StateGraph(AgentState)
 
 # Add nodes
-workflow.add_node("router", router_node)
-workflow.add_node("rag_node", call_rag)
-workflow.add_node("api_node", call_api)
-workflow.add_node("review_node", call_review)
-workflow.add_node("safety_node", safety_check_node)
+workflow.add_node("router", wrap_node("router", router_node))
+workflow.add_node("rag_node", wrap_node("rag_node", as_branch("rag", call_rag)))
+workflow.add_node("api_node", wrap_node("api_node", as_branch("api", call_api)))
+workflow.add_node("review_node", wrap_node("review_node", as_branch("review", call_review)))
+workflow.add_node("merge_node", wrap_node("merge_node", merge_node))
+workflow.add_node("safety_node", wrap_node("safety_node", safety_check_node))
 
 # Define edges
 workflow.add_edge(START, "router")
 
-# Conditional routing from router
-workflow.add_conditional_edges(
-    "router", 
-    lambda x: x.get("next_action", "rag"), 
-    {
-        "rag": "rag_node", 
-        "api": "api_node",
-        "review": "review_node"
-    }
-)
+# Fan out from the router to every matching tool node
+workflow.add_conditional_edges("router", route_intents, ["rag_node", "api_node", "review_node"])
 
-# All tools flow to Safety before ending
-workflow.add_edge("rag_node", "safety_node")
-workflow.add_edge("api_node", "safety_node")
-workflow.add_edge("review_node", "safety_node")
+# Branches are merged into one answer, which goes to Safety before ending
+workflow.add_edge("rag_node", "merge_node")
+workflow.add_edge("api_node", "merge_node")
+workflow.add_edge("review_node", "merge_node")
+workflow.add_edge("merge_node", "safety_node")
 workflow.add_edge("safety_node", END)
 
 # Compile with Persistence
 memory = MemorySaver()
-app = workflow.compile(checkpointer=memory)
\ No newline at end of file
+app = workflow.compile(checkpointer=memory)
+
+# Expose Prometheus metrics if AUTOINTEL_METRICS_PORT / AUTOINTEL_METRICS_FILE is set
+start_from_env()
+
+# Per-node allocation profiling if AUTOINTEL_MEMPROFILE=1
+enable_from_env()
\ No newline at end of file
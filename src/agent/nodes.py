@@ -1,12 +1,18 @@
-from src.tools.car_api import car_service_api
+from src.tools.car_api import car_service_api, recall_key
 from src.agent.state import VehicleDetails, AgentState
-from langchain_groq import ChatGroq
+from src.utils.llm import make_llm
 from src.tools.pinecone_rag import pinecone_rag_tool
 from src.tools.car_review import car_review_tool
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage
+from src.utils.vehicles import extract_vehicles
+from src.agent.prefetch import prefetcher
+from src.utils.resilience import guarded_call, GuardError, time_left
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
 
 # Initialize LLM once at module level
-llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+llm = make_llm()
 extractor = llm.with_structured_output(VehicleDetails)
 
 # RAG System Prompt
@@ -27,35 +33,77 @@ INSTRUCTIONS:
 4. Keep your tone professional and helpful.
 """
 
+def vehicle_context(messages) -> str:
+    """The latest earlier user message that names a vehicle, used to scope manual search."""
+    for message in reversed(messages[:-1]):
+        if isinstance(message, HumanMessage) and extract_vehicles(message.content):
+            return message.content
+    return ""
+
+def manual_excerpt(context: str, limit: int = 1200) -> str:
+    """Degraded RAG answer: the retrieved manual text itself, when the LLM can't be reached."""
+    text = context.replace("Source: ", "📄 ").replace("Content: ", "")
+    if len(text) > limit:
+        text = text[:limit].rsplit(" ", 1)[0] + "..."
+    return ("I can't generate a full answer right now, but here is the relevant part of the manual:\n\n"
+            + text)
+
+def extract_vehicle_details(text: str):
+    """Degraded extraction with the rule-based parser, when the LLM can't be reached."""
+    vehicles = extract_vehicles(text)
+    if not vehicles:
+        return VehicleDetails()
+    v = vehicles[0]
+    return VehicleDetails(year=v.year, make=v.make.title(), model=v.model.title() if v.model else None)
+
+def asked_question(state) -> str:
+    """The part of the user's question this branch answers (set by the router), else the whole last message."""
+    if state.get("question"):
+        return state["question"]
+    messages = state.get("messages", [])
+    if not messages:
+        return ""
+    return messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
+
 def call_rag(state):
     """
     RAG node that retrieves from Pinecone and generates answer.
     """
     messages = state.get("messages", [])
+    last_msg = asked_question(state) or "No question found."
     
-    if messages:
-        last_msg = messages[-1].content
-    else:
-        last_msg = "No question found."
+    log.info("rag.search", "🔍 Searching manuals for: %s", last_msg)
     
-    print(f"🔍 Searching manuals for: {last_msg}")
+    try:
+        vehicle_hint = vehicle_context(messages)
+        # The router started this search speculatively; fall back to running it now
+        context = prefetcher.take("rag", (last_msg, vehicle_hint), timeout=time_left())
+        if context is None:
+            context = pinecone_rag_tool.invoke({"query": last_msg, "vehicle_hint": vehicle_hint})
+        log.debug("rag.context", "📄 Retrieved context (first 200 chars): %s...", context[:200], chars=len(context))
+    except GuardError as e:
+        log.warning("rag.search_unavailable", "⚠️ Manual search unavailable: %s", e)
+        return {"messages": [AIMessage(content="I'm sorry, the service manual search is temporarily unavailable. Please try again in a moment.")]}
+    except Exception as e:
+        log.exception("rag.search_error", "Error in call_rag: %s", e)
+        return {"messages": [AIMessage(content="I'm sorry, I encountered an error while searching the manual. Please try again.")]}
     
     try:
-        context = pinecone_rag_tool.invoke(last_msg)
-        print(f"📄 Retrieved context (first 200 chars): {context[:200]}...")
-        
         formatted_prompt = RAG_SYSTEM_PROMPT.format(context=context, question=last_msg)
-        response = llm.invoke(formatted_prompt)
+        response = guarded_call("groq", lambda timeout: llm.invoke(formatted_prompt, timeout=timeout))
         
-        print(f"💬 LLM Response: {response.content[:200]}...")
+        log.debug("rag.response", "💬 LLM Response: %s...", response.content[:200], chars=len(response.content))
         
         if isinstance(response, str):
             return {"messages": [AIMessage(content=response)]}
         else:
             return {"messages": [response]}
-            
+    
+    except GuardError as e:
+        log.warning("rag.llm_unavailable", "⚠️ LLM unavailable, answering with the manual excerpt: %s", e)
+        return {"messages": [AIMessage(content=manual_excerpt(context))]}
     except Exception as e:
-        print(f"Error in call_rag: {e}")
+        log.exception("rag.llm_error", "Error in call_rag: %s", e)
         return {"messages": [AIMessage(content="I'm sorry, I encountered an error while searching the manual. Please try again.")]}
 
 def call_api(state):
@@ -67,12 +115,9 @@ def call_api(state):
     if not messages:
         return {"messages": [AIMessage(content="No message found.")]}
     
-    if hasattr(messages[-1], 'content'):
-        last_message = messages[-1].content
-    else:
-        last_message = str(messages[-1])
+    last_message = asked_question(state)
     
-    print(f"🚗 Extracting vehicle details from: {last_message}")
+    log.info("api.extract", "🚗 Extracting vehicle details from: %s", last_message)
     
     extraction_prompt = f"""Extract the vehicle information from this question.
     
@@ -87,8 +132,13 @@ If the model is not mentioned, use the make name.
 Return the information in a structured format."""
     
     try:
-        vehicle_info = extractor.invoke(extraction_prompt)
-        print(f"✅ Extracted: Year={vehicle_info.year}, Make={vehicle_info.make}, Model={vehicle_info.model}")
+        try:
+            vehicle_info = guarded_call("groq", lambda timeout: extractor.invoke(extraction_prompt, timeout=timeout))
+        except GuardError as e:
+            log.warning("api.llm_unavailable", "⚠️ LLM unavailable, extracting vehicle with rules: %s", e)
+            vehicle_info = extract_vehicle_details(last_message)
+        log.info("api.extracted", "✅ Extracted: Year=%s, Make=%s, Model=%s",
+                 vehicle_info.year, vehicle_info.make, vehicle_info.model)
 
         if not vehicle_info.year:
             return {"messages": [AIMessage(content="I need the vehicle year to check for recalls. Please specify the year (e.g., '2024 BMW recalls').")]}
@@ -98,18 +148,22 @@ Return the information in a structured format."""
         
         if not vehicle_info.model or vehicle_info.model.lower() in ["unknown", "not specified"]:
             vehicle_info.model = vehicle_info.make
-            print(f"⚠️ Model not specified, using make as model: {vehicle_info.model}")
+            log.info("api.model_defaulted", "⚠️ Model not specified, using make as model: %s", vehicle_info.model)
 
-        api_response = car_service_api.invoke({
-            "make": vehicle_info.make,
-            "model": vehicle_info.model,
-            "year": vehicle_info.year
-        })
+        # Used only if the router guessed the same vehicle the LLM extracted
+        api_response = prefetcher.take("recalls", recall_key(vehicle_info.make, vehicle_info.model, vehicle_info.year),
+                                       timeout=time_left())
+        if api_response is None:
+            api_response = car_service_api.invoke({
+                "make": vehicle_info.make,
+                "model": vehicle_info.model,
+                "year": vehicle_info.year
+            })
         
         return {"messages": [AIMessage(content=str(api_response))]}
 
     except Exception as e:
-        print(f"❌ Error in call_api: {e}")
+        log.exception("api.error", "❌ Error in call_api: %s", e)
         return {"messages": [AIMessage(content="I couldn't extract the vehicle information. Please provide the year, make, and model.")]}
 
 def call_review(state):
@@ -121,19 +175,14 @@ def call_review(state):
     if not messages or len(messages) == 0:
         return {"messages": [AIMessage(content="No message found.")]}
     
-    if hasattr(messages[-1], 'content'):
-        last_message = messages[-1].content
-    else:
-        last_message = str(messages[-1])
+    last_message = asked_question(state)
     
-    print(f"📰 Fetching car review for: {last_message}")
+    log.info("review.fetch", "📰 Fetching car review for: %s", last_message)
     
     try:
         review_response = car_review_tool.invoke(last_message)
         return {"messages": [AIMessage(content=review_response)]}
         
     except Exception as e:
-        print(f"❌ Error in call_review: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("review.error", "❌ Error in call_review: %s", e)
         return {"messages": [AIMessage(content=f"I encountered an error while fetching reviews. Please try searching on caranddriver.com directly.")]}
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Speculative prefetch for the graph's slow, read-only lookups.
+
+RAG is the default route and a recall lookup only needs make/model/year, so
+both can start as soon as a user message arrives instead of after routing
+(and, for recalls, after the LLM extraction in call_api):
+
+- `start()` is called by the router with the new message and the turn's
+  deadline. It submits the manual retrieval (embedding, Pinecone search,
+  packing) for the RAG branch's part of the message and, when the message names a make, model and year, the NHTSA
+  recall lookup to a small thread pool. The lookups run under that deadline,
+  so their guarded calls share the turn's budget.
+- The tool nodes call `take()` with the arguments they would have used and
+  the time left in the turn. A matching prefetch is a hit and its result is
+  used, waiting for it if it is still running (at most `timeout`); anything
+  else is a miss and the node makes the call itself.
+- `discard()` runs once the branches are done. Prefetches nobody took are
+  cancelled, or left to finish and dropped, and counted as wasted.
+
+Entries belong to the conversation (LangGraph thread_id) that started them,
+so two users asking the same question neither take nor discard each other's.
+
+Both lookups are idempotent reads, so a wasted prefetch only costs backend
+load. Settings:
+
+    AUTOINTEL_PREFETCH=0           turn the layer off
+    AUTOINTEL_PREFETCH_RECALLS=0   prefetch manual retrieval only
+
+Metrics: autointel_prefetch_total{kind,outcome} gives the hit rate, and
+autointel_prefetch_saved_seconds{kind} how much of the lookup had already run
+by the time the node asked for it.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from src.tools.car_api import lookup_recalls, recall_key
+from src.tools.pinecone_rag import retrieve_context
+from src.utils.metrics import PREFETCH, PREFETCH_SAVED
+from src.utils.vehicles import extract_vehicles
+from src.utils.log import get_logger, bind_log_context, graph_thread_id
+from src.utils.resilience import turn_deadline
+
+log = get_logger(__name__)
+
+# Entries older than this belong to turns that never reached discard()
+STALE_AFTER_S = 60
+
+
+class _Entry:
+    def __init__(self, owner: tuple, future):
+        self.owner = owner    # (thread_id, question)
+        self.future = future
+        self.submitted = time.perf_counter()
+        self.duration = None  # set by the worker when the lookup finishes
+
+
+class Prefetcher:
+    def __init__(self, workers: int = 4, enabled: bool = True, recalls: bool = True):
+        self.enabled = enabled
+        self.recalls = recalls
+        self.entries = {}  # (thread_id, kind, key) -> _Entry
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def _submit(self, kind: str, key: tuple, owner: tuple, deadline, fn, *args):
+        entry_key = (owner[0], kind, key)
+        with self.lock:
+            if entry_key in self.entries:
+                return
+            entry = _Entry(owner, None)
+
+            def run():
+                start = time.perf_counter()
+                try:
+                    with turn_deadline(deadline):
+                        return fn(*args)
+                finally:
+                    entry.duration = time.perf_counter() - start
+
+            entry.future = self.pool.submit(bind_log_context(run))
+            self.entries[entry_key] = entry
+
+    def _sweep(self):
+        cutoff = time.perf_counter() - STALE_AFTER_S
+        with self.lock:
+            stale = [k for k, e in self.entries.items() if e.submitted < cutoff]
+            for k in stale:
+                self.entries.pop(k).future.cancel()
+                PREFETCH.inc(kind=k[1], outcome="wasted")
+
+    def start(self, question: str, vehicle_hint: str = "", deadline: float = None, query: str = None):
+        """
+        Starts the lookups `question` is likely to need, bounded by the turn
+        `deadline`. `query` is the part of it the RAG branch will search for
+        (default the whole question).
+        """
+        if not self.enabled or not question:
+            return
+        self._sweep()
+        owner = (graph_thread_id(), question)
+        query = query or question
+        self._submit("rag", (query, vehicle_hint), owner, deadline, retrieve_context, query, vehicle_hint)
+
+        if self.recalls:
+            vehicles = extract_vehicles(question)
+            if vehicles and vehicles[0].model and vehicles[0].year:
+                v = vehicles[0]
+                self._submit("recalls", recall_key(v.make, v.model, v.year), owner, deadline,
+                             lookup_recalls, v.make, v.model, v.year)
+
+    def take(self, kind: str, key: tuple, timeout: float = None):
+        """
+        The prefetched result for (kind, key) in this conversation, or None when there is none (or it
+        failed, or is still running after `timeout` seconds) and the caller
+        should make the call itself.
+        """
+        with self.lock:
+            entry = self.entries.pop((graph_thread_id(), kind, key), None)
+        if entry is None:
+            if self.enabled:
+                PREFETCH.inc(kind=kind, outcome="miss")
+            return None
+
+        wait_start = time.perf_counter()
+        try:
+            result = entry.future.result(timeout=None if timeout is None else max(0.0, timeout))
+        except FutureTimeout:
+            entry.future.cancel()
+            log.warning("prefetch.timeout", "   ⏱️ Prefetched %s lookup still running at the deadline", kind)
+            PREFETCH.inc(kind=kind, outcome="miss")
+            return None
+        except Exception as e:
+            log.warning("prefetch.failed", "   ⚠️ Prefetched %s lookup failed, retrying inline: %s", kind, e)
+            PREFETCH.inc(kind=kind, outcome="miss")
+            return None
+        waited = time.perf_counter() - wait_start
+
+        PREFETCH.inc(kind=kind, outcome="hit")
+        saved = max(0.0, (entry.duration or 0.0) - waited)
+        PREFETCH_SAVED.observe(saved, kind=kind)
+        log.info("prefetch.hit", "   ⚡ Prefetched %s hit, saved %.0f ms", kind, saved * 1000)
+        return result
+
+    def discard(self, question: str):
+        """Drops the prefetches this conversation started for `question` that no node took."""
+        owner = (graph_thread_id(), question)
+        with self.lock:
+            unused = [k for k, e in self.entries.items() if e.owner == owner]
+            for k in unused:
+                self.entries.pop(k).future.cancel()
+                PREFETCH.inc(kind=k[1], outcome="wasted")
+
+
+prefetcher = Prefetcher(
+    enabled=os.getenv("AUTOINTEL_PREFETCH", "1") != "0",
+    recalls=os.getenv("AUTOINTEL_PREFETCH_RECALLS", "1") != "0",
+)
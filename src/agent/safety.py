@@ -1,12 +1,13 @@
 import os
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from src.utils.llm import make_llm
+from src.utils.resilience import guarded_call
 from langchain_core.messages import HumanMessage
 load_dotenv()
 
 
 # Specialized Safety Model
-safety_model = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+safety_model = make_llm(priority="safety")
 
 def is_content_safe(content: str) -> bool:
     """
@@ -14,7 +15,9 @@ def is_content_safe(content: str) -> bool:
     """
     # Llama Guard expects a specific prompt format
     # It checks for: Violence, Sexual Content, Criminal Advice, etc.
-    response = safety_model.invoke([HumanMessage(content=content)])
+    # Runs last, so it may use the time the other nodes left in reserve
+    response = guarded_call("groq", lambda timeout: safety_model.invoke([HumanMessage(content=content)], timeout=timeout),
+                            reserve=0)
     
     # Llama Guard returns 'safe' or 'unsafe\n<category>'
     decision = response.content.strip().lower()
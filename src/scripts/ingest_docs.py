@@ -1,12 +1,30 @@
+import json
 import os
 import re
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone, ServerlessSpec
+from src.utils.embeddings import get_embeddings, EMBEDDING_DIM
+from src.utils.vehicles import extract_vehicles
+from src.tools.chunk_store import get_chunk_store, LOCAL_METADATA
+from src.utils.minhash import MinHasher, LSHIndex, similarity
+from src.tools.ann_index import IVFIndex, index_dir as ann_index_dir
+from src.tools.pinecone_rag import catalog_path
+
+# Characters per chunk and overlap between neighbours (check_pinecone.py sweeps these)
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 400
+# Chunks at least this similar (estimated Jaccard over 5-word shingles) are indexed once
+DEDUP_THRESHOLD = 0.8
+# Vectors per upsert request
+UPSERT_BATCH = 100
+# Metadata Pinecone filters on; everything else about a chunk lives in the chunk store
+VEHICLE_TAGS = ("make", "model", "year")
+# Stored with the text so passages fetched from Pinecone still cite their page
+PASSAGE_METADATA = tuple(k for k in LOCAL_METADATA if k != "also_in")
 
 load_dotenv()
 
@@ -21,6 +39,126 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
+def prepare_chunks(pages, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Cleans loaded PDF pages and splits them into the chunks that get embedded.
+    """
+    # Apply cleaning to each page
+    for page in pages:
+        page.page_content = clean_text(page.page_content)
+    
+    # INCREASED CHUNK SIZE: 2000 characters helps keep tables together
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
+    )
+    return text_splitter.split_documents(pages)
+
+def vehicle_metadata(filename, pages) -> dict:
+    """
+    Make/model/year a manual covers, from its file name ("2024_hyundai_creta.pdf")
+    or else the first vehicle named on its opening pages. Stored on every chunk
+    so retrieval can filter to the asked-about vehicle.
+    """
+    stem = re.sub(r'[_\-]+', ' ', Path(filename).stem)
+    vehicles = extract_vehicles(stem)
+    if not vehicles:
+        vehicles = extract_vehicles(" ".join(p.page_content for p in pages[:3]))
+    if not vehicles:
+        return {}
+    v = vehicles[0]
+    # Pinecone metadata can't hold nulls
+    return {k: val for k, val in (("make", v.make), ("model", v.model), ("year", v.year)) if val is not None}
+
+def dedup_chunks(docs, threshold: float = DEDUP_THRESHOLD):
+    """
+    Collapses near-duplicate chunks of the same vehicle (estimated Jaccard
+    similarity of word shingles >= threshold) into the first one seen, which
+    lists the pages of the others in `also_in`. Chunks of different vehicles
+    are never merged, so vehicle filters keep matching. Returns (kept, removed).
+    """
+    hasher = MinHasher()
+    lsh = LSHIndex()
+    kept, signatures, groups = [], {}, {}
+    for doc in docs:
+        signature = hasher.signature(doc.page_content)
+        if signature is None:
+            kept.append(doc)
+            continue
+        group = tuple(doc.metadata.get(k) for k in VEHICLE_TAGS)
+        canonical = next(
+            (i for i in sorted(lsh.candidates(signature))
+             if groups[i] == group and similarity(signatures[i], signature) >= threshold),
+            None,
+        )
+        if canonical is None:
+            signatures[len(kept)], groups[len(kept)] = signature, group
+            lsh.add(len(kept), signature)
+            kept.append(doc)
+        else:
+            source = Path(str(doc.metadata.get("source", ""))).name
+            kept[canonical].metadata.setdefault("also_in", []).append(f"{source}:{doc.metadata.get('page')}")
+    return kept, len(docs) - len(kept)
+
+def upload_chunks(index, docs, embeddings, store, batch_size: int = UPSERT_BATCH):
+    """
+    Writes chunk texts to the local chunk store and upserts vectors, vehicle
+    tags and the text (with its source, page and start index) to Pinecone. Serving hosts resolve texts from their
+    own copy of the store and fall back to the metadata text when they lack
+    it (.cache/ isn't deployed with the code). PINECONE_STORE_TEXT=0 leaves
+    the text out, for deployments that ship the store with every host.
+    Returns (ids, vectors) for the local ANN index.
+    """
+    ids = store.add(docs)
+    vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    keep_text = os.getenv("PINECONE_STORE_TEXT", "1") != "0"
+    if not keep_text:
+        print("⚠️ PINECONE_STORE_TEXT=0: chunk texts live only in the local store; "
+              "every serving host needs a copy of it or manual searches will fail")
+    for start in range(0, len(docs), batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, len(docs))):
+            metadata = {k: docs[i].metadata[k] for k in VEHICLE_TAGS if k in docs[i].metadata}
+            if keep_text:
+                metadata.update((k, docs[i].metadata[k]) for k in PASSAGE_METADATA if k in docs[i].metadata)
+                metadata["text"] = docs[i].page_content
+            batch.append({"id": ids[i], "values": vectors[i], "metadata": metadata})
+        index.upsert(vectors=batch)
+    return ids, vectors
+
+def write_vehicle_catalog(docs):
+    """
+    Writes make -> model -> years of the tagged chunks, so queries only try
+    filters that can match (src/tools/pinecone_rag.py). Untagged models are
+    stored under "".
+    """
+    catalog = {}
+    for doc in docs:
+        if "make" not in doc.metadata:
+            continue
+        years = catalog.setdefault(doc.metadata["make"], {}).setdefault(doc.metadata.get("model", ""), set())
+        if "year" in doc.metadata:
+            years.add(doc.metadata["year"])
+    path = catalog_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({make: {model: sorted(years) for model, years in models.items()}
+                   for make, models in catalog.items()}, f, indent=2)
+    print(f"🚗 Vehicle catalog: {sum(len(m) for m in catalog.values())} models of {len(catalog)} makes at {path}")
+
+def build_ann_index(ids, vectors, docs):
+    """
+    Builds the local ANN index (src/tools/ann_index.py) over this ingest's
+    chunks, filterable by the same vehicle tags as Pinecone.
+    """
+    tags = [{k: doc.metadata[k] for k in VEHICLE_TAGS if k in doc.metadata} for doc in docs]
+    index = IVFIndex.build(ids, vectors, tags)
+    index.save(ann_index_dir())
+    stats = index.stats()
+    print(f"🗂️ ANN index: {stats['vectors']} vectors in {stats['nlist']} lists, "
+          f"{stats['resident_bytes'] / 2 ** 20:.1f} MB resident, at {ann_index_dir()}")
+
 def ingest_documents():
     # 1. Initialize Pinecone
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
@@ -40,7 +178,7 @@ def ingest_documents():
             print("❌ No indexes found at all. Creating a new one...")
             pc.create_index(
                 name="auto-intel-index",
-                dimension=384,
+                dimension=EMBEDDING_DIM,
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")
             )
@@ -51,29 +189,42 @@ def ingest_documents():
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
     raw_data_dir = BASE_DIR / "data"
     
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
+    store = get_chunk_store()
+    if store is not None:
+        print(f"📦 Chunk texts go to the local store at {store.path}")
 
+    docs = []
     for filename in os.listdir(raw_data_dir):
         if filename.endswith(".pdf"):
             file_path = raw_data_dir / filename
-            print(f"🚀 Cleaning and Ingesting: {filename}")
+            print(f"🚀 Cleaning and Chunking: {filename}")
             
             loader = PyPDFLoader(str(file_path))
             pages = loader.load()
+            file_docs = prepare_chunks(pages)
             
-            # Apply cleaning to each page
-            for page in pages:
-                page.page_content = clean_text(page.page_content)
-            
-            # INCREASED CHUNK SIZE: 2000 characters helps keep tables together
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000, 
-                chunk_overlap=400
-            )
-            docs = text_splitter.split_documents(pages)
-            
-            PineconeVectorStore.from_documents(docs, embeddings, index_name=index_name)
-            print(f"✅ Successfully uploaded {len(docs)} clean chunks.")
+            vehicle = vehicle_metadata(filename, pages)
+            for doc in file_docs:
+                doc.metadata.update(vehicle)
+            print(f"🏷️ Tagged {len(file_docs)} chunks with: {vehicle or 'no vehicle (unfiltered searches only)'}")
+            docs.extend(file_docs)
+
+    # Boilerplate repeats within and across manuals; index each text once
+    if os.getenv("INGEST_DEDUP_DISABLED") != "1":
+        total = len(docs)
+        docs, removed = dedup_chunks(docs, float(os.getenv("INGEST_DEDUP_THRESHOLD", DEDUP_THRESHOLD)))
+        print(f"🧹 Near-duplicates: {total} → {len(docs)} chunks ({removed / max(total, 1):.1%} removed)")
+
+    write_vehicle_catalog(docs)
+    if store is None:
+        PineconeVectorStore.from_documents(docs, embeddings, index_name=index_name)
+    else:
+        ids, vectors = upload_chunks(pc.Index(index_name), docs, embeddings, store)
+        # The chunk store holds the texts the local index's IDs point at
+        if os.getenv("ANN_INDEX_DISABLED") != "1" and docs:
+            build_ann_index(ids, vectors, docs)
+    print(f"✅ Successfully uploaded {len(docs)} clean chunks.")
 
 if __name__ == "__main__":
     ingest_documents()
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Approximate nearest-neighbour index over the manual chunk vectors.
+
+A local alternative to querying Pinecone once every manual for every model
+year is loaded and exact search over float32 vectors gets expensive. It is an
+IVF index over int8 scalar-quantized vectors:
+
+- k-means splits the normalized vectors into `nlist` lists around centroids.
+  A query scores the centroids and only searches its `nprobe` nearest lists.
+- Vectors in the lists are held as int8 codes (a symmetric scale per
+  dimension, 1 byte per dimension instead of 4) and scored with one matrix
+  product.
+- The best `rescore` * k candidates are re-scored exactly against the float32
+  vectors. Those stay on disk (memory-mapped), so only the candidates' rows
+  are read and resident memory is about dim + 44 bytes per vector.
+
+Vehicle filters ({"make": ..., "model": ..., "year": ...}, as Pinecone takes
+them) match exactly; a narrow filter widens the probe until enough candidates
+pass it.
+
+Ingest (src/scripts/ingest_docs.py) builds the index with the chunk store's
+IDs and writes it to ANN_INDEX_DIR (.cache/ann_index). A rebuild replaces the
+directory; running processes pick it up on restart.
+
+Settings:
+
+    RAG_INDEX=local     retrieve from this index instead of Pinecone
+    ANN_NPROBE          lists searched per query (8); higher is slower, better recall
+    ANN_RESCORE         candidates re-scored per result (4)
+    ANN_INDEX_DISABLED  1 to skip building it during ingest
+
+benchmarks/bench_ann.py reports memory per million vectors, queries/s and
+recall@k against exact search for a range of nlist/nprobe settings.
+
+Usage: python -m src.tools.ann_index   # prints the index's stats
+"""
+import json
+import math
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_INDEX_DIR = BASE_DIR / ".cache" / "ann_index"
+NPROBE = 8
+RESCORE = 4
+KMEANS_ITERATIONS = 10
+# Vectors k-means trains on per list; the rest are only assigned
+TRAIN_PER_LIST = 64
+# Vectors assigned to lists per matrix product while building
+ASSIGN_BATCH = 65536
+ID_BYTES = 32
+MAX_CACHED_MASKS = 256
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12, None)
+
+
+def default_nlist(n: int) -> int:
+    """About 4 * sqrt(n) lists, the usual IVF starting point."""
+    return max(1, min(n, int(4 * math.sqrt(n))))
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int, rng) -> np.ndarray:
+    """Spherical k-means (cosine) on `vectors`; returns normalized centroids."""
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        empty = counts == 0
+        # Reseed empty lists with random vectors rather than losing them
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, ids, centroids, offsets, codes, scale, vectors, tags: dict = None,
+                 nprobe: int = NPROBE, rescore: int = RESCORE):
+        self.ids = ids              # S32 array, in list order
+        self.centroids = centroids  # (nlist, dim) float32, normalized
+        self.offsets = offsets      # list i holds rows offsets[i]:offsets[i + 1]
+        self.codes = codes          # (n, dim) int8
+        self.scale = scale          # (dim,) float32, code * scale ~ value
+        self.vectors = vectors      # (n, dim) float32, memory-mapped once loaded
+        self.tags = tags or {}      # tag -> (values list, int32 array of value index, -1 = none)
+        self.nprobe = nprobe
+        self.rescore = rescore
+        self.masks = {}
+        self.masks_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, ids: list, vectors, tags: list = None, nlist: int = None,
+              iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> "IVFIndex":
+        """
+        Index of `vectors` (one row per ID). `tags` is one dict per vector of
+        the values filters may ask for (make, model, year).
+        """
+        vectors = normalize(vectors)
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("can't build an index without vectors")
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist or default_nlist(n), n)
+
+        train = vectors if n <= nlist * TRAIN_PER_LIST else vectors[rng.choice(n, nlist * TRAIN_PER_LIST, replace=False)]
+        centroids = _kmeans(train, nlist, iterations, rng)
+        assignment = np.concatenate([
+            np.argmax(vectors[start:start + ASSIGN_BATCH] @ centroids.T, axis=1)
+            for start in range(0, n, ASSIGN_BATCH)
+        ])
+
+        order = np.argsort(assignment, kind="stable")
+        vectors = vectors[order]
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+
+        scale = np.clip(np.abs(vectors).max(axis=0) / 127, 1e-12, None).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+
+        columns = {}
+        if tags:
+            for name in sorted({k for t in tags for k in t}):
+                values = sorted({t[name] for t in tags if t.get(name) is not None}, key=str)
+                position = {v: i for i, v in enumerate(values)}
+                column = np.array([position.get(t.get(name), -1) for t in tags], dtype=np.int32)
+                columns[name] = (values, column[order])
+
+        ids = np.asarray([str(i) for i in ids], dtype=f"S{ID_BYTES}")[order]
+        return cls(ids, centroids, offsets, codes, scale, vectors, columns)
+
+    def save(self, path):
+        """Writes the index to `path`, replacing any index there."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "ids.npy", self.ids)
+        np.save(tmp / "centroids.npy", self.centroids)
+        np.save(tmp / "offsets.npy", self.offsets)
+        np.save(tmp / "codes.npy", self.codes)
+        np.save(tmp / "scale.npy", self.scale)
+        np.save(tmp / "vectors.npy", np.asarray(self.vectors, dtype=np.float32))
+        for name, (_, column) in self.tags.items():
+            np.save(tmp / f"tag_{name}.npy", column)
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"count": len(self), "nlist": self.nlist,
+                       "tags": {name: values for name, (values, _) in self.tags.items()}}, f)
+
+        # Swap directories; an open index keeps reading the old files until restart
+        old = path.with_name(path.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if path.exists():
+            path.rename(old)
+        tmp.rename(path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, nprobe: int = NPROBE, rescore: int = RESCORE) -> "IVFIndex":
+        path = Path(path)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        tags = {name: (values, np.load(path / f"tag_{name}.npy")) for name, values in meta["tags"].items()}
+        return cls(
+            np.load(path / "ids.npy"), np.load(path / "centroids.npy"), np.load(path / "offsets.npy"),
+            np.load(path / "codes.npy"), np.load(path / "scale.npy"),
+            np.load(path / "vectors.npy", mmap_mode="r"), tags, nprobe=nprobe, rescore=rescore,
+        )
+
+    def _mask(self, vehicle_filter: dict):
+        """Boolean row mask for an exact-match filter (cached; there are few distinct filters)."""
+        key = tuple(sorted(vehicle_filter.items()))
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+            for name, value in vehicle_filter.items():
+                values, column = self.tags.get(name, ([], None))
+                if column is None or value not in values:
+                    mask[:] = False
+                    break
+                mask &= column == values.index(value)
+            with self.masks_lock:
+                if len(self.masks) >= MAX_CACHED_MASKS:
+                    self.masks.clear()
+                self.masks[key] = mask
+        return mask
+
+    def _rows(self, lists) -> np.ndarray:
+        return np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+
+    def search(self, vector, k: int, vehicle_filter: dict = None, nprobe: int = None, rescore: int = None) -> list:
+        """[(id, cosine score)] of the (approximately) k nearest vectors, best first."""
+        query = normalize(vector)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        wanted = k * (rescore or self.rescore)
+        mask = self._mask(vehicle_filter) if vehicle_filter else None
+        if mask is not None and not mask.any():
+            return []
+
+        order = np.argsort(-(self.centroids @ query))
+        rows = self._rows(order[:nprobe])
+        if mask is not None:
+            rows = rows[mask[rows]]
+            # A narrow filter can leave the nearest lists nearly empty; widen the probe
+            probed = nprobe
+            while len(rows) < wanted and probed < self.nlist:
+                more = self._rows(order[probed:probed * 2])
+                rows = np.concatenate([rows, more[mask[more]]])
+                probed *= 2
+        if not len(rows):
+            return []
+
+        approximate = self.codes[rows].astype(np.float32) @ (query * self.scale)
+        if len(rows) > wanted:
+            rows = rows[np.argpartition(-approximate, wanted - 1)[:wanted]]
+        # Sorted rows read the memory-mapped floats front to back
+        rows = np.sort(rows)
+        exact = np.asarray(self.vectors[rows]) @ query
+        best = np.argsort(-exact)[:k]
+        return [(self.ids[rows[i]].decode(), float(exact[i])) for i in best]
+
+    def stats(self) -> dict:
+        resident = (self.ids.nbytes + self.centroids.nbytes + self.offsets.nbytes + self.codes.nbytes
+                    + self.scale.nbytes + sum(column.nbytes for _, column in self.tags.values()))
+        sizes = np.diff(self.offsets)
+        return {
+            "vectors": len(self),
+            "dim": self.codes.shape[1],
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "list_size_max": int(sizes.max()),
+            "resident_bytes": int(resident),
+            "on_disk_float_bytes": int(self.vectors.nbytes),
+            "mb_per_million": resident / len(self) * 1e6 / 2 ** 20,
+        }
+
+
+def index_dir() -> Path:
+    return Path(os.getenv("ANN_INDEX_DIR", str(DEFAULT_INDEX_DIR)))
+
+
+_index = None
+_index_lock = threading.Lock()
+_missing = False
+
+
+def get_ann_index():
+    """The process-wide index when RAG_INDEX=local and ingest has built one, else None."""
+    global _index, _missing
+    if os.getenv("RAG_INDEX", "pinecone") != "local" or _missing:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None and not _missing:
+                try:
+                    _index = IVFIndex.load(index_dir(), nprobe=int(os.getenv("ANN_NPROBE", NPROBE)),
+                                           rescore=int(os.getenv("ANN_RESCORE", RESCORE)))
+                    log.info("ann.loaded", "🗂️ ANN index loaded: %s vectors in %s lists", len(_index), _index.nlist)
+                except (OSError, ValueError, KeyError) as e:
+                    _missing = True
+                    log.warning("ann.unavailable", "⚠️ No ANN index at %s (%s), using Pinecone (run ingest)", index_dir(), e)
+    return _index
+
+
+if __name__ == "__main__":
+    path = index_dir()
+    try:
+        print(f"🗂️ ANN index {path}: {IVFIndex.load(path).stats()}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ No ANN index at {path}: {e}")
@@ -0,0 +1,367 @@
+import os
+import re
+from html.parser import HTMLParser
+from itertools import islice
+from bs4 import BeautifulSoup, CData, Comment, Declaration, Doctype, ProcessingInstruction, UnicodeDammit
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+try:
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Page chrome that never contains review text
+UNWANTED_TAGS = ['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']
+
+CONTENT_CLASS_RE = re.compile(r'(content|body|article|post)', re.I)
+
+MIN_PARAGRAPH_CHARS = 50
+MAX_PARAGRAPHS = 10
+
+# Void elements and special string containers, exactly as bs4 defines them
+_BUILDER = HTMLParserTreeBuilder()
+
+
+def _join_paragraphs(texts) -> str:
+    return ' '.join([t for t in texts if len(t) > MIN_PARAGRAPH_CHARS])
+
+
+def _extract_from_soup(soup) -> str:
+    """The three content strategies, applied to an already-parsed soup."""
+    for tag in soup.find_all(UNWANTED_TAGS):
+        tag.decompose()
+
+    content = ""
+
+    # Strategy 1: Find article tag
+    article = soup.find('article')
+    if article:
+        paragraphs = article.find_all('p', limit=MAX_PARAGRAPHS)
+        content = _join_paragraphs(p.get_text(strip=True) for p in paragraphs)
+
+    # Strategy 2: Find main content div
+    if not content:
+        main_content = soup.find('main') or soup.find('div', {'role': 'main'})
+        if main_content:
+            paragraphs = main_content.find_all('p', limit=MAX_PARAGRAPHS)
+            content = _join_paragraphs(p.get_text(strip=True) for p in paragraphs)
+
+    # Strategy 3: Look for content/body divs
+    if not content:
+        for div in soup.find_all('div', class_=CONTENT_CLASS_RE, limit=3):
+            paragraphs = div.find_all('p', limit=MAX_PARAGRAPHS)
+            temp_content = _join_paragraphs(p.get_text(strip=True) for p in paragraphs)
+            if len(temp_content) > len(content):
+                content = temp_content
+
+    return content
+
+
+def extract_full(html) -> str:
+    """Reference extraction: full html.parser tree, as the scraper originally did."""
+    return _extract_from_soup(BeautifulSoup(html, 'html.parser'))
+
+
+class _Node:
+    """A lightweight stand-in for a bs4 Tag on the open-element stack."""
+    __slots__ = ('name', 'dead', 'is_empty_element', 'paragraph', 'container')
+
+    def __init__(self, name, dead, is_empty_element):
+        self.name = name
+        self.dead = dead
+        self.is_empty_element = is_empty_element
+        self.paragraph = None
+        self.container = None
+
+
+class _StreamState:
+    """
+    Receives the same tree-building calls BeautifulSoup does, but only keeps
+    the paragraph text of the containers the content strategies look at.
+
+    Element nesting follows bs4's rules for html.parser exactly (end tags pop
+    back to the most recent matching open tag, stray end tags are ignored,
+    void elements close immediately), so the result equals `extract_full`
+    without ever building a tree.
+    """
+
+    def __init__(self):
+        self.stack = [_Node('[document]', False, False)]
+        self.current_data = []
+        self.string_container_depth = 0
+        self.open_paragraphs = []
+        self.open_containers = []
+        self.article = None
+        self.main = None
+        self.role_main = None
+        self.content_divs = []
+
+    def _new_container(self, node):
+        node.container = []
+        self.open_containers.append(node.container)
+        return node.container
+
+    def handle_starttag(self, name, attrs):
+        self.endData()
+        parent = self.stack[-1]
+        node = _Node(name, parent.dead or name in UNWANTED_TAGS, _BUILDER.can_be_empty_element(name))
+        self.stack.append(node)
+        if name in _BUILDER.string_containers:
+            self.string_container_depth += 1
+        if node.dead:
+            return node
+
+        if name == 'p':
+            node.paragraph = []
+            self.open_paragraphs.append(node.paragraph)
+            for container in self.open_containers:
+                if len(container) < MAX_PARAGRAPHS:
+                    container.append(node.paragraph)
+        elif name == 'article' and self.article is None:
+            self.article = self._new_container(node)
+        elif name == 'main' and self.main is None:
+            self.main = self._new_container(node)
+        elif name == 'div':
+            if self.role_main is None and attrs.get('role') == 'main':
+                self.role_main = self._new_container(node)
+            if len(self.content_divs) < 3 and CONTENT_CLASS_RE.search(attrs.get('class', '')):
+                container = node.container if node.container is not None else self._new_container(node)
+                self.content_divs.append(container)
+        return node
+
+    def _pop(self):
+        node = self.stack.pop()
+        if node.name in _BUILDER.string_containers:
+            self.string_container_depth -= 1
+        if node.paragraph is not None:
+            self.open_paragraphs.pop()
+        if node.container is not None:
+            self.open_containers.pop()
+
+    def handle_endtag(self, name):
+        self.endData()
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].name == name:
+                while len(self.stack) > i:
+                    self._pop()
+                break
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.current_data:
+            return
+        text = ''.join(self.current_data).strip()
+        self.current_data = []
+        # get_text() only counts plain strings and CDATA; comments and strings
+        # inside script/style/template are separate string classes
+        if containerClass is None and self.string_container_depth:
+            return
+        if text and containerClass in (None, CData) and not self.stack[-1].dead:
+            for paragraph in self.open_paragraphs:
+                paragraph.append(text)
+
+    def content(self) -> str:
+        def container_text(container):
+            return _join_paragraphs(''.join(paragraph) for paragraph in container)
+
+        content = ""
+        if self.article is not None:
+            content = container_text(self.article)
+        if not content:
+            main_content = self.main if self.main is not None else self.role_main
+            if main_content is not None:
+                content = container_text(main_content)
+        if not content:
+            for div in self.content_divs:
+                temp_content = container_text(div)
+                if len(temp_content) > len(content):
+                    content = temp_content
+        return content
+
+
+_DECIMAL_REF_RE = re.compile(r"^([0-9]+)(.*)")
+_HEX_REF_RE = re.compile(r"^([0-9a-f]+)(.*)")
+
+
+def _numeric_reference(name: str) -> tuple:
+    """
+    (character, trailing data) for the numeric character reference `name`, as
+    bs4 decodes it: the HTML spec's replacements for NUL, surrogates and
+    out-of-range code points, and Windows-1252 for 0x80-0x9F.
+    """
+    base, pattern = 10, _DECIMAL_REF_RE
+    if name[:1] in ('x', 'X'):
+        name, base, pattern = name[1:], 16, _HEX_REF_RE
+    extra = ''
+    try:
+        code = int(name, base)
+    except ValueError:
+        match = pattern.search(name)
+        if match is None:
+            return '', name
+        code, extra = int(match.group(1), base), match.group(2)
+    if code == 0 or code > 0x10FFFF or 0xD800 <= code <= 0xDFFF:
+        return '\ufffd', extra
+    if 0x80 <= code <= 0x9F and code in UnicodeDammit.WINDOWS_1252_TO_UTF8:
+        return UnicodeDammit.WINDOWS_1252_TO_UTF8[code].decode('utf8'), extra
+    return chr(code), extra
+
+
+class _StreamParser(HTMLParser):
+    """
+    html.parser event handler feeding a _StreamState the way bs4's handler
+    feeds its tree builder: entities decoded, comments and declarations kept
+    out of the text, void elements closed at once and their stray end tags
+    ignored.
+    """
+
+    def __init__(self, state):
+        super().__init__(convert_charrefs=False)
+        self.state = state
+        self.already_closed_empty_element = []
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        # Duplicate attributes: the last value wins
+        node = self.state.handle_starttag(tag, {key: '' if value is None else value for key, value in attrs})
+        if node.is_empty_element and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed_empty_element.append(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed_empty_element:
+            self.already_closed_empty_element.remove(tag)
+        else:
+            self.state.handle_endtag(tag)
+
+    def handle_data(self, data):
+        self.state.handle_data(data)
+
+    def handle_charref(self, name):
+        character, extra = _numeric_reference(name)
+        self.handle_data(character)
+        self.handle_data(extra)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f'&{name}')
+
+    def _special(self, data, string_class):
+        self.state.endData()
+        self.state.handle_data(data)
+        self.state.endData(string_class)
+
+    def handle_comment(self, data):
+        self._special(data, Comment)
+
+    def handle_decl(self, decl):
+        self._special(decl[len('DOCTYPE '):], Doctype)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._special(data[len('CDATA['):], CData)
+        else:
+            self._special(data, Declaration)
+
+    def handle_pi(self, data):
+        self._special(data, ProcessingInstruction)
+
+
+def extract_stream(html) -> str:
+    """Single streaming pass over the markup; no tree is built."""
+    if isinstance(html, bytes):
+        html = UnicodeDammit(html, is_html=True).unicode_markup
+    state = _StreamState()
+    parser = _StreamParser(state)
+    parser.feed(html)
+    parser.close()
+    state.endData()
+    return state.content()
+
+
+def _lxml_text(element) -> str:
+    """Equivalent of BeautifulSoup's get_text(strip=True) for an lxml element."""
+    parts = []
+
+    def walk(node):
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            # Comments and processing instructions have non-string tags
+            if isinstance(child.tag, str):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(element)
+    return ''.join(s.strip() for s in parts if s.strip())
+
+
+def extract_lxml(html) -> str:
+    """
+    lxml-based extraction. Much faster than html.parser, but libxml2 repairs
+    malformed markup differently (e.g. it closes unterminated <p> tags), so the
+    result can differ from the reference on broken pages.
+    """
+    if isinstance(html, bytes):
+        html = UnicodeDammit(html, is_html=True).unicode_markup
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return extract_stream(html)
+
+    for tag in root.xpath('|'.join(f'//{name}' for name in UNWANTED_TAGS)):
+        if tag.getparent() is not None:
+            tag.drop_tree()
+
+    def first_paragraphs(container):
+        return [_lxml_text(p) for p in islice(container.iterdescendants('p'), MAX_PARAGRAPHS)]
+
+    content = ""
+
+    articles = root.xpath('//article')
+    if articles:
+        content = _join_paragraphs(first_paragraphs(articles[0]))
+
+    if not content:
+        main_content = root.xpath('(//main)[1]') or root.xpath('(//div[@role="main"])[1]')
+        if main_content:
+            content = _join_paragraphs(first_paragraphs(main_content[0]))
+
+    if not content:
+        divs = [d for d in root.iter('div') if CONTENT_CLASS_RE.search(d.get('class', ''))][:3]
+        for div in divs:
+            temp_content = _join_paragraphs(first_paragraphs(div))
+            if len(temp_content) > len(content):
+                content = temp_content
+
+    return content
+
+
+EXTRACTORS = {
+    'full': extract_full,
+    'stream': extract_stream,
+    'lxml': extract_lxml,
+}
+
+
+def extract_article_text(html, engine: str = None) -> str:
+    """
+    Extract the main review text from raw page HTML.
+
+    `engine` (or REVIEW_EXTRACT_ENGINE) picks the implementation. The default
+    streaming pass matches the full-tree reference output; 'lxml' is faster
+    still but may differ on malformed pages.
+    """
+    engine = engine or os.getenv("REVIEW_EXTRACT_ENGINE", "stream")
+    if engine == 'lxml' and not HAS_LXML:
+        engine = 'stream'
+    return EXTRACTORS[engine](html)
@@ -1,12 +1,19 @@
 import os
-import requests
+import threading
+from collections import OrderedDict
 from typing import Union, List, Optional
 from langchain_core.tools import tool
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_community.tools.tavily_search import TavilySearchResults
 from pydantic import BaseModel, Field, ConfigDict
 from dotenv import load_dotenv
+from src.utils.embeddings import get_embeddings
+from src.utils.http import timed_get
+from src.utils.resilience import guarded_call
+from src.utils.log import get_logger
+from src.tools.pinecone_rag import retrieve_context
+
+log = get_logger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,7 +22,7 @@ load_dotenv()
 
 def get_pinecone_retriever():
     """Initializes and returns the Pinecone vector store."""
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
     vectorstore = PineconeVectorStore(
         index_name=os.getenv("PINECONE_INDEX_NAME"),
         embedding=embeddings
@@ -29,9 +36,8 @@ def pinecone_rag_tool(query: str) -> str:
     Use this for technical specs, maintenance schedules, or interior features.
     """
     try:
-        vectorstore = get_pinecone_retriever()
-        docs = vectorstore.similarity_search(query, k=4)
-        context = "\n---\n".join([doc.page_content for doc in docs])
+        # Same path as the agent, so chunk texts resolve from the store or metadata
+        context = retrieve_context(query)
         return context if context else "No relevant information found in the manual."
     except Exception as e:
         return f"Error accessing manual: {str(e)}"
@@ -74,30 +80,76 @@ def car_service_api(make: str, model: str, year: Union[str, int]) -> str:
     """
     Queries the official NHTSA database for safety recalls.
     """
+    return lookup_recalls(make, model, year)
+
+# Last good answer per vehicle, served when NHTSA is down or too slow
+RECALL_CACHE_SIZE = 256
+_recall_cache = OrderedDict()
+_recall_cache_lock = threading.Lock()
+
+def _remember_recalls(key: tuple, summary: str):
+    with _recall_cache_lock:
+        _recall_cache[key] = summary
+        _recall_cache.move_to_end(key)
+        while len(_recall_cache) > RECALL_CACHE_SIZE:
+            _recall_cache.popitem(last=False)
+
+def recall_key(make: str, model: str, year: Union[str, int]) -> tuple:
+    """Normalized identity of a recall lookup, as used in the NHTSA query."""
+    return (make.strip().upper(), model.strip().upper(), str(year))
+
+def lookup_recalls(make: str, model: str, year: Union[str, int]) -> str:
+    """NHTSA recall summary for one vehicle (the body of car_service_api)."""
     year_str = str(year)
     make_up = make.strip().upper()
     model_up = model.strip().upper()
 
+    key = (make_up, model_up, year_str)
+    unavailable = []
+
     def call_nhtsa(mk: str, md: str, yr: str):
         url = f"https://api.nhtsa.gov/recalls/recallsByVehicle?make={mk}&model={md}&modelYear={yr}"
+
+        def fetch(timeout):
+            response = timed_get(url, timeout=timeout)
+            # A 5xx or 429 is an outage, not "no recalls": fail so the breaker
+            # counts it and the answer isn't cached as the last good one. Other
+            # 4xx mean NHTSA has nothing for this query, so try the fallbacks
+            if response.status_code >= 500 or response.status_code == 429:
+                response.raise_for_status()
+            if response.status_code >= 400:
+                return None
+            return response.json()
+
         try:
-            response = requests.get(url, timeout=10)
-            return response.json() if response.status_code == 200 else None
-        except:
+            return guarded_call("nhtsa", fetch, hedge=True)
+        except Exception as e:
+            unavailable.append(e)
             return None
 
     # Try 1: Exact Match
     data = call_nhtsa(make_up, model_up, year_str)
 
     # Try 2: Smart Fallback for specific models
-    if not data or data.get('Count') == 0:
+    if not unavailable and (not data or data.get('Count') == 0):
         if any(x in model_up for x in ["330", "340", "M3"]):
             data = call_nhtsa(make_up, "3 SERIES", year_str)
         elif "GRAND I10" in model_up:
             data = call_nhtsa(make_up, "I10", year_str)
 
+    if unavailable and not data:
+        log.warning("recalls.unavailable", "   ⚠️ NHTSA unavailable: %s", unavailable[-1])
+        with _recall_cache_lock:
+            cached = _recall_cache.get(key)
+        if cached:
+            return cached + "\n\n(NHTSA isn't responding right now; these results are from an earlier lookup.)"
+        return (f"⚠️ The NHTSA recall database isn't responding right now, so I couldn't check the "
+                f"{year_str} {make_up} {model_up}. Please try again shortly or search https://www.nhtsa.gov/recalls.")
+
     if not data or data.get('Count') == 0:
-        return f"No safety recalls found in the NHTSA database for the {year_str} {make_up} {model_up}."
+        summary = f"No safety recalls found in the NHTSA database for the {year_str} {make_up} {model_up}."
+        _remember_recalls(key, summary)
+        return summary
 
     # Format Results
     count = data['Count']
@@ -105,4 +157,5 @@ def car_service_api(make: str, model: str, year: Union[str, int]) -> str:
     for i, r in enumerate(data['results'][:3], 1):
         summary += f"\n{i}. {r.get('Component')}: {r.get('Summary')[:200]}..."
     
+    _remember_recalls(key, summary)
     return summary
\ No newline at end of file
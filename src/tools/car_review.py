@@ -1,12 +1,32 @@
-import requests
 from bs4 import BeautifulSoup
 from langchain.tools import tool
-from langchain_groq import ChatGroq
 import time
 import re
-from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote_plus, urlparse
+from src.utils.http import polite_get
+from src.utils.resilience import guarded_call, GuardError
+from src.utils.llm import make_llm
+from src.tools.article_extract import extract_article_text
+from src.tools.review_cache import (
+    get_review_cache, conditional_headers, search_key, load_search, dump_search,
+    ARTICLE_TTL, SEARCH_TTL,
+)
+from src.tools.summary_store import get_summary_store, summary_key
+from src.tools.review_index import get_review_index
+from src.utils.log import get_logger, bind_log_context
 
-llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+log = get_logger(__name__)
+llm = make_llm()
+
+# Article fetch scheduling
+MAX_ARTICLES = 3            # Good articles needed before we stop fetching
+MAX_CANDIDATES = 5          # Candidate links fetched concurrently
+MIN_ARTICLE_CHARS = 200     # Shorter extractions don't count as good content
+FETCH_DEADLINE = 8.0        # Seconds allowed for the whole fetch phase
+REQUEST_TIMEOUT = (3.05, 6) # Per-request (connect, read) timeouts
+
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="review-fetch")
 
 def get_headers():
     """Returns request headers that mimic a real browser."""
@@ -30,59 +50,62 @@ def clean_text(text: str) -> str:
     text = re.sub(r'\n+', '\n', text)
     return text.strip()
 
-def fetch_article_content(url: str) -> str:
+def review_get(url: str, hedge: bool = False, timeout=None, **kwargs):
+    """
+    polite_get under a per-host circuit breaker and the turn deadline. Search
+    pages are idempotent and worth hedging; `timeout` overrides the deadline's.
+    """
+    backend = f"reviews:{urlparse(url).netloc.lower()}"
+    return guarded_call(backend, lambda t: polite_get(url, timeout=timeout or t, **kwargs), hedge=hedge)
+
+def fetch_article_content(url: str, timeout=15, wait_timeout: float = None) -> str:
     """Fetch and extract main content from an article."""
     try:
-        print(f"      📖 Reading: {url[:60]}...")
-        time.sleep(1.5)
-        
-        response = requests.get(url, headers=get_headers(), timeout=15, allow_redirects=True)
+        cache = get_review_cache()
+        cached = cache.get(url) if cache else None
+        if cached and cached['fresh']:
+            log.debug("review.article_cached", "      📦 Cache hit: %s", url[:60])
+            return cached['content']
+        
+        log.info("review.article_fetch", "      📖 Reading: %s...", url[:60])
+        
+        headers = {**get_headers(), **conditional_headers(cached)}
+        try:
+            response = review_get(url, headers=headers, timeout=timeout,
+                                  wait_timeout=wait_timeout, allow_redirects=True)
+        except GuardError as e:
+            log.warning("review.unavailable", "      ⏱️ %s", e)
+            return cached['content'] if cached else None
+        
+        if response is None:
+            log.warning("review.rate_limited", "      ⏱️ Rate limit wait exceeded, skipping")
+            return cached['content'] if cached else None
+        
+        if response.status_code == 304 and cached:
+            log.debug("review.article_not_modified", "      📦 Not modified, reusing cached text")
+            cache.touch(url)
+            return cached['content']
         
         if response.status_code != 200:
-            print(f"      ❌ Status: {response.status_code}")
+            log.warning("review.article_status", "      ❌ Status: %s", response.status_code)
             return None
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove unwanted elements
-        for tag in soup.find_all(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']):
-            tag.decompose()
-        
-        # Try multiple strategies to find content
-        content = ""
-        
-        # Strategy 1: Find article tag
-        article = soup.find('article')
-        if article:
-            paragraphs = article.find_all('p', limit=10)
-            content = ' '.join([p.get_text(strip=True) for p in paragraphs if len(p.get_text(strip=True)) > 50])
-        
-        # Strategy 2: Find main content div
-        if not content:
-            main_content = soup.find('main') or soup.find('div', {'role': 'main'})
-            if main_content:
-                paragraphs = main_content.find_all('p', limit=10)
-                content = ' '.join([p.get_text(strip=True) for p in paragraphs if len(p.get_text(strip=True)) > 50])
-        
-        # Strategy 3: Look for content/body divs
-        if not content:
-            content_divs = soup.find_all('div', class_=re.compile(r'(content|body|article|post)', re.I), limit=3)
-            for div in content_divs:
-                paragraphs = div.find_all('p', limit=10)
-                temp_content = ' '.join([p.get_text(strip=True) for p in paragraphs if len(p.get_text(strip=True)) > 50])
-                if len(temp_content) > len(content):
-                    content = temp_content
+        content = extract_article_text(response.content)
         
         if content:
-            content = clean_text(content)
-            print(f"      ✅ Extracted {len(content)} chars")
-            return content[:2000]  # Limit to 2000 chars
-        
-        print(f"      ⚠️ No content found")
+            content = clean_text(content)[:2000]  # Limit to 2000 chars
+            log.debug("review.article_extracted", "      ✅ Extracted %s chars", len(content))
+            if cache:
+                cache.put(url, content, ARTICLE_TTL,
+                          etag=response.headers.get('ETag'),
+                          last_modified=response.headers.get('Last-Modified'))
+            return content
+        
+        log.info("review.article_empty", "      ⚠️ No content found")
         return None
         
     except Exception as e:
-        print(f"      ❌ Error: {str(e)[:50]}")
+        log.warning("review.article_error", "      ❌ Error: %s", str(e)[:50])
         return None
 
 def search_google_custom(query: str) -> list:
@@ -97,12 +120,23 @@ def search_google_custom(query: str) -> list:
         # Use Google search with site restriction
         url = f"https://www.google.com/search?q={encoded_query}+site:caranddriver.com+OR+site:carwow.co.uk"
         
-        print(f"   🔍 Google Search: {search_terms}")
-        time.sleep(1)
+        cache = get_review_cache()
+        key = search_key('google', search_terms)
+        cached = cache.get(key) if cache else None
+        if cached and cached['fresh']:
+            log.debug("review.search_cached", "   📦 Cached Google results for: %s", search_terms)
+            return load_search(cached)
         
-        response = requests.get(url, headers=get_headers(), timeout=15)
+        log.info("review.search", "   🔍 Google Search: %s", search_terms)
         
-        if response.status_code != 200:
+        try:
+            response = review_get(url, hedge=True, headers=get_headers())
+        except GuardError as e:
+            # Stale results beat none while Google is failing
+            log.warning("review.unavailable", "   ⏱️ %s", e)
+            return load_search(cached) if cached else []
+        
+        if response is None or response.status_code != 200:
             return []
         
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -139,11 +173,13 @@ def search_google_custom(query: str) -> list:
                     'source': source
                 })
         
-        print(f"   ✅ Found {len(results)} Google results")
+        log.info("review.search_results", "   ✅ Found %s Google results", len(results))
+        if cache and results:
+            cache.put(key, dump_search(results), SEARCH_TTL)
         return results
         
     except Exception as e:
-        print(f"   ⚠️ Google search error: {e}")
+        log.warning("review.search_error", "   ⚠️ Google search error: %s", e)
         return []
 
 def search_caranddriver_direct(query: str) -> list:
@@ -157,13 +193,23 @@ def search_caranddriver_direct(query: str) -> list:
         url_query = quote_plus(search_query)
         url = f"https://www.caranddriver.com/search?q={url_query}"
         
-        print(f"   🔍 Car and Driver search: {url}")
-        time.sleep(1)
+        cache = get_review_cache()
+        key = search_key('caranddriver', search_query)
+        cached = cache.get(key) if cache else None
+        if cached and cached['fresh']:
+            log.debug("review.search_cached", "   📦 Cached Car and Driver results for: %s", search_query)
+            return load_search(cached)
         
-        response = requests.get(url, headers=get_headers(), timeout=15)
+        log.info("review.search", "   🔍 Car and Driver search: %s", url)
         
-        if response.status_code != 200:
-            print(f"   ❌ Status: {response.status_code}")
+        try:
+            response = review_get(url, hedge=True, headers=get_headers())
+        except GuardError as e:
+            log.warning("review.unavailable", "   ⏱️ %s", e)
+            return load_search(cached) if cached else []
+        
+        if response is None or response.status_code != 200:
+            log.warning("review.search_status", "   ❌ Status: %s", getattr(response, 'status_code', 'rate limited'))
             return []
         
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -198,108 +244,78 @@ def search_caranddriver_direct(query: str) -> list:
                 'source': 'Car and Driver'
             })
         
-        print(f"   ✅ Found {len(results)} direct results")
+        log.info("review.search_results", "   ✅ Found %s direct results", len(results))
+        if cache and results:
+            cache.put(key, dump_search(results), SEARCH_TTL)
         return results
         
     except Exception as e:
-        print(f"   ⚠️ Direct search error: {e}")
+        log.warning("review.search_error", "   ⚠️ Direct search error: %s", e)
         return []
 
-@tool
-def car_review_tool(query: str) -> str:
+def fetch_articles(results: list, max_articles: int = MAX_ARTICLES,
+                   deadline: float = FETCH_DEADLINE) -> list:
     """
-    Fetches comprehensive car reviews and comparisons from multiple sources.
-    
-    Examples:
-    - "BMW 5 Series 2025 review"
-    - "Best luxury SUV"
-    - "Compare BMW X5 vs Mercedes GLE"
+    Fetch candidate articles concurrently and return the good ones in ranking order.
     
-    Args:
-        query: Car review question or comparison request
-        
-    Returns:
-        Detailed review summary with AI analysis
+    Stops as soon as `max_articles` good extractions have arrived or the overall
+    deadline passes; slower fetches are abandoned rather than waited on.
     """
-    try:
-        print(f"\n🚗 Car Review Search: '{query}'")
-        print("="*60)
-        
-        # Try multiple search strategies
-        all_results = []
-        
-        # Strategy 1: Google search (most reliable)
-        google_results = search_google_custom(query)
-        all_results.extend(google_results)
-        
-        # Strategy 2: Direct website search (if Google didn't work)
-        if len(all_results) < 2:
-            direct_results = search_caranddriver_direct(query)
-            all_results.extend(direct_results)
-        
-        # Remove duplicates
-        seen_links = set()
-        unique_results = []
-        for result in all_results:
-            if result['link'] not in seen_links:
-                seen_links.add(result['link'])
-                unique_results.append(result)
-        
-        if not unique_results:
-            print("   ❌ No results found")
-            return f"""I couldn't find specific reviews for '{query}'. 
+    candidates = results[:MAX_CANDIDATES]
+    end_time = time.monotonic() + deadline
+    
+    futures = {}
+    for idx, result in enumerate(candidates):
+        future = _fetch_pool.submit(
+            bind_log_context(fetch_article_content), result['link'],
+            timeout=REQUEST_TIMEOUT, wait_timeout=deadline
+        )
+        futures[future] = idx
+    
+    good = {}
+    pending = set(futures)
+    while pending and len(good) < max_articles:
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            log.warning("review.fetch_deadline", "   ⏱️ Fetch deadline reached, %s article(s) abandoned", len(pending))
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            content = future.result()
+            if content and len(content) > MIN_ARTICLE_CHARS:
+                good[futures[future]] = content
+    
+    for future in pending:
+        future.cancel()
+    
+    detailed_reviews = []
+    for idx in sorted(good)[:max_articles]:
+        result = candidates[idx]
+        detailed_reviews.append({
+            'title': result['title'],
+            'link': result['link'],
+            'source': result['source'],
+            'content': good[idx]
+        })
+    return detailed_reviews
 
-Here's what you can try:
-1. Search directly: https://www.caranddriver.com/search?q={quote_plus(query)}
-2. Try a different query (e.g., "2024 BMW 5 Series review")
-3. Visit https://www.carwow.co.uk for UK reviews
+# Whole words only: "towing" mustn't read as "or", nor "laptop" as "top"
+COMPARISON_RE = re.compile(r"\b(vs|versus|compar\w*|or|better)\b")
+RECOMMENDATION_RE = re.compile(r"\b(best|recommend\w*|should i|which|top)\b")
 
-Would you like me to help with something else about this car?"""
-        
-        print(f"\n📚 Found {len(unique_results)} articles. Fetching content...")
-        
-        # Fetch content from top 3 articles
-        detailed_reviews = []
-        for idx, result in enumerate(unique_results[:3], 1):
-            print(f"\n   [{idx}/3] {result['title'][:50]}...")
-            content = fetch_article_content(result['link'])
-            
-            if content and len(content) > 200:
-                detailed_reviews.append({
-                    'title': result['title'],
-                    'link': result['link'],
-                    'source': result['source'],
-                    'content': content
-                })
-        
-        if not detailed_reviews:
-            # Fallback: Just provide links
-            print("   ⚠️ Couldn't extract content, providing links")
-            response_text = f"🚗 **Reviews for '{query}':**\n\n"
-            response_text += "I found these relevant articles:\n\n"
-            
-            for i, result in enumerate(unique_results[:5], 1):
-                response_text += f"{i}. **{result['title']}**\n"
-                response_text += f"   Source: {result['source']}\n"
-                response_text += f"   🔗 {result['link']}\n\n"
-            
-            response_text += "\n💡 Click the links above to read the full reviews."
-            return response_text
-        
-        # Create AI summary from extracted content
-        print(f"\n🤖 Generating AI summary from {len(detailed_reviews)} articles...")
-        
-        context = f"User asked about: {query}\n\n"
-        for idx, review in enumerate(detailed_reviews, 1):
-            context += f"=== Review {idx}: {review['title']} ({review['source']}) ===\n"
-            context += f"{review['content']}\n\n"
-        
-        # Detect query type
-        is_comparison = any(word in query.lower() for word in ['vs', 'versus', 'compare', 'or', 'better'])
-        is_recommendation = any(word in query.lower() for word in ['best', 'recommend', 'should i', 'which', 'top'])
-        
-        if is_comparison:
-            prompt = f"""Based on these car reviews, provide a comparison for: "{query}"
+def detect_query_type(query: str) -> str:
+    """Classifies a review query as 'comparison', 'recommendation' or 'single'."""
+    q = query.lower()
+    if COMPARISON_RE.search(q):
+        return 'comparison'
+    if RECOMMENDATION_RE.search(q):
+        return 'recommendation'
+    return 'single'
+
+def build_summary_prompt(query: str, query_type: str, context: str) -> str:
+    """Builds the LLM summary prompt for the given query type."""
+    if query_type == 'comparison':
+        return f"""Based on these car reviews, provide a comparison for: "{query}"
 
 {context}
 
@@ -311,8 +327,8 @@ Create a comprehensive comparison including:
 5. Final recommendation
 
 Keep it conversational and helpful (400 words max)."""
-        elif is_recommendation:
-            prompt = f"""Based on these reviews, provide recommendations for: "{query}"
+    elif query_type == 'recommendation':
+        return f"""Based on these reviews, provide recommendations for: "{query}"
 
 {context}
 
@@ -323,8 +339,8 @@ Provide:
 4. Your recommendation
 
 Keep it helpful and conversational (400 words max)."""
-        else:
-            prompt = f"""Based on these car reviews, create a comprehensive summary for: "{query}"
+    else:
+        return f"""Based on these car reviews, create a comprehensive summary for: "{query}"
 
 {context}
 
@@ -336,26 +352,163 @@ Include:
 5. Final verdict
 
 Keep it conversational and informative (400 words max)."""
+
+def format_review_response(query: str, summary: str, sources: list) -> str:
+    """Formats an AI summary with its numbered source links."""
+    response_text = f"🚗 **{query}**\n\n"
+    response_text += f"{summary}\n\n"
+    response_text += "---\n\n"
+    response_text += "📚 **Sources:**\n"
+    
+    for idx, review in enumerate(sources, 1):
+        response_text += f"{idx}. {review['title']}\n"
+        response_text += f"   ({review['source']}) - {review['link']}\n"
+    
+    return response_text
+
+def generate_review_summary(query: str, query_type: str) -> dict:
+    """
+    Summarizes reviews for a query, from the local review index when it covers
+    the query and otherwise by searching and fetching live articles.
+    
+    Returns {'summary': ..., 'sources': [...]} on success, or {'fallback': ...}
+    with a ready-to-send message when there was nothing to summarize.
+    """
+    # Answer from previously scraped articles when the local index covers the query
+    index = get_review_index()
+    indexed = None
+    if index:
+        try:
+            indexed = index.retrieve(query)
+        except Exception as e:
+            log.warning("review.index_error", "   ⚠️ Review index lookup failed: %s", e)
+    if indexed:
+        log.info("review.index_hit", "   🗂️ Using %s indexed articles, skipping scrape", len(indexed))
+        index.record_query(query, 'index', len(indexed), indexed[0]['score'])
+        return summarize_reviews(query, query_type, indexed)
+    if index:
+        index.record_query(query, 'scrape')
+    
+    # Try multiple search strategies
+    all_results = []
+    
+    # Strategy 1: Google search (most reliable)
+    google_results = search_google_custom(query)
+    all_results.extend(google_results)
+    
+    # Strategy 2: Direct website search (if Google didn't work)
+    if len(all_results) < 2:
+        direct_results = search_caranddriver_direct(query)
+        all_results.extend(direct_results)
+    
+    # Remove duplicates
+    seen_links = set()
+    unique_results = []
+    for result in all_results:
+        if result['link'] not in seen_links:
+            seen_links.add(result['link'])
+            unique_results.append(result)
+    
+    if not unique_results:
+        log.info("review.no_results", "   ❌ No results found")
+        return {'fallback': f"""I couldn't find specific reviews for '{query}'. 
+
+Here's what you can try:
+1. Search directly: https://www.caranddriver.com/search?q={quote_plus(query)}
+2. Try a different query (e.g., "2024 BMW 5 Series review")
+3. Visit https://www.carwow.co.uk for UK reviews
+
+Would you like me to help with something else about this car?"""}
+    
+    log.info("review.articles_found", "📚 Found %s articles. Fetching content...", len(unique_results))
+    
+    # Fetch candidate articles concurrently, keeping the first good ones
+    detailed_reviews = fetch_articles(unique_results)
+    
+    if not detailed_reviews:
+        # Fallback: Just provide links
+        log.warning("review.no_content", "   ⚠️ Couldn't extract content, providing links")
+        return {'fallback': links_response(query, unique_results)}
+    
+    # Keep the scraped text so repeat questions can skip scraping
+    if index:
+        _fetch_pool.submit(index.add_articles, detailed_reviews)
+    
+    return summarize_reviews(query, query_type, detailed_reviews)
+
+def links_response(query: str, results: list) -> str:
+    """Degraded answer listing the articles found, for when they can't be summarized."""
+    response_text = f"🚗 **Reviews for '{query}':**\n\n"
+    response_text += "I found these relevant articles:\n\n"
+    
+    for i, result in enumerate(results[:5], 1):
+        response_text += f"{i}. **{result['title']}**\n"
+        response_text += f"   Source: {result['source']}\n"
+        response_text += f"   🔗 {result['link']}\n\n"
+    
+    response_text += "\n💡 Click the links above to read the full reviews."
+    return response_text
+
+def summarize_reviews(query: str, query_type: str, detailed_reviews: list) -> dict:
+    """Runs the LLM summary over fetched or indexed articles."""
+    log.info("review.summarize", "🤖 Generating AI summary from %s articles...", len(detailed_reviews))
+    
+    context = f"User asked about: {query}\n\n"
+    for idx, review in enumerate(detailed_reviews, 1):
+        context += f"=== Review {idx}: {review['title']} ({review['source']}) ===\n"
+        context += f"{review['content']}\n\n"
+    
+    prompt = build_summary_prompt(query, query_type, context)
+    try:
+        llm_response = guarded_call("groq", lambda timeout: llm.invoke(prompt, timeout=timeout))
+    except GuardError as e:
+        log.warning("review.summary_unavailable", "   ⚠️ Summary unavailable, providing links: %s", e)
+        return {'fallback': links_response(query, detailed_reviews)}
+    
+    sources = [
+        {'title': r['title'], 'link': r['link'], 'source': r['source']}
+        for r in detailed_reviews
+    ]
+    return {'summary': llm_response.content, 'sources': sources}
+
+@tool
+def car_review_tool(query: str) -> str:
+    """
+    Fetches comprehensive car reviews and comparisons from multiple sources.
+    
+    Examples:
+    - "BMW 5 Series 2025 review"
+    - "Best luxury SUV"
+    - "Compare BMW X5 vs Mercedes GLE"
+    
+    Args:
+        query: Car review question or comparison request
         
-        llm_response = llm.invoke(prompt)
-        ai_summary = llm_response.content
+    Returns:
+        Detailed review summary with AI analysis
+    """
+    try:
+        log.info("review.query", "🚗 Car Review Search: '%s'", query)
+        
+        # Serve precomputed summaries for popular vehicles/questions
+        query_type = detect_query_type(query)
+        key = summary_key(query, query_type)
+        store = get_summary_store()
+        stored = store.lookup(key, query, query_type) if store else None
+        if stored:
+            log.info("review.summary_stored", "   📦 Serving stored summary for %s", key)
+            return format_review_response(query, stored['summary'], stored['sources'])
         
-        # Format final response
-        response_text = f"🚗 **{query}**\n\n"
-        response_text += f"{ai_summary}\n\n"
-        response_text += "---\n\n"
-        response_text += "📚 **Sources:**\n"
+        result = generate_review_summary(query, query_type)
+        if 'fallback' in result:
+            return result['fallback']
         
-        for idx, review in enumerate(detailed_reviews, 1):
-            response_text += f"{idx}. {review['title']}\n"
-            response_text += f"   ({review['source']}) - {review['link']}\n"
+        if store:
+            store.save(key, query, query_type, result['summary'], result['sources'])
         
-        print("   ✅ Summary generated successfully")
-        return response_text
+        log.info("review.summary_generated", "   ✅ Summary generated successfully")
+        return format_review_response(query, result['summary'], result['sources'])
         
     except Exception as e:
-        print(f"\n❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("review.tool_error", "❌ Error: %s", e)
         return f"I encountered an error searching for '{query}'. Please try: https://www.caranddriver.com/search?q={quote_plus(query)}"
-
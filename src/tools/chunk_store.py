@@ -0,0 +1,183 @@
+"""
+Local store of manual chunk texts, keyed by the chunk IDs used in Pinecone.
+
+Ingest writes every chunk's text here as well as to Pinecone, so queries ask
+Pinecone for IDs and scores only and no chunk text crosses the network. Hosts
+without a copy of the store read the texts from the match metadata instead.
+Two append-only files:
+
+    chunks.bin     UTF-8 chunk texts, back to back
+    index.jsonl    one line per chunk: {"id", "offset", "length", "metadata"}
+
+The blob is memory-mapped; a lookup slices it without copying the file and
+decodes just that chunk's bytes. The index (with each chunk's source, page and
+start_index for context packing) is held in a dict.
+
+Texts are written before their index line, so a crash mid-ingest leaves at
+most unreferenced bytes at the end of the blob. A reader that misses an ID
+re-reads whatever the writer appended since it opened the store. One writer
+at a time (the ingest script).
+
+Settings: CHUNK_STORE_DIR (.cache/chunk_store), CHUNK_STORE_DISABLED=1 to
+fall back to texts in Pinecone metadata.
+
+Usage: python -m src.tools.chunk_store   # prints the store's stats
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_STORE_DIR = BASE_DIR / ".cache" / "chunk_store"
+TEXT_FILE = "chunks.bin"
+INDEX_FILE = "index.jsonl"
+
+# Chunk metadata kept locally; vehicle tags stay in Pinecone for filtering.
+# `also_in` lists the pages of near-duplicates ingest collapsed into the chunk.
+LOCAL_METADATA = ("source", "page", "start_index", "also_in")
+ID_FIELDS = ("source", "page", "start_index")
+
+
+def chunk_id(doc: Document) -> str:
+    """Stable ID from the chunk's source, position and text, so re-ingesting overwrites instead of duplicating."""
+    key = "\x1f".join(str(doc.metadata.get(k, "")) for k in ID_FIELDS) + "\x1f" + doc.page_content
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:32]
+
+
+class ChunkStore:
+    def __init__(self, path=DEFAULT_STORE_DIR):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.text_path = self.path / TEXT_FILE
+        self.index_path = self.path / INDEX_FILE
+        self.text_path.touch()
+        self.index_path.touch()
+
+        self.lock = threading.Lock()
+        self.entries = {}      # id -> (offset, length, metadata)
+        self.index_pos = 0     # bytes of index.jsonl read so far
+        self.map = None
+        self.view = None
+        self._refresh()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _refresh(self):
+        """Picks up index lines and text appended since the last call. Caller holds the lock or owns the store."""
+        with open(self.index_path, "rb") as f:
+            f.seek(self.index_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # A writer is mid-line; read it next time
+                self.index_pos += len(line)
+                entry = json.loads(line)
+                self.entries[entry["id"]] = (entry["offset"], entry["length"], entry.get("metadata", {}))
+
+        size = self.text_path.stat().st_size
+        if size and (self.map is None or size > len(self.map)):
+            # Slices handed out earlier are decoded copies, so the old map can go
+            if self.view is not None:
+                self.view.release()
+                self.map.close()
+            with open(self.text_path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+
+    def _text(self, offset: int, length: int) -> str:
+        return str(self.view[offset:offset + length], "utf-8")
+
+    def get(self, chunk_id: str):
+        """(text, metadata) for one chunk, or None."""
+        return self.get_many([chunk_id])[0]
+
+    def get_many(self, ids: list) -> list:
+        """(text, metadata) per ID, None where the store doesn't have it."""
+        with self.lock:
+            if any(i not in self.entries for i in ids):
+                self._refresh()
+            out = []
+            for i in ids:
+                entry = self.entries.get(i)
+                out.append(None if entry is None else (self._text(entry[0], entry[1]), dict(entry[2])))
+            return out
+
+    def documents(self, matches: list):
+        """
+        Documents with scores for Pinecone (id, score) matches, or None if any
+        ID is missing (the index holds chunks this store never saw).
+        """
+        found = self.get_many([chunk_id for chunk_id, _ in matches])
+        if any(item is None for item in found):
+            return None
+        return [
+            (Document(id=chunk_id, page_content=text, metadata=metadata), score)
+            for (chunk_id, score), (text, metadata) in zip(matches, found)
+        ]
+
+    def add(self, docs: list) -> list:
+        """Appends the chunks not stored yet; returns every doc's ID."""
+        ids = [chunk_id(doc) for doc in docs]
+        with self.lock:
+            self._refresh()
+            new, seen = [], set()
+            for i, doc in zip(ids, docs):
+                if i not in self.entries and i not in seen:
+                    seen.add(i)
+                    new.append((i, doc))
+            if not new:
+                return ids
+
+            lines = []
+            with open(self.text_path, "ab") as f:
+                offset = f.tell()
+                for i, doc in new:
+                    data = doc.page_content.encode("utf-8")
+                    f.write(data)
+                    metadata = {k: doc.metadata[k] for k in LOCAL_METADATA if k in doc.metadata}
+                    lines.append(json.dumps({"id": i, "offset": offset, "length": len(data), "metadata": metadata}))
+                    offset += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in lines))
+            self._refresh()
+        return ids
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "chunks": len(self.entries),
+                "text_bytes": self.text_path.stat().st_size,
+                "index_bytes": self.index_path.stat().st_size,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_store():
+    """Returns the process-wide chunk store, or None when disabled."""
+    global _store
+    if os.getenv("CHUNK_STORE_DISABLED") == "1":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChunkStore(os.getenv("CHUNK_STORE_DIR", str(DEFAULT_STORE_DIR)))
+    return _store
+
+
+if __name__ == "__main__":
+    store = get_chunk_store()
+    if store is None:
+        print("❌ Chunk store is disabled (CHUNK_STORE_DISABLED=1)")
+    else:
+        print(f"📦 Chunk store {store.path}: {store.stats()}")
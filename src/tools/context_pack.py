@@ -0,0 +1,147 @@
+"""
+Context assembly for RAG prompts.
+
+Manual chunks are split with a 400-character overlap, so the top-k results
+often repeat the same text. Before the chunks reach the prompt this module:
+
+1. merges chunks from the same source page that overlap or sit next to each
+   other (by `start_index` when ingest recorded it, else by matching text),
+2. drops sentences already included from a higher-scoring passage,
+3. packs passages by best chunk score into a token budget, trimming the last
+   one at a sentence boundary.
+
+A sentence ends at . ! or ? followed by whitespace (or the end of the text),
+so decimals, part numbers and "in.)" stay whole. Kept sentences are copied
+verbatim, whitespace included; nothing is re-joined.
+
+Token counts are estimated at ~4 characters per token; the budget is a cost
+guard rather than an exact limit.
+"""
+import re
+
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP = 40
+MIN_TAIL_TOKENS = 50
+
+# One sentence and the whitespace after it
+SENTENCE_RE = re.compile(r".+?(?:[.!?](?=\s|$)|$)\s*", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _merge_text(a: str, b: str):
+    """Joins b onto a when one contains the other or a's tail overlaps b's head; else None."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    probe = b[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return None
+    i = a.find(probe)
+    while i != -1:
+        if b.startswith(a[i:]):
+            return a + b[len(a) - i:]
+        i = a.find(probe, i + 1)
+    return None
+
+
+class _Passage:
+    def __init__(self, doc, score: float):
+        self.source = doc.metadata.get("source", "Unknown")
+        self.page = doc.metadata.get("page")
+        self.start = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.score = score
+
+    def absorb(self, other) -> bool:
+        """Merges `other` into this passage if they come from the same page and touch."""
+        if (other.source, other.page) != (self.source, self.page):
+            return False
+
+        if self.start is not None and other.start is not None:
+            first, second = (self, other) if self.start <= other.start else (other, self)
+            gap = second.start - (first.start + len(first.text))
+            if gap > 0:
+                return False
+            merged = first.text + second.text[-gap:] if -gap < len(second.text) else first.text
+            self.start = first.start
+        else:
+            merged = _merge_text(self.text, other.text) or _merge_text(other.text, self.text)
+            if merged is None:
+                return False
+
+        self.text = merged
+        self.score = max(self.score, other.score)
+        return True
+
+
+def _merge(results: list) -> list:
+    passages = []
+    for doc, score in results:
+        passage = _Passage(doc, score)
+        # A merged passage may now touch another one, so keep folding until stable
+        while True:
+            for existing in passages:
+                if existing.absorb(passage):
+                    passages.remove(existing)
+                    passage = existing
+                    break
+            else:
+                break
+        passages.append(passage)
+    return passages
+
+
+def _dedupe_sentences(text: str, seen: set) -> str:
+    kept = []
+    for sentence in SENTENCE_RE.findall(text):
+        key = " ".join(sentence.lower().split())
+        if not key:
+            continue
+        if len(key) > 20 and key in seen:
+            continue
+        seen.add(key)
+        kept.append(sentence)
+    return "".join(kept).strip()
+
+
+def _trim_to_tokens(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    out = ""
+    for sentence in SENTENCE_RE.findall(text):
+        if len(out) + len(sentence) > limit:
+            break
+        out += sentence
+    return out.strip()
+
+
+def pack_context(results: list, budget_tokens: int) -> str:
+    """
+    Builds the prompt context from (Document, score) pairs, highest score first,
+    in the "Source: ...\\nContent: ..." format the RAG prompt expects.
+    """
+    passages = sorted(_merge(results), key=lambda p: p.score, reverse=True)
+
+    seen = set()
+    blocks = []
+    used = 0
+    for passage in passages:
+        text = _dedupe_sentences(passage.text, seen)
+        if not text:
+            continue
+        block = f"Source: {passage.source}\nContent: {text}"
+        cost = estimate_tokens(block)
+        if used + cost > budget_tokens:
+            remaining = budget_tokens - used - estimate_tokens(f"Source: {passage.source}\nContent: ")
+            if remaining >= MIN_TAIL_TOKENS:
+                tail = _trim_to_tokens(text, remaining)
+                if tail:
+                    blocks.append(f"Source: {passage.source}\nContent: {tail}")
+            break
+        blocks.append(block)
+        used += cost
+
+    return "\n\n".join(blocks)
@@ -1,30 +1,220 @@
+import json
 import os
+import threading
+from pathlib import Path
 from langchain_pinecone import PineconeVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings # Change here
 from langchain_core.tools import tool
+from src.utils.embeddings import get_embeddings
+from src.utils.metrics import observe_retrieval
+from src.tools.context_pack import pack_context, estimate_tokens
+from src.utils.vehicles import extract_vehicles
+from src.utils.resilience import guarded_call
+from src.tools.chunk_store import get_chunk_store
+from src.tools.ann_index import get_ann_index
+from src.tools.rerank import get_reranker, CANDIDATES as RERANK_CANDIDATES
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Chunks retrieved per question, and the prompt budget they are packed into
+TOP_K = int(os.getenv("RAG_TOP_K", 3))
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", 1500))
+# Fewer chunks are needed once other vehicles' manuals are filtered out
+FILTERED_TOP_K = int(os.getenv("RAG_FILTERED_TOP_K", 2))
+
+# make -> model -> years of the manuals ingest tagged (written by ingest_docs.py)
+DEFAULT_CATALOG = Path(__file__).resolve().parent.parent.parent / ".cache" / "vehicle_catalog.json"
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def catalog_path() -> Path:
+    return Path(os.getenv("VEHICLE_CATALOG", str(DEFAULT_CATALOG)))
+
+def tagged_vehicles():
+    """
+    {make: {model or "": set of years}} of the vehicles ingest tagged chunks
+    with, or None when this host has no catalog. Read once per process.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                try:
+                    with open(catalog_path(), encoding="utf-8") as f:
+                        raw = json.load(f)
+                    _catalog = {make: {model: set(years) for model, years in models.items()}
+                                for make, models in raw.items()}
+                except (OSError, ValueError):
+                    _catalog = {}
+    return _catalog or None
+
+def match_model(model: str, tagged: dict):
+    """
+    The longest tagged model the parsed `model` starts with ('creta tire' ->
+    'creta', '5 series' -> '5 series'), or None. The parser takes up to two
+    words after the make, so the second is often not part of the model.
+    """
+    if not model:
+        return None
+    words = model.split()
+    for n in range(len(words), 0, -1):
+        if " ".join(words[:n]) in tagged:
+            return " ".join(words[:n])
+    return None
+
+def vehicle_filters(text: str, vehicle_hint: str = "") -> list:
+    """
+    Pinecone metadata filters for the first vehicle named in `text` (else in
+    `vehicle_hint`), most specific first: make+model+year, make+model, make.
+
+    With the ingest catalog, only filters some tagged chunk can match are
+    returned: the model is matched against the tagged models and tiers for an
+    untagged make, model or year are dropped. Without it, only the first
+    model word is used, since the second is as likely the question's.
+    """
+    vehicles = extract_vehicles(text) or extract_vehicles(vehicle_hint)
+    if not vehicles:
+        return []
+    v = vehicles[0]
+    catalog = tagged_vehicles()
+    if catalog is None:
+        model = v.base_model
+        years = None
+    else:
+        if v.make not in catalog:
+            return []
+        model = match_model(v.model, catalog[v.make])
+        years = catalog[v.make].get(model, set())
+    filters = []
+    if model and v.year and (years is None or v.year in years):
+        filters.append({"make": v.make, "model": model, "year": v.year})
+    if model:
+        filters.append({"make": v.make, "model": model})
+    filters.append({"make": v.make})
+    return filters
+
+class ChunkTextsMissing(ValueError):
+    """Pinecone matched chunks whose text is neither in the local store nor in the match metadata."""
+
+MISSING_TEXTS_HINT = ("keep chunk texts in Pinecone (ingest with PINECONE_STORE_TEXT unset or 1) "
+                      "or copy the ingest host's chunk store to CHUNK_STORE_DIR")
+
+def metadata_search(vectorstore, query: str):
+    """
+    search(k, filter) reading texts from the match metadata. langchain_pinecone
+    silently skips matches without text, so an unfiltered search that comes
+    back empty means the index holds no texts (or nothing at all): fail loudly
+    rather than hand the LLM an empty context.
+    """
+    def search(k, vehicle_filter):
+        results = vectorstore.similarity_search_with_score(query, k=k, filter=vehicle_filter)
+        if not results and vehicle_filter is None:
+            raise ChunkTextsMissing(f"Unfiltered manual search returned no chunk texts; {MISSING_TEXTS_HINT}")
+        return results
+
+    return search
+
+def chunk_search(vectorstore, query: str):
+    """
+    Returns search(k, filter) -> [(Document, score)]. With a local chunk store,
+    Pinecone returns IDs and scores only and the texts are read locally;
+    without one (or for chunks it doesn't hold) texts come from the match
+    metadata. Chunks whose text is in neither raise ChunkTextsMissing.
+    """
+    store = get_chunk_store()
+    if store is None or not len(store):
+        return metadata_search(vectorstore, query)
+
+    # Embedded once, not again for each filter or hedged attempt
+    vector = vectorstore.embeddings.embed_query(query)
+
+    def search(k, vehicle_filter):
+        response = vectorstore.index.query(
+            vector=vector, top_k=k, filter=vehicle_filter, include_metadata=False, include_values=False
+        )
+        matches = [(m["id"], m["score"]) for m in response["matches"]]
+        docs = store.documents(matches)
+        if docs is None:
+            log.warning("rag.store_miss", "   ⚠️ Chunks missing from the local store, fetching texts from Pinecone (re-run ingest)")
+            docs = vectorstore.similarity_search_with_score(query, k=k, filter=vehicle_filter)
+            if len(docs) < len(matches):
+                raise ChunkTextsMissing(
+                    f"{len(matches) - len(docs)} of {len(matches)} matched chunks have no text; {MISSING_TEXTS_HINT}")
+        return docs
+
+    return search
+
+def local_search(index, query: str):
+    """
+    search(k, filter) over the local ANN index (RAG_INDEX=local), with texts
+    from the chunk store; same results shape as chunk_search.
+    """
+    store = get_chunk_store()
+    vector = get_embeddings().embed_query(query)
+
+    def search(k, vehicle_filter):
+        docs = store.documents(index.search(vector, k, vehicle_filter)) if store is not None else None
+        if docs is None:
+            # The index holds no texts, so there is nothing to fall back to
+            raise ChunkTextsMissing("ANN index and chunk store are out of step; re-run ingest on this host")
+        return docs
+
+    return search
 
 @tool
-def pinecone_rag_tool(query: str):
+def pinecone_rag_tool(query: str, vehicle_hint: str = ""):
     """
     Consults the automobile user manuals to answer technical questions...
+    `vehicle_hint` is earlier conversation text naming the vehicle, used when
+    the question itself doesn't.
     """
-    # Use HuggingFace instead of Groq for embeddings
-    # This model is small, fast, and free to run locally or via API
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    return retrieve_context(query, vehicle_hint)
+
+def retrieve_context(query: str, vehicle_hint: str = "") -> str:
+    """Searches the manuals and returns the packed prompt context (the body of pinecone_rag_tool)."""
+    index = get_ann_index()
+    if index is not None:
+        # Local ANN index: in-process, nothing to guard
+        source, search = "local", local_search(index, query)
+        run = search
+    else:
+        # Use HuggingFace instead of Groq for embeddings
+        # This model is small, fast, and free to run locally or via API
+        embeddings = get_embeddings()
+
+        # Connect to the existing Pinecone Index
+        vectorstore = PineconeVectorStore(
+            index_name=os.getenv("PINECONE_INDEX_NAME"),
+            embedding=embeddings
+        )
+        source, search = "pinecone", chunk_search(vectorstore, query)
+        run = lambda k, vehicle_filter: guarded_call("pinecone", lambda _: search(k, vehicle_filter), hedge=True)
     
-    # Connect to the existing Pinecone Index
-    vectorstore = PineconeVectorStore(
-        index_name=os.getenv("PINECONE_INDEX_NAME"),
-        embedding=embeddings
-    )
+    # With a reranker, over-fetch and let it pick the few chunks the LLM sees
+    reranker = get_reranker()
+    if reranker is not None:
+        filtered_k = top_k = int(os.getenv("RERANK_CANDIDATES", RERANK_CANDIDATES))
+    else:
+        filtered_k, top_k = FILTERED_TOP_K, TOP_K
     
-    # Perform Similarity Search
-    docs = vectorstore.similarity_search(query, k=3)
+    # Search only the asked-about vehicle's manual, loosening the filter until
+    # something matches (manuals ingested before tagging carry no metadata)
+    results = []
+    for vehicle_filter in vehicle_filters(query, vehicle_hint):
+        results = run(filtered_k, vehicle_filter)
+        if results:
+            log.info("rag.scoped", "   🚗 Manual search scoped to %s", vehicle_filter)
+            break
+    if not results:
+        results = run(top_k, None)
+    observe_retrieval(source, [score for _, score in results])
+    if reranker is not None:
+        results = reranker.rerank(query, results)
     
-    # Format the results
-    context = "\n\n".join([
-        f"Source: {d.metadata.get('source', 'Unknown')}\nContent: {d.page_content}" 
-        for d in docs
-    ])
+    # Merge overlapping chunks, drop repeated text and fit the prompt budget
+    context = pack_context(results, CONTEXT_TOKENS)
+    raw_tokens = sum(estimate_tokens(d.page_content) for d, _ in results)
+    log.info("rag.packed", "   📦 Packed %s chunks: ~%s → ~%s tokens", len(results), raw_tokens, estimate_tokens(context))
     
     return context
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Cross-encoder reranking of retrieved manual chunks.
+
+The first-stage MiniLM similarity is noisy, so without reranking every
+retrieved chunk goes into the 70B prompt. With RAG_RERANK=1, retrieval
+over-fetches RERANK_CANDIDATES chunks instead. A small CPU cross-encoder scores
+every (question, chunk) pair in one batched forward pass, and only the best
+RERANK_TOP_N go on to context packing and the LLM.
+
+- Scores are cached by (query hash, chunk ID) in an in-process LRU, so a
+  question asked again skips the model.
+- Scoring stays under RERANK_BUDGET_MS. The reranker tracks its cost per pair
+  and only scores the leading candidates it can afford, but always at least
+  MIN_PAIRS, so one slow pass can't switch reranking off for good: every
+  search re-measures the cost. Unscored candidates follow the scored ones in
+  first-stage order. When the model can't be loaded, the first-stage order
+  is kept.
+- The model scores one batch at a time; concurrent searches queue for it
+  rather than splitting the CPU between forward passes.
+
+Settings:
+
+    RAG_RERANK=1          turn reranking on
+    RERANK_MODEL          cross-encoder/ms-marco-MiniLM-L-6-v2
+    RERANK_CANDIDATES     chunks retrieved for reranking (10)
+    RERANK_TOP_N          chunks kept (3)
+    RERANK_BUDGET_MS      scoring time allowed per search (250)
+    RERANK_CACHE_SIZE     cached (query, chunk) scores (4096)
+
+check_pinecone.py --rerank measures latency, key-fact coverage and context
+size with and without it.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.tools.chunk_store import chunk_id
+from src.utils.metrics import RERANK_SECONDS, RERANK_PAIRS
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+CANDIDATES = 10
+TOP_N = 3
+BUDGET_MS = 250
+CACHE_SIZE = 4096
+# Tokens per (question, chunk) pair; a 2000-character chunk fits
+MAX_LENGTH = 512
+# Weight of the latest call in the per-pair cost estimate
+COST_SMOOTHING = 0.2
+# Pairs scored per search even when the estimate says none fit
+MIN_PAIRS = 1
+
+
+def query_key(query: str) -> str:
+    return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def load_cross_encoder(name: str = RERANK_MODEL):
+    # Imported here so processes without reranking never load PyTorch for it
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name, max_length=MAX_LENGTH, device="cpu")
+
+
+class Reranker:
+    def __init__(self, model=None, model_name: str = RERANK_MODEL, top_n: int = TOP_N,
+                 budget_ms: float = BUDGET_MS, cache_size: int = CACHE_SIZE):
+        self.model = model
+        self.model_name = model_name
+        self.top_n = top_n
+        self.budget_s = budget_ms / 1000
+        self.cache_size = cache_size
+        self.cache = OrderedDict()   # (query key, chunk ID) -> score
+        self.lock = threading.Lock()
+        self.model_lock = threading.Lock()
+        self.predict_lock = threading.Lock()
+        self.pair_s = None           # Smoothed seconds per scored pair
+        self.failed = False
+
+    def _model(self):
+        if self.model is None and not self.failed:
+            with self.model_lock:
+                if self.model is None and not self.failed:
+                    try:
+                        model = load_cross_encoder(self.model_name)
+                        # The first pass is slow; keep it out of the per-pair cost
+                        model.predict([("warm up", "warm up")], show_progress_bar=False)
+                        self.model = model
+                    except (ImportError, OSError) as e:
+                        self.failed = True
+                        log.warning("rerank.unavailable", "⚠️ Reranker unavailable, keeping retrieval order: %s", e)
+        return self.model
+
+    def _cached(self, keys: list) -> list:
+        with self.lock:
+            scores = []
+            for key in keys:
+                score = self.cache.get(key)
+                if score is not None:
+                    self.cache.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def _remember(self, items: list):
+        with self.lock:
+            for key, score in items:
+                self.cache[key] = score
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _affordable(self, n: int) -> int:
+        """How many of n uncached pairs fit the budget at the measured cost (all of them until measured)."""
+        if self.pair_s is None:
+            return n
+        return min(n, max(MIN_PAIRS, int(self.budget_s / self.pair_s)))
+
+    def _score(self, query: str, docs: list) -> list:
+        model = self._model()
+        if model is None:
+            return None
+        pairs = [(query, doc.page_content) for doc in docs]
+        with self.predict_lock:
+            # Timed inside the lock: waiting for another search isn't scoring cost
+            start = time.perf_counter()
+            # One forward pass over every pair
+            scores = model.predict(pairs, batch_size=len(docs), show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+        RERANK_SECONDS.observe(elapsed)
+        per_pair = elapsed / len(docs)
+        with self.lock:
+            self.pair_s = per_pair if self.pair_s is None else (
+                COST_SMOOTHING * per_pair + (1 - COST_SMOOTHING) * self.pair_s)
+        return [float(s) for s in scores]
+
+    def rerank(self, query: str, results: list) -> list:
+        """The best top_n of [(Document, score)] by cross-encoder score, best first."""
+        if len(results) <= 1:
+            return results
+        qkey = query_key(query)
+        keys = [(qkey, doc.id or chunk_id(doc)) for doc, _ in results]
+        scores = self._cached(keys)
+        missing = [i for i, s in enumerate(scores) if s is None]
+        RERANK_PAIRS.inc(len(results) - len(missing), outcome="cached")
+
+        todo = missing[:self._affordable(len(missing))]
+        if todo:
+            fresh = self._score(query, [results[i][0] for i in todo])
+            if fresh is None:
+                return results[:self.top_n]
+            for i, score in zip(todo, fresh):
+                scores[i] = score
+            self._remember([(keys[i], scores[i]) for i in todo])
+        RERANK_PAIRS.inc(len(todo), outcome="scored")
+        if len(missing) > len(todo):
+            RERANK_PAIRS.inc(len(missing) - len(todo), outcome="skipped")
+            log.info("rerank.budget", "   ⏱️ Rerank budget: scored %s of %s new chunks", len(todo), len(missing))
+
+        scored = sorted(((results[i][0], s) for i, s in enumerate(scores) if s is not None),
+                        key=lambda r: r[1], reverse=True)
+        if not scored:
+            return results[:self.top_n]
+        # Unscored chunks rank after the scored ones (pack_context keeps equal scores in order)
+        floor = min(s for _, s in scored)
+        rest = [(doc, floor) for (doc, _), s in zip(results, scores) if s is None]
+        return (scored + rest)[:self.top_n]
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """The process-wide reranker when RAG_RERANK=1, else None."""
+    global _reranker
+    if os.getenv("RAG_RERANK") != "1":
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker(
+                    model_name=os.getenv("RERANK_MODEL", RERANK_MODEL),
+                    top_n=int(os.getenv("RERANK_TOP_N", TOP_N)),
+                    budget_ms=float(os.getenv("RERANK_BUDGET_MS", BUDGET_MS)),
+                    cache_size=int(os.getenv("RERANK_CACHE_SIZE", CACHE_SIZE)),
+                )
+    return _reranker
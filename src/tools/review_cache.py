@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_CACHE_PATH = BASE_DIR / ".cache" / "review_cache.sqlite3"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# How long an entry is served without touching the network
+ARTICLE_TTL = 7 * 24 * 3600
+SEARCH_TTL = 24 * 3600
+
+
+class ReviewCache:
+    """
+    On-disk cache for the review scrapers.
+
+    Stores the *extracted* article text (or serialized search results) together
+    with the ETag / Last-Modified validators of the response it came from, so
+    stale entries can be revalidated with a conditional GET. Total size is capped
+    and the least recently used entries are evicted first.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    ttl REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """Returns the entry as a dict (with a `fresh` flag) or None."""
+        try:
+            with self._conn() as conn:
+                row = conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            entry = dict(row)
+            entry["fresh"] = now - entry["fetched_at"] < entry["ttl"]
+            return entry
+        except sqlite3.Error as e:
+            log.warning("review_cache.read_error", "      ⚠️ Review cache read failed: %s", e)
+            return None
+
+    def put(self, key: str, content: str, ttl: float, etag: str = None, last_modified: str = None):
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, content, etag, last_modified, now, now, ttl, len(content.encode("utf-8")))
+                )
+            self.evict()
+        except sqlite3.Error as e:
+            log.warning("review_cache.write_error", "      ⚠️ Review cache write failed: %s", e)
+
+    def touch(self, key: str):
+        """Marks an entry as freshly validated (after a 304 Not Modified)."""
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                    (now, now, key)
+                )
+        except sqlite3.Error as e:
+            log.warning("review_cache.write_error", "      ⚠️ Review cache write failed: %s", e)
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits in `max_bytes`."""
+        with self._conn() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall()
+            doomed = []
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((row["key"],))
+                total -= row["size"]
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._conn() as conn:
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": row[0], "bytes": row[1], "max_bytes": self.max_bytes}
+
+
+def conditional_headers(entry) -> dict:
+    """Builds If-None-Match / If-Modified-Since headers from a cached entry."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def search_key(engine: str, query: str) -> str:
+    return f"search:{engine}:{query.strip().lower()}"
+
+
+def load_search(entry) -> list:
+    return json.loads(entry["content"])
+
+
+def dump_search(results: list) -> str:
+    return json.dumps(results)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_review_cache():
+    """Returns the process-wide review cache, or None when disabled."""
+    global _cache
+    if os.getenv("REVIEW_CACHE_DISABLED") == "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.getenv("REVIEW_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+                max_mb = float(os.getenv("REVIEW_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+                _cache = ReviewCache(path, max_bytes=int(max_mb * 1024 * 1024))
+    return _cache
+
+
+def warm_cache(urls: list) -> int:
+    """Pre-fetches and extracts a list of article URLs into the cache."""
+    from src.tools.car_review import fetch_article_content, _fetch_pool
+
+    futures = [_fetch_pool.submit(fetch_article_content, url) for url in urls]
+    warmed = sum(1 for f in futures if f.result())
+    print(f"✅ Warmed {warmed}/{len(urls)} articles")
+    return warmed
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.tools.review_cache urls.txt
+    if len(sys.argv) != 2:
+        print("Usage: python -m src.tools.review_cache <url_list.txt>")
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        url_list = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    cache = get_review_cache()
+    if cache is None:
+        print("❌ Review cache is disabled (REVIEW_CACHE_DISABLED=1)")
+        sys.exit(1)
+    warm_cache(url_list)
+    print(f"📦 Cache: {cache.stats()}")
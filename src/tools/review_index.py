@@ -0,0 +1,310 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.utils.embeddings import get_embeddings, EMBEDDING_DIM
+from src.utils.metrics import observe_retrieval
+from src.utils.vehicles import extract_vehicles
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_INDEX_PATH = BASE_DIR / ".cache" / "review_index.sqlite3"
+
+# Review articles are short (<= 2000 chars), so chunks are smaller than the manuals'
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+# Retrieval is "good enough" to skip scraping when at least MIN_ARTICLES distinct,
+# fresh articles each have a chunk scoring at least MIN_SCORE
+MIN_SCORE = 0.45
+MIN_ARTICLES = 2
+MAX_ARTICLE_AGE = 30 * 24 * 3600
+TOP_K_CHUNKS = 12
+# Leading article text searched for vehicles when the title names none
+VEHICLE_SCAN_CHARS = 500
+
+
+def canonical_url(url: str) -> str:
+    """Canonical form used for dedup: https, lowercase host without www, no query/fragment/trailing slash."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, "", ""))
+
+
+def vehicle_keys(text: str) -> list:
+    """
+    "make model" keys of the vehicles named in `text` ("make" when no model),
+    with the first model word only (VehicleEntity.key).
+    """
+    keys = []
+    for v in extract_vehicles(text):
+        key = v.key(with_year=False)
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def covers(article_keys: list, wanted: str) -> bool:
+    """Whether an article about `article_keys` is about the vehicle key `wanted` (a bare make matches any of its models)."""
+    if " " in wanted:
+        return wanted in article_keys
+    return any(key == wanted or key.startswith(wanted + " ") for key in article_keys)
+
+
+class ReviewIndex:
+    """
+    Local vector index of review articles the scraper has already fetched.
+
+    Chunks and their MiniLM vectors live in SQLite. A normalized float32 matrix
+    is kept in memory for brute-force cosine search, which is plenty for a
+    corpus of a few thousand review chunks.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    url TEXT PRIMARY KEY,
+                    link TEXT,
+                    title TEXT,
+                    source TEXT,
+                    content TEXT,
+                    content_hash TEXT,
+                    fetched_at REAL,
+                    vehicles TEXT
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_url ON chunks(url);
+                CREATE TABLE IF NOT EXISTS query_stats (
+                    ts REAL,
+                    query TEXT,
+                    outcome TEXT,
+                    articles INTEGER,
+                    top_score REAL
+                );
+            """)
+            # Indexes created before vehicle keys were stored
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(articles)")}
+            if "vehicles" not in columns:
+                conn.execute("ALTER TABLE articles ADD COLUMN vehicles TEXT")
+            for row in conn.execute("SELECT url, title, content FROM articles WHERE vehicles IS NULL").fetchall():
+                conn.execute("UPDATE articles SET vehicles = ? WHERE url = ?",
+                             (json.dumps(self._article_vehicles(row["title"], row["content"])), row["url"]))
+        self._load_matrix()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def _load_matrix(self):
+        with self._conn() as conn:
+            rows = conn.execute("SELECT id, url, vector FROM chunks ORDER BY id").fetchall()
+        with self.lock:
+            self.chunk_ids = [r["id"] for r in rows]
+            self.chunk_urls = [r["url"] for r in rows]
+            if rows:
+                self.matrix = np.vstack([np.frombuffer(r["vector"], dtype=np.float32) for r in rows])
+            else:
+                self.matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    @staticmethod
+    def _article_vehicles(title: str, content: str) -> list:
+        # The title names the reviewed car; the body also names its rivals
+        return vehicle_keys(title or "") or vehicle_keys((content or "")[:VEHICLE_SCAN_CHARS])
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add_articles(self, reviews: list) -> int:
+        """
+        Chunks, embeds and stores fetched articles ({title, link, source, content}).
+        An article already indexed under the same canonical URL is only re-embedded
+        when its text changed; otherwise just its freshness is updated.
+        """
+        now = time.time()
+        to_embed = []
+        with self._conn() as conn:
+            for review in reviews:
+                url = canonical_url(review['link'])
+                content_hash = hashlib.sha1(review['content'].encode("utf-8")).hexdigest()
+                row = conn.execute("SELECT content_hash FROM articles WHERE url = ?", (url,)).fetchone()
+                if row and row["content_hash"] == content_hash:
+                    conn.execute("UPDATE articles SET fetched_at = ? WHERE url = ?", (now, url))
+                    continue
+                conn.execute("DELETE FROM chunks WHERE url = ?", (url,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, review['link'], review['title'], review['source'],
+                     review['content'], content_hash, now,
+                     json.dumps(self._article_vehicles(review['title'], review['content'])))
+                )
+                for chunk in self.splitter.split_text(review['content']):
+                    to_embed.append((url, chunk))
+
+            if to_embed:
+                vectors = self._normalize(get_embeddings().embed_documents([c for _, c in to_embed]))
+                conn.executemany(
+                    "INSERT INTO chunks (url, text, vector) VALUES (?, ?, ?)",
+                    [(url, chunk, vec.tobytes()) for (url, chunk), vec in zip(to_embed, vectors)]
+                )
+
+        if to_embed:
+            self._load_matrix()
+            log.info("review_index.indexed", "   🗂️ Indexed %s review chunks", len(to_embed))
+        return len(to_embed)
+
+    def search(self, query: str, top_k: int = TOP_K_CHUNKS) -> list:
+        """Returns the articles owning the best matching chunks, scored by their best chunk."""
+        with self.lock:
+            matrix, ids, urls = self.matrix, self.chunk_ids, self.chunk_urls
+        if len(ids) == 0:
+            return []
+
+        query_vec = self._normalize(get_embeddings().embed_query(query))
+        scores = matrix @ query_vec
+        top = np.argsort(-scores)[:top_k]
+        observe_retrieval("review_index", scores[top])
+
+        best = {}
+        for i in top:
+            best.setdefault(urls[i], float(scores[i]))
+
+        articles = []
+        with self._conn() as conn:
+            for url, score in best.items():
+                meta = conn.execute("SELECT * FROM articles WHERE url = ?", (url,)).fetchone()
+                if meta is None:
+                    continue
+                articles.append({
+                    'title': meta["title"],
+                    'link': meta["link"],
+                    'source': meta["source"],
+                    'content': meta["content"],
+                    'score': score,
+                    'fetched_at': meta["fetched_at"],
+                    'vehicles': json.loads(meta["vehicles"] or "[]"),
+                })
+        return articles
+
+    def retrieve(self, query: str, max_articles: int = 3):
+        """
+        Returns up to `max_articles` indexed articles when coverage and freshness are
+        sufficient to answer without scraping, otherwise None.
+
+        When the query names vehicles, only articles about one of them count
+        (a close embedding of a rival's review doesn't), and a comparison
+        needs an article for each.
+        """
+        now = time.time()
+        wanted = vehicle_keys(query)
+        articles = [
+            a for a in self.search(query)
+            if a['score'] >= MIN_SCORE and now - a['fetched_at'] <= MAX_ARTICLE_AGE
+            and (not wanted or any(covers(a['vehicles'], w) for w in wanted))
+        ]
+        if len(articles) < MIN_ARTICLES:
+            return None
+
+        # The best article for each named vehicle first, then the rest by score
+        chosen = []
+        for w in wanted:
+            best = next((a for a in articles if covers(a['vehicles'], w)), None)
+            if best is None:
+                return None
+            if best not in chosen:
+                chosen.append(best)
+        chosen += [a for a in articles if a not in chosen]
+        return sorted(chosen[:max_articles], key=lambda a: a['score'], reverse=True)
+
+    def record_query(self, query: str, outcome: str, articles: int = 0, top_score: float = None):
+        """Logs whether a query was served from the index ('index') or scraped ('scrape')."""
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT INTO query_stats VALUES (?, ?, ?, ?, ?)",
+                    (time.time(), query, outcome, articles, top_score)
+                )
+        except sqlite3.Error as e:
+            log.warning("review_index.stats_error", "   ⚠️ Review index stats write failed: %s", e)
+
+    def stats(self, since: float = 0) -> dict:
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT outcome, COUNT(*) AS n FROM query_stats WHERE ts >= ? GROUP BY outcome", (since,)
+            ).fetchall()
+            n_articles = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        counts = {r["outcome"]: r["n"] for r in rows}
+        total = sum(counts.values())
+        return {
+            "queries": total,
+            "served_from_index": counts.get("index", 0),
+            "scraped": counts.get("scrape", 0),
+            "scrape_avoided_rate": counts.get("index", 0) / total if total else 0.0,
+            "articles": n_articles,
+            "chunks": len(self.chunk_ids),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_review_index():
+    """Returns the process-wide review index, or None when disabled."""
+    global _index
+    if os.getenv("REVIEW_INDEX_DISABLED") == "1":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ReviewIndex(os.getenv("REVIEW_INDEX_PATH", str(DEFAULT_INDEX_PATH)))
+    return _index
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.tools.review_index [--days 7]
+    parser = argparse.ArgumentParser(description="Show how often review queries avoided scraping.")
+    parser.add_argument("--days", type=float, default=None, help="Only count the last N days")
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else 0
+    stats = get_review_index().stats(since)
+    print("📊 Review index stats")
+    print(f"   Queries:           {stats['queries']}")
+    print(f"   Served from index: {stats['served_from_index']}")
+    print(f"   Scraped:           {stats['scraped']}")
+    print(f"   Scrape avoided:    {stats['scrape_avoided_rate']:.1%}")
+    print(f"   Corpus:            {stats['articles']} articles, {stats['chunks']} chunks")
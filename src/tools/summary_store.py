@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.utils.vehicles import extract_vehicles, topic_key
+from src.utils.llm_scheduler import priority
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_STORE_PATH = BASE_DIR / ".cache" / "review_summaries.sqlite3"
+
+# Summaries older than this are regenerated instead of served
+SUMMARY_TTL = 7 * 24 * 3600
+
+# Refresher defaults: how many of the most requested keys, and how often
+REFRESH_TOP_N = 25
+REFRESH_INTERVAL = 6 * 3600
+
+
+def summary_key(query: str, query_type: str) -> str:
+    """
+    Normalizes a review query to `<type>:<vehicles>` so that "BMW X5 vs Mercedes GLE"
+    and "mercedes gle or bmw x5?" share one entry. Queries naming no vehicle
+    ("best luxury SUV") fall back to their sorted topic words.
+    """
+    vehicles = sorted({v.key() for v in extract_vehicles(query)})
+    subject = "|".join(vehicles) if vehicles else f"topic={topic_key(query)}"
+    return f"{query_type}:{subject}"
+
+
+class SummaryStore:
+    """
+    SQLite store of finished review summaries and how often each key is asked for.
+
+    Request counts are kept even for misses so the background refresher can
+    precompute the most popular questions before they go stale.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl: float = SUMMARY_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    query_type TEXT NOT NULL,
+                    summary TEXT,
+                    sources TEXT,
+                    generated_at REAL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    last_requested REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_requests ON summaries(requests)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def lookup(self, key: str, query: str, query_type: str):
+        """Counts the request and returns a fresh entry ({summary, sources}) or None."""
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute("""
+                    INSERT INTO summaries (key, query, query_type, requests, last_requested)
+                    VALUES (?, ?, ?, 1, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        requests = requests + 1, last_requested = excluded.last_requested
+                """, (key, query, query_type, now))
+                row = conn.execute("SELECT * FROM summaries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            log.warning("summary_store.read_error", "   ⚠️ Summary store read failed: %s", e)
+            return None
+
+        if row["summary"] is None or now - row["generated_at"] >= self.ttl:
+            return None
+        return {
+            "summary": row["summary"],
+            "sources": json.loads(row["sources"]),
+            "generated_at": row["generated_at"],
+        }
+
+    def save(self, key: str, query: str, query_type: str, summary: str, sources: list):
+        try:
+            with self._conn() as conn:
+                conn.execute("""
+                    INSERT INTO summaries (key, query, query_type, summary, sources, generated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        summary = excluded.summary, sources = excluded.sources,
+                        generated_at = excluded.generated_at
+                """, (key, query, query_type, summary, json.dumps(sources), time.time()))
+        except sqlite3.Error as e:
+            log.warning("summary_store.write_error", "   ⚠️ Summary store write failed: %s", e)
+
+    def top(self, n: int) -> list:
+        """The `n` most requested keys, with the query text that first produced them."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT key, query, query_type, generated_at, requests FROM summaries "
+                "ORDER BY requests DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_summary_store():
+    """Returns the process-wide summary store, or None when disabled."""
+    global _store
+    if os.getenv("REVIEW_SUMMARY_STORE_DISABLED") == "1":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SummaryStore(os.getenv("REVIEW_SUMMARY_STORE_PATH", str(DEFAULT_STORE_PATH)))
+    return _store
+
+
+def refresh_top_entries(top_n: int = REFRESH_TOP_N, max_age: float = None) -> int:
+    """
+    Regenerates the most requested summaries. Entries newer than `max_age`
+    seconds (default: half the TTL) are left alone.
+    """
+    from src.tools.car_review import generate_review_summary
+
+    store = get_summary_store()
+    if store is None:
+        return 0
+    max_age = store.ttl / 2 if max_age is None else max_age
+
+    refreshed = 0
+    for entry in store.top(top_n):
+        if entry["generated_at"] and time.time() - entry["generated_at"] < max_age:
+            continue
+        log.info("summary_store.refresh", "🔄 Refreshing review summary: %s (%s requests)", entry['key'], entry['requests'])
+        with priority("background"):
+            result = generate_review_summary(entry["query"], entry["query_type"])
+        if "summary" in result:
+            store.save(entry["key"], entry["query"], entry["query_type"], result["summary"], result["sources"])
+            refreshed += 1
+    log.info("summary_store.refreshed", "✅ Refreshed %s review summaries", refreshed)
+    return refreshed
+
+
+def _refresh_loop(interval: float, top_n: int):
+    while True:
+        try:
+            refresh_top_entries(top_n)
+        except Exception as e:
+            log.warning("summary_store.refresh_error", "⚠️ Summary refresh failed: %s", e)
+        time.sleep(interval)
+
+
+def start_background_refresher(interval: float = REFRESH_INTERVAL, top_n: int = REFRESH_TOP_N) -> threading.Thread:
+    """Runs `refresh_top_entries` on a daemon thread every `interval` seconds."""
+    thread = threading.Thread(
+        target=_refresh_loop, args=(interval, top_n), name="summary-refresher", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.tools.summary_store [--top 25] [--interval 21600] [--once]
+    parser = argparse.ArgumentParser(description="Regenerate the most requested review summaries.")
+    parser.add_argument("--top", type=int, default=REFRESH_TOP_N)
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL)
+    parser.add_argument("--once", action="store_true", help="Refresh once and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        refresh_top_entries(args.top)
+    else:
+        _refresh_loop(args.interval, args.top)
@@ -0,0 +1,315 @@
+"""
+Record/replay harness for offline, deterministic runs of the agent graph.
+
+In "record" mode every external call is executed for real and its response is
+saved to a cassette file. In "replay" mode the same calls are answered from
+the cassette without touching the network, optionally after a sleep drawn from
+a latency profile. Covered boundaries:
+
+- LLM:          ChatGroq._generate (chat completions, incl. structured output)
+- Vector store: PineconeVectorStore.similarity_search_with_score
+- Embeddings:   the shared model returned by src.utils.embeddings.get_embeddings
+- HTTP:         requests.Session.send (NHTSA, review search and article pages)
+
+The patches are applied at class level, so nodes and tools need no changes.
+Enable with environment variables before importing src.agent.graph:
+
+    AUTOINTEL_CASSETTE=benchmarks/cassettes/smoke.json
+    AUTOINTEL_CASSETTE_MODE=record | replay
+    AUTOINTEL_LATENCY_PROFILE=none | production | path/to/profile.json
+
+The local review cache, summary store, review index and chunk store are
+disabled while a cassette is installed (unless explicitly configured) so that
+recording and replay both exercise the full external-call path. Without the
+chunk store, searches read chunk texts from Pinecone metadata, so don't record
+against an index ingested with PINECONE_STORE_TEXT=0.
+"""
+import atexit
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+# Built-in latency profiles; each kind maps to a distribution spec
+LATENCY_PROFILES = {
+    "none": {},
+    "production": {
+        "llm": {"dist": "lognormal", "median_ms": 900, "sigma": 0.5},
+        "vectorstore": {"dist": "lognormal", "median_ms": 120, "sigma": 0.4},
+        "embeddings": {"dist": "fixed", "ms": 15},
+        "http": {"dist": "lognormal", "median_ms": 400, "sigma": 0.6},
+    },
+}
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class Cassette:
+    def __init__(self, path, mode: str = "replay", latency_profile=None, seed: int = 0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = _load_profile(latency_profile)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.cursors = {}
+        self.interactions = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.interactions = json.load(f).get("interactions", {})
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+
+    @staticmethod
+    def key(payload) -> str:
+        blob = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:24]
+
+    def record(self, kind: str, key: str, response):
+        with self.lock:
+            self.interactions.setdefault(kind, {}).setdefault(key, []).append(response)
+
+    def replay(self, kind: str, key: str):
+        """Returns recorded responses for a key in order, repeating the last one."""
+        with self.lock:
+            responses = self.interactions.get(kind, {}).get(key)
+            if not responses:
+                raise CassetteMiss(f"No recorded {kind} interaction for key {key}")
+            cursor = self.cursors.get((kind, key), 0)
+            self.cursors[(kind, key)] = cursor + 1
+            return responses[min(cursor, len(responses) - 1)]
+
+    def delay(self, kind: str):
+        """Sleeps according to the latency profile for this kind of call."""
+        spec = self.latency.get(kind)
+        if not spec:
+            return
+        with self.lock:
+            ms = sample_ms(spec, self.rng)
+        time.sleep(ms / 1000)
+
+    def save(self):
+        if self.mode != "record":
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = {"version": 1, "interactions": self.interactions}
+        with open(self.path, "w") as f:
+            json.dump(data, f, default=str)
+        print(f"📼 Saved cassette: {self.path}")
+
+
+def sample_ms(spec: dict, rng: random.Random) -> float:
+    """Draws milliseconds from a latency spec ("fixed", "uniform" or "lognormal")."""
+    if spec["dist"] == "fixed":
+        return spec["ms"]
+    if spec["dist"] == "uniform":
+        return rng.uniform(spec["min_ms"], spec["max_ms"])
+    if spec["dist"] == "lognormal":
+        return spec["median_ms"] * rng.lognormvariate(0, spec["sigma"])
+    raise ValueError(f"Unknown latency distribution: {spec['dist']}")
+
+
+def _load_profile(profile) -> dict:
+    if profile is None:
+        return {}
+    if isinstance(profile, dict):
+        return profile
+    if profile in LATENCY_PROFILES:
+        return LATENCY_PROFILES[profile]
+    with open(profile) as f:
+        return json.load(f)
+
+
+class CassetteEmbeddings(Embeddings):
+    """Records or replays embedding vectors, keyed by the embedded text."""
+
+    def __init__(self, cassette: Cassette, base: Embeddings = None):
+        self.cassette = cassette
+        self.base = base
+
+    def _key(self, kind: str, text: str) -> str:
+        return self.cassette.key({"kind": kind, "text": text})
+
+    def embed_documents(self, texts):
+        keys = [self._key("document", t) for t in texts]
+        if self.cassette.mode == "replay":
+            self.cassette.delay("embeddings")
+            return [self.cassette.replay("embeddings", k) for k in keys]
+        vectors = self.base.embed_documents(texts)
+        for k, v in zip(keys, vectors):
+            self.cassette.record("embeddings", k, list(v))
+        return vectors
+
+    def embed_query(self, text):
+        key = self._key("query", text)
+        if self.cassette.mode == "replay":
+            self.cassette.delay("embeddings")
+            return self.cassette.replay("embeddings", key)
+        vector = self.base.embed_query(text)
+        self.cassette.record("embeddings", key, list(vector))
+        return vector
+
+
+def _patch_llm(cassette: Cassette):
+    from langchain_groq import ChatGroq
+    from langchain_core.outputs import ChatResult, ChatGeneration
+    from langchain_core.messages import message_to_dict, messages_from_dict
+
+    original = ChatGroq._generate
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = cassette.key({
+            "model": self.model_name,
+            "messages": [(m.type, m.content) for m in messages],
+            "stop": stop,
+            # The timeout is whatever the turn had left, not part of the request
+            "kwargs": {k: v for k, v in kwargs.items() if k != "timeout"},
+        })
+        if cassette.mode == "replay":
+            cassette.delay("llm")
+            data = cassette.replay("llm", key)
+            generations = [ChatGeneration(message=m) for m in messages_from_dict(data["generations"])]
+            return ChatResult(generations=generations, llm_output=data.get("llm_output"))
+
+        result = original(self, messages, stop=stop, run_manager=run_manager, **kwargs)
+        cassette.record("llm", key, {
+            "generations": [message_to_dict(g.message) for g in result.generations],
+            "llm_output": result.llm_output,
+        })
+        return result
+
+    ChatGroq._generate = _generate
+
+
+def _patch_vectorstore(cassette: Cassette):
+    from langchain_pinecone import PineconeVectorStore
+    from langchain_core.documents import Document
+
+    original_init = PineconeVectorStore.__init__
+    original_search = PineconeVectorStore.similarity_search_with_score
+
+    def __init__(self, *args, **kwargs):
+        if cassette.mode == "replay":
+            # Don't connect to Pinecone; searches are answered from the cassette
+            self._embedding = kwargs.get("embedding")
+            self._namespace = kwargs.get("namespace")
+            return
+        original_init(self, *args, **kwargs)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, namespace=None, **kwargs):
+        key = cassette.key({"query": query, "k": k, "filter": filter, "namespace": namespace})
+        if cassette.mode == "replay":
+            cassette.delay("vectorstore")
+            return [
+                (Document(page_content=d["page_content"], metadata=d["metadata"]), d["score"])
+                for d in cassette.replay("vectorstore", key)
+            ]
+
+        results = original_search(self, query, k=k, filter=filter, namespace=namespace, **kwargs)
+        cassette.record("vectorstore", key, [
+            {"page_content": doc.page_content, "metadata": doc.metadata, "score": score}
+            for doc, score in results
+        ])
+        return results
+
+    PineconeVectorStore.__init__ = __init__
+    PineconeVectorStore.similarity_search_with_score = similarity_search_with_score
+
+
+def _patch_http(cassette: Cassette):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    original_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        key = cassette.key({
+            "method": request.method,
+            "url": request.url,
+            "body": hashlib.sha256(body).hexdigest(),
+        })
+        if cassette.mode == "replay":
+            cassette.delay("http")
+            data = cassette.replay("http", key)
+            response = requests.Response()
+            response.status_code = data["status_code"]
+            response.headers = CaseInsensitiveDict(data["headers"])
+            response._content = base64.b64decode(data["content"])
+            response.encoding = data.get("encoding")
+            response.url = data["url"]
+            response.request = request
+            return response
+
+        response = original_send(self, request, **kwargs)
+        cassette.record("http", key, {
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "content": base64.b64encode(response.content).decode("ascii"),
+            "encoding": response.encoding,
+            "url": response.url,
+        })
+        return response
+
+    requests.Session.send = send
+
+
+_active = None
+
+
+def active_cassette():
+    """The installed cassette, or None."""
+    return _active
+
+
+def install(path, mode: str = "replay", latency_profile=None, seed: int = 0) -> Cassette:
+    """Patches the external-call boundaries to record to / replay from `path`."""
+    global _active
+    if _active is not None:
+        return _active
+
+    cassette = Cassette(path, mode, latency_profile, seed)
+    for flag in ("REVIEW_CACHE_DISABLED", "REVIEW_SUMMARY_STORE_DISABLED", "REVIEW_INDEX_DISABLED",
+                 "CHUNK_STORE_DISABLED"):
+        os.environ.setdefault(flag, "1")
+    if mode == "replay":
+        # Clients validate credentials at construction; nothing is sent in replay
+        os.environ.setdefault("GROQ_API_KEY", "replay")
+        os.environ.setdefault("PINECONE_API_KEY", "replay")
+        os.environ.setdefault("PINECONE_INDEX_NAME", "replay")
+        # Replayed calls don't use the Groq quota
+        os.environ.setdefault("AUTOINTEL_GROQ_SCHEDULER", "0")
+
+    _patch_llm(cassette)
+    _patch_vectorstore(cassette)
+    _patch_http(cassette)
+    atexit.register(cassette.save)
+
+    _active = cassette
+    print(f"📼 Cassette {mode}: {path}")
+    return cassette
+
+
+def install_from_env():
+    """Installs a cassette if AUTOINTEL_CASSETTE is set. Returns it or None."""
+    path = os.getenv("AUTOINTEL_CASSETTE")
+    if not path:
+        return None
+    return install(
+        path,
+        mode=os.getenv("AUTOINTEL_CASSETTE_MODE", "replay"),
+        latency_profile=os.getenv("AUTOINTEL_LATENCY_PROFILE"),
+        seed=int(os.getenv("AUTOINTEL_CASSETTE_SEED", 0)),
+    )
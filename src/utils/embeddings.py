@@ -0,0 +1,39 @@
+import os
+from functools import lru_cache
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+
+def load_model(backend: str):
+    """
+    Builds the MiniLM model on `backend`: "torch" runs it through
+    sentence-transformers, "onnx" runs the int8 export from
+    src.utils.onnx_embeddings (no PyTorch import).
+    """
+    if backend == "onnx":
+        from src.utils.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    if backend != "torch":
+        raise ValueError(f"EMBEDDING_BACKEND must be one of {EMBEDDING_BACKENDS}, got {backend!r}")
+    # Imported here so processes on the ONNX backend never load PyTorch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """
+    Returns the shared MiniLM embedding model used for manuals and reviews,
+    on the backend named by EMBEDDING_BACKEND (default "torch").
+    Loading the model is expensive, so it is built once per process.
+    With a cassette installed, vectors are recorded or replayed instead.
+    """
+    from src.utils.cassette import active_cassette, CassetteEmbeddings
+
+    cassette = active_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        return CassetteEmbeddings(cassette)
+    model = load_model(os.getenv("EMBEDDING_BACKEND", "torch"))
+    return CassetteEmbeddings(cassette, model) if cassette is not None else model
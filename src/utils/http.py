@@ -0,0 +1,111 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.metrics import observe_http
+
+# Politeness defaults: sustained requests per second and burst size per host
+DEFAULT_HOST_RATE = 1.0
+DEFAULT_HOST_BURST = 3
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns a shared, connection-pooled session for outbound scraping calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens are added per second up to `capacity`.
+    Each request consumes one token; callers block until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Takes one token, waiting at most `timeout` seconds. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so each site is rate limited independently."""
+
+    def __init__(self, rate: float = DEFAULT_HOST_RATE, burst: int = DEFAULT_HOST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def acquire(self, url: str, timeout: float = None) -> bool:
+        return self.bucket_for(url).acquire(timeout)
+
+
+host_limiter = HostRateLimiter()
+
+
+def polite_get(url: str, headers: dict = None, timeout=15, wait_timeout: float = None, **kwargs):
+    """
+    GET through the shared session after taking a token for the target host.
+    Returns None if no token could be obtained within `wait_timeout` seconds.
+    """
+    if not host_limiter.acquire(url, timeout=wait_timeout):
+        return None
+    return timed_get(url, headers=headers, timeout=timeout, **kwargs)
+
+
+def timed_get(url: str, **kwargs):
+    """GET through the shared session, recording the request time per host."""
+    host = urlparse(url).netloc
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException:
+        observe_http(host, None, time.perf_counter() - start)
+        raise
+    observe_http(host, response.status_code, time.perf_counter() - start)
+    return response
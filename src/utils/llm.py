@@ -0,0 +1,113 @@
+import asyncio
+
+from langchain_groq import ChatGroq
+from src.utils.metrics import metrics_callback
+from src.utils.llm_scheduler import get_scheduler, current_priority, estimate_tokens
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+
+def _result_tokens(result):
+    """Total tokens a ChatResult reports, None when it reports none."""
+    return ((result.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+
+
+def _chunk_tokens(chunk, used):
+    """
+    Tokens used so far by a streamed request: the total once a chunk reports
+    it (Groq sends it with the last one), else None since output is flowing.
+    """
+    usage = getattr(chunk.message, "usage_metadata", None)
+    if usage:
+        return usage.get("total_tokens")
+    return used or None
+
+
+class ScheduledChatGroq(ChatGroq):
+    """
+    ChatGroq that waits for a slot from the shared Groq scheduler before each
+    request, sync or async, streamed or not. The slot's token estimate is
+    settled when the request ends; a request that fails before producing
+    anything is settled as using no tokens.
+    """
+
+    priority: str = "interactive"
+
+    def _slot(self, messages):
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return None, None, 0
+        priority = current_priority(self.priority)
+        return scheduler, priority, estimate_tokens(messages, self.max_tokens)
+
+    def _acquire(self, messages):
+        scheduler, priority, estimated = self._slot(messages)
+        if scheduler is not None:
+            scheduler.acquire(priority, estimated, scheduler.slot_timeout(priority))
+        return scheduler, estimated
+
+    async def _aacquire(self, messages):
+        scheduler, priority, estimated = self._slot(messages)
+        if scheduler is not None:
+            # acquire() blocks while queued; keep the event loop free
+            await asyncio.to_thread(scheduler.acquire, priority, estimated, scheduler.slot_timeout(priority))
+        return scheduler, estimated
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler, estimated = self._acquire(messages)
+        used = 0
+        try:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            used = _result_tokens(result)
+            return result
+        finally:
+            if scheduler is not None:
+                scheduler.settle(estimated, used)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler, estimated = await self._aacquire(messages)
+        used = 0
+        try:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            used = _result_tokens(result)
+            return result
+        finally:
+            if scheduler is not None:
+                scheduler.settle(estimated, used)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler, estimated = self._acquire(messages)
+        used = 0
+        try:
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                used = _chunk_tokens(chunk, used)
+                yield chunk
+        finally:
+            if scheduler is not None:
+                scheduler.settle(estimated, used)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler, estimated = await self._aacquire(messages)
+        used = 0
+        try:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                used = _chunk_tokens(chunk, used)
+                yield chunk
+        finally:
+            if scheduler is not None:
+                scheduler.settle(estimated, used)
+
+
+def make_llm(model: str = DEFAULT_MODEL, temperature: float = 0, priority: str = "interactive", **kwargs) -> ChatGroq:
+    """
+    Builds a Groq chat model with the shared callbacks attached, so every
+    LLM call in the agent reports latency and token usage to src.utils.metrics
+    and is scheduled against the account's quota by src.utils.llm_scheduler.
+    """
+    callbacks = [metrics_callback] + list(kwargs.pop("callbacks", None) or [])
+    scheduler = get_scheduler()
+    if scheduler is not None and "http_client" not in kwargs:
+        # Lets the scheduler read the rate-limit headers of every response
+        kwargs["http_client"], kwargs["http_async_client"] = scheduler.http_clients()
+    return ScheduledChatGroq(model=model, temperature=temperature, priority=priority,
+                             callbacks=callbacks, **kwargs)
@@ -0,0 +1,299 @@
+"""
+Shared scheduler for Groq calls.
+
+Interactive turns, safety checks, review summary refreshes and eval runs all
+use the same Groq account. Every ChatGroq built by src.utils.llm.make_llm
+asks this scheduler for a slot before it sends a request:
+
+- Quota: two token buckets, one for requests and one for tokens per minute,
+  sized from GROQ_RPM / GROQ_TPM (default 30 / 6000, Groq's free tier for
+  llama-3.3-70b). A request takes one request and its estimated tokens (prompt
+  characters / 4 plus the completion allowance). The estimate is corrected
+  with the real usage once the response arrives.
+- Priority: waiting requests are served interactive > safety > background,
+  FIFO within a class. Background work also has to leave a quarter of the
+  token bucket unused, so a batch job can't drain the quota interactive turns
+  need. The class comes from the model (make_llm(priority=...)) unless a
+  `priority()` block overrides it, as eval runs and the summary refresher do.
+- Admission control: a request whose predicted wait exceeds its class's limit
+  (or what the guarded call has left) is rejected up front with
+  AdmissionRejected, a resilience.GuardError, so callers take their degraded
+  path instead of queueing. Rejections don't count against the Groq circuit
+  breaker.
+- Adaptation: Groq's x-ratelimit-* response headers correct the buckets to
+  the server's view of the quota, and a 429 pauses all requests until its
+  retry-after has passed.
+
+AUTOINTEL_GROQ_SCHEDULER=0 turns scheduling off. The offline stubs and
+cassette replay do this, because their calls don't use the quota.
+
+Metrics: autointel_llm_queue_seconds{priority},
+autointel_llm_admission_total{priority,outcome},
+autointel_llm_queue_depth{priority} and autointel_llm_quota_remaining{kind}.
+"""
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from src.utils.metrics import LLM_QUEUE_SECONDS, LLM_ADMISSION, LLM_QUEUE_DEPTH, LLM_QUOTA
+from src.utils.resilience import GuardError, time_left, call_time_left, MIN_TIMEOUT_S
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+PRIORITIES = ("interactive", "safety", "background")
+# Seconds a request may wait for a slot before it is turned away
+MAX_WAIT_S = {"interactive": 20.0, "safety": 10.0, "background": 300.0}
+# Share of the token bucket a class must leave untouched
+RESERVE = {"interactive": 0.0, "safety": 0.0, "background": 0.25}
+
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 512
+
+_priority = ContextVar("autointel_llm_priority", default=None)
+
+
+class AdmissionRejected(GuardError):
+    pass
+
+
+@contextmanager
+def priority(name: str):
+    """Runs LLM calls made inside the block (and the graph nodes it starts) at `name`."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority {name!r}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority(default: str = "interactive") -> str:
+    return _priority.get() or default
+
+
+def estimate_tokens(messages, max_tokens: int = None) -> int:
+    chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+    return chars // CHARS_PER_TOKEN + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+DURATION_RE = re.compile(r"([\d.]+)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in a Groq reset header: "7.66s", "2m59.56s", "120ms", or plain seconds."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    return sum(float(n) * DURATION_UNITS[unit] for n, unit in DURATION_RE.findall(value or ""))
+
+
+class _Bucket:
+    """Token bucket whose level can go negative when a request used more than estimated."""
+
+    def __init__(self, per_minute: float):
+        self.set_limit(per_minute)
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def set_limit(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` of capacity."""
+        target = min(self.capacity, min(amount, self.capacity) + reserve * self.capacity)
+        return max(0.0, (target - self.level) / self.rate)
+
+
+class _Ticket:
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+
+
+class GroqScheduler:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.paused_until = 0.0
+        self.queue = []  # heap of (class rank, seq, ticket)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+
+    def _head(self):
+        while self.queue and self.queue[0][2] is None:
+            heapq.heappop(self.queue)
+        return self.queue[0][2] if self.queue else None
+
+    def _wait_time(self, ticket, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_for(1),
+            self.tokens.wait_for(ticket.tokens, RESERVE[ticket.priority]),
+        )
+
+    def _predicted_wait(self, ticket, now: float) -> float:
+        """Rough wait behind the requests already queued at the same or a higher priority."""
+        rank = PRIORITIES.index(ticket.priority)
+        ahead = [t for r, _, t in self.queue if t is not None and r <= rank]
+        tokens = sum(t.tokens for t in ahead) + ticket.tokens
+        return max(
+            self.paused_until - now,
+            (len(ahead) + 1 - self.requests.level) / self.requests.rate,
+            (tokens + RESERVE[ticket.priority] * self.tokens.capacity - self.tokens.level) / self.tokens.rate,
+        )
+
+    def _publish(self):
+        depth = {p: 0 for p in PRIORITIES}
+        for _, _, t in self.queue:
+            if t is not None:
+                depth[t.priority] += 1
+        for p, n in depth.items():
+            LLM_QUEUE_DEPTH.set(n, priority=p)
+        LLM_QUOTA.set(round(self.requests.level, 1), kind="requests")
+        LLM_QUOTA.set(round(self.tokens.level), kind="tokens")
+
+    def acquire(self, priority: str, tokens: int, max_wait: float = None) -> float:
+        """Blocks until the request may be sent; returns the seconds spent queued."""
+        max_wait = MAX_WAIT_S[priority] if max_wait is None else max_wait
+        ticket = _Ticket(priority, tokens)
+        start = time.monotonic()
+        with self.cond:
+            self.requests.refill(start)
+            self.tokens.refill(start)
+            if self._predicted_wait(ticket, start) > max_wait:
+                LLM_ADMISSION.inc(priority=priority, outcome="rejected")
+                raise AdmissionRejected(f"Groq quota busy, {priority} request would wait over {max_wait:.0f}s")
+            entry = [PRIORITIES.index(priority), next(self.seq), ticket]
+            heapq.heappush(self.queue, entry)
+            self._publish()
+
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = self._wait_time(ticket, now)
+                if self._head() is ticket and wait <= 0:
+                    heapq.heappop(self.queue)
+                    self.requests.level -= 1
+                    self.tokens.level -= min(tokens, self.tokens.capacity)
+                    self._publish()
+                    self.cond.notify_all()
+                    break
+                if now - start >= max_wait:
+                    entry[2] = None  # Lazily removed from the heap
+                    self._publish()
+                    self.cond.notify_all()
+                    LLM_ADMISSION.inc(priority=priority, outcome="timed_out")
+                    raise AdmissionRejected(f"{priority} request waited {max_wait:.0f}s for Groq quota")
+                # Wake when quota should be back, or when the queue changes
+                self.cond.wait(min(max(wait, 0.01), max_wait - (now - start), 1.0))
+
+        queued = time.monotonic() - start
+        LLM_ADMISSION.inc(priority=priority, outcome="admitted")
+        LLM_QUEUE_SECONDS.observe(queued, priority=priority)
+        return queued
+
+    def settle(self, estimated: int, used: Optional[int]):
+        """
+        Corrects the token bucket once the real usage of a request is known:
+        0 for a request that failed before using any, None (keep the
+        estimate) when the response didn't report it.
+        """
+        if used is None:
+            return
+        with self.cond:
+            self.tokens.level += min(estimated, self.tokens.capacity) - used
+            self._publish()
+            self.cond.notify_all()
+
+    def observe_response(self, status: int, headers):
+        """Adapts the buckets to Groq's rate-limit headers; a 429 pauses everyone."""
+        now = time.monotonic()
+        with self.cond:
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens and float(limit_tokens) != self.tokens.capacity:
+                log.info("scheduler.resized", "   📏 Groq token limit is %s/min, resizing the scheduler", limit_tokens)
+                self.tokens.refill(now)
+                self.tokens.set_limit(float(limit_tokens))
+
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None:
+                self.tokens.refill(now)
+                self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+
+            # The request limit Groq reports is per day; only act when it runs out
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None and float(remaining_requests) <= 0:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                self.paused_until = max(self.paused_until, now + reset)
+
+            if status == 429:
+                retry_after = parse_duration(headers.get("retry-after")) or \
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")) or 1.0
+                log.warning("scheduler.rate_limited", "   🚦 Groq returned 429, pausing requests for %.1fs", retry_after)
+                self.paused_until = max(self.paused_until, now + retry_after)
+                self.tokens.refill(now)
+                self.tokens.level = min(self.tokens.level, 0.0)
+
+            self._publish()
+            self.cond.notify_all()
+
+    def http_clients(self):
+        """httpx clients for ChatGroq that report every response's headers back here."""
+        import httpx
+
+        def hook(response):
+            self.observe_response(response.status_code, response.headers)
+
+        async def async_hook(response):
+            hook(response)
+
+        return (httpx.Client(event_hooks={"response": [hook]}),
+                httpx.AsyncClient(event_hooks={"response": [async_hook]}))
+
+    def slot_timeout(self, priority: str) -> float:
+        """
+        Queue wait allowed right now: the class limit, capped by what the
+        guarded call (else the turn) has left, less MIN_TIMEOUT_S for the
+        request itself, so a slot never arrives after the caller gave up.
+        """
+        left = call_time_left()
+        if left is None:
+            left = time_left()
+        if left is None:
+            return MAX_WAIT_S[priority]
+        return max(0.0, min(MAX_WAIT_S[priority], left - MIN_TIMEOUT_S))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler, or None when disabled."""
+    global _scheduler
+    if os.getenv("AUTOINTEL_GROQ_SCHEDULER") == "0":
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = GroqScheduler(
+                    rpm=float(os.getenv("GROQ_RPM", 30)),
+                    tpm=float(os.getenv("GROQ_TPM", 6000)),
+                )
+    return _scheduler
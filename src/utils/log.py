@@ -0,0 +1,282 @@
+"""
+Structured, asynchronous logging for the agent's hot paths.
+
+Nodes and tools log events instead of printing:
+
+    log = get_logger(__name__)
+    log.info("rag.search", "🔍 Searching manuals for: %s", query, chars=len(query))
+
+The first argument names the event (used for sampling and as a field), the
+rest is a %-style message and its arguments, plus keyword fields for the
+structured output. The calling thread only checks the level and the sample
+rate and puts the record on a bounded queue; a listener thread formats and
+writes it. When the queue is full the record is dropped and counted
+(autointel_log_dropped_total) rather than blocking a turn.
+
+Each record carries the graph node and the conversation's thread_id, which
+graph.wrap_node makes current while a node runs (`log_node`); work a node
+hands to a thread pool keeps them through `bind_log_context`.
+
+Settings:
+
+    AUTOINTEL_LOG_LEVEL    DEBUG, INFO (default), WARNING, ERROR
+    AUTOINTEL_LOG_FORMAT   text (the message, as the prints were) or json (one
+                           object per line: ts, level, event, msg, logger,
+                           node, thread_id, fields, exc)
+    AUTOINTEL_LOG_SAMPLE   per-event keep rates for DEBUG/INFO records, e.g.
+                           "router.route=0.1,rag.*=0.5,*=1"; warnings and
+                           errors are always kept
+    AUTOINTEL_LOG_FILE     append to a file instead of stdout
+    AUTOINTEL_LOG_QUEUE    queue size (10000)
+
+benchmarks/run.py measures the per-call cost (log.* metrics).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+
+from src.utils.metrics import LOG_DROPPED
+
+ROOT = "autointel"
+
+_node = ContextVar("autointel_log_node", default=None)
+_thread_id = ContextVar("autointel_log_thread_id", default=None)
+
+
+@contextmanager
+def log_context(node: str = None, thread_id: str = None):
+    """Tags records logged inside the block with the node and conversation."""
+    tokens = [(_node, _node.set(node)) if node is not None else None,
+              (_thread_id, _thread_id.set(thread_id)) if thread_id is not None else None]
+    try:
+        yield
+    finally:
+        for var, token in reversed([t for t in tokens if t is not None]):
+            var.reset(token)
+
+
+def bind_log_context(fn):
+    """`fn` with the caller's node and thread_id, for work handed to a thread pool."""
+    node, thread_id = _node.get(), _thread_id.get()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with log_context(node=node, thread_id=thread_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def graph_thread_id():
+    """thread_id of the LangGraph run this code is part of, if any."""
+    try:
+        from langgraph.config import get_config
+        return get_config().get("configurable", {}).get("thread_id")
+    except (ImportError, RuntimeError):
+        return None
+
+
+def log_node(name: str, fn):
+    """Wraps a graph node so its records carry the node name and thread_id."""
+    @wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        with log_context(node=name, thread_id=graph_thread_id()):
+            return fn(state, *args, **kwargs)
+    return wrapper
+
+
+class Sampler:
+    """Keep rates per event name; "prefix.*" and "*" patterns are allowed."""
+
+    def __init__(self, spec: str = ""):
+        self.rates = {}
+        self.prefixes = []
+        self.default = 1.0
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            name, _, rate = part.partition("=")
+            rate = float(rate)
+            if name == "*":
+                self.default = rate
+            elif name.endswith(".*"):
+                self.prefixes.append((name[:-1], rate))
+            else:
+                self.rates[name] = rate
+        # Longest prefix wins
+        self.prefixes.sort(key=lambda p: -len(p[0]))
+        self.cache = {}
+
+    def rate(self, event: str) -> float:
+        rate = self.cache.get(event)
+        if rate is None:
+            rate = self.rates.get(event)
+            if rate is None:
+                rate = next((r for prefix, r in self.prefixes if event.startswith(prefix)), self.default)
+            self.cache[event] = rate
+        return rate
+
+    def keep(self, event: str) -> bool:
+        rate = self.rate(event)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class EventLogger:
+    __slots__ = ("logger",)
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name if name.startswith(ROOT) else f"{ROOT}.{name}")
+
+    def _log(self, level: int, event: str, msg: str, args, fields, exc_info=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not _sampler.keep(event):
+            return
+        # makeRecord skips logging's stack walk for the caller's file and line
+        record = self.logger.makeRecord(
+            self.logger.name, level, "", 0, msg, args, sys.exc_info() if exc_info else None,
+            extra={"event": event, "fields": fields, "node": _node.get(), "thread_id": _thread_id.get()},
+        )
+        self.logger.handle(record)
+
+    def debug(self, event: str, msg: str = "", *args, **fields):
+        self._log(logging.DEBUG, event, msg, args, fields)
+
+    def info(self, event: str, msg: str = "", *args, **fields):
+        self._log(logging.INFO, event, msg, args, fields)
+
+    def warning(self, event: str, msg: str = "", *args, **fields):
+        self._log(logging.WARNING, event, msg, args, fields)
+
+    def error(self, event: str, msg: str = "", *args, **fields):
+        self._log(logging.ERROR, event, msg, args, fields)
+
+    def exception(self, event: str, msg: str = "", *args, **fields):
+        """ERROR with the current exception's traceback (replaces traceback.print_exc)."""
+        self._log(logging.ERROR, event, msg, args, fields, exc_info=True)
+
+
+def get_logger(name: str) -> EventLogger:
+    configure()
+    return EventLogger(name)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks: renders the message in the caller, drops the record when the queue is full."""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        text = record.getMessage()
+        if record.exc_text:
+            text = f"{text}\n{record.exc_text}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": getattr(record, "event", None),
+            "msg": record.getMessage(),
+            "logger": record.name,
+            "node": getattr(record, "node", None),
+            "thread_id": getattr(record, "thread_id", None),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            out["fields"] = fields
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, so redirect_stdout still applies."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+_sampler = Sampler()
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure(level: str = None, fmt: str = None, sample: str = None, path: str = None,
+              queue_size: int = None, stream=None, force: bool = False):
+    """Sets up the queue and listener once per process (from the environment unless given)."""
+    global _sampler, _listener
+    if _listener is not None and not force:
+        return
+    with _configure_lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+
+        fmt = fmt or os.getenv("AUTOINTEL_LOG_FORMAT", "text")
+        path = path or os.getenv("AUTOINTEL_LOG_FILE")
+        if stream is not None:
+            sink = logging.StreamHandler(stream)
+        elif path:
+            sink = logging.FileHandler(path, encoding="utf-8")
+        else:
+            sink = _StdoutHandler()
+        sink.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        records = queue.Queue(maxsize=queue_size or int(os.getenv("AUTOINTEL_LOG_QUEUE", 10000)))
+        root = logging.getLogger(ROOT)
+        root.handlers = [_DroppingQueueHandler(records)]
+        root.setLevel((level or os.getenv("AUTOINTEL_LOG_LEVEL", "INFO")).upper())
+        root.propagate = False
+        _sampler = Sampler(os.getenv("AUTOINTEL_LOG_SAMPLE", "") if sample is None else sample)
+
+        _listener = QueueListener(records, sink)
+        _listener.start()
+
+
+def flush(timeout: float = 2.0):
+    """Waits until the listener has written everything queued so far."""
+    if _listener is None:
+        return
+    deadline = time.monotonic() + timeout
+    while not _listener.queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    # The last record may still be mid-write
+    time.sleep(0.005)
+
+
+def _shutdown():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_shutdown)
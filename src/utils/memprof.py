@@ -0,0 +1,202 @@
+"""
+Opt-in allocation profiling per graph node and per turn, based on tracemalloc.
+
+Enable with AUTOINTEL_MEMPROFILE=1 (AUTOINTEL_MEMPROFILE_FRAMES sets the
+traceback depth, default 10). Tracing slows Python code down noticeably, so
+this is for benchmark runs and investigating RSS growth, not for serving.
+
+- Each graph node wrapped with `profile_node` records the bytes it left
+  allocated ("net") and the most it had allocated at once ("peak").
+- `profiler.turn()` brackets one conversation turn. It records the turn's peak
+  and retained growth, and the allocation sites that grew the most (from a
+  snapshot diff). Retained growth that never comes back, e.g. checkpoints
+  accumulating in MemorySaver, shows up here turn after turn.
+- With a budget (AUTOINTEL_MEMORY_BUDGET_MB or `enable(budget_mb=...)`), a
+  turn whose peak exceeds it is flagged. `turn(enforce=True)` raises
+  MemoryBudgetExceeded instead, which is how benchmark runs fail.
+
+tracemalloc's counters are process-wide, so profile one turn at a time.
+Within a turn the fan-out branches would run concurrently and each node's
+peak reset would clobber the others' figures; while profiling is enabled,
+nodes therefore run one at a time. Prefetch and guarded-call threads keep
+running alongside, so a node's figures include what they allocate meanwhile;
+the per-turn figures are exact.
+"""
+import os
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+TOP_SITES = 10
+MAX_TURNS = 1000
+
+# Allocation sites that are profiling overhead rather than application memory
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when an enforced turn allocates more than the configured budget."""
+
+
+class TurnProfile:
+    def __init__(self, label: str, start: int):
+        self.label = label
+        self.start = start
+        self.peak_abs = start
+        self.nodes = {}
+        self.peak_kb = 0.0
+        self.retained_kb = 0.0
+        self.top_sites = []
+        self.over_budget = False
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "peak_kb": self.peak_kb,
+            "retained_kb": self.retained_kb,
+            "nodes": self.nodes,
+            "top_sites": self.top_sites,
+            "over_budget": self.over_budget,
+        }
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.budget_kb = None
+        self.current = None
+        self.turns = deque(maxlen=MAX_TURNS)
+        self.lock = threading.Lock()
+        # Held for a node's whole run while profiling, so nodes don't overlap
+        self.node_lock = threading.Lock()
+
+    def enable(self, frames: int = 10, budget_mb: float = None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.budget_kb = budget_mb * 1024 if budget_mb else None
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def run_node(self, name: str, fn, *args, **kwargs):
+        with self.node_lock:
+            before, earlier_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                after, peak = tracemalloc.get_traced_memory()
+                with self.lock:
+                    turn = self.current
+                    if turn is not None:
+                        turn.nodes[name] = {
+                            "net_kb": (after - before) / 1024,
+                            "peak_kb": (peak - before) / 1024,
+                        }
+                        # The reset above dropped the peak since the last node; keep it for the turn
+                        turn.peak_abs = max(turn.peak_abs, earlier_peak, peak)
+
+    @contextmanager
+    def turn(self, label: str = "", enforce: bool = False):
+        """Profiles the graph turn run inside the block; yields its TurnProfile (or None when disabled)."""
+        if not self.enabled:
+            yield None
+            return
+
+        before_snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        record = TurnProfile(label, start)
+        with self.lock:
+            self.current = record
+        try:
+            yield record
+        finally:
+            end, peak = tracemalloc.get_traced_memory()
+            after_snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+            with self.lock:
+                self.current = None
+            record.peak_kb = (max(record.peak_abs, peak) - start) / 1024
+            record.retained_kb = (end - start) / 1024
+            record.top_sites = [
+                {"site": str(stat.traceback[0]), "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+                for stat in after_snapshot.compare_to(before_snapshot, "lineno")[:TOP_SITES]
+                if stat.size_diff > 0
+            ]
+            record.over_budget = self.budget_kb is not None and record.peak_kb > self.budget_kb
+            self.turns.append(record)
+
+        if record.over_budget:
+            message = (f"Turn {label!r} peaked at {record.peak_kb / 1024:.1f} MB, "
+                       f"over the {self.budget_kb / 1024:.1f} MB budget")
+            if enforce:
+                raise MemoryBudgetExceeded(message)
+            print(f"⚠️ {message}")
+
+    def report(self, top: int = TOP_SITES) -> str:
+        """Per-node averages, per-turn growth and the sites that grew most over all profiled turns."""
+        turns = list(self.turns)
+        if not turns:
+            return "No profiled turns."
+
+        lines = [f"🧠 Memory profile over {len(turns)} turn(s)"]
+        per_node = {}
+        for t in turns:
+            for name, stat in t.nodes.items():
+                per_node.setdefault(name, []).append(stat)
+        lines.append(f"   {'node':<14} {'calls':>5} {'avg net KB':>11} {'max peak KB':>12}")
+        for name, stats in per_node.items():
+            avg_net = sum(s["net_kb"] for s in stats) / len(stats)
+            max_peak = max(s["peak_kb"] for s in stats)
+            lines.append(f"   {name:<14} {len(stats):>5} {avg_net:>11.1f} {max_peak:>12.1f}")
+
+        retained = sum(t.retained_kb for t in turns)
+        lines.append(f"   Turn peak max: {max(t.peak_kb for t in turns):.1f} KB, "
+                     f"retained total: {retained:.1f} KB ({retained / len(turns):.1f} KB/turn)")
+        over = sum(t.over_budget for t in turns)
+        if self.budget_kb is not None:
+            lines.append(f"   Over budget ({self.budget_kb:.0f} KB): {over} turn(s)")
+
+        sites = {}
+        for t in turns:
+            for s in t.top_sites:
+                sites[s["site"]] = sites.get(s["site"], 0) + s["size_kb"]
+        lines.append("   Top growth sites:")
+        for site, kb in sorted(sites.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"     {kb:>9.1f} KB  {site}")
+        return "\n".join(lines)
+
+
+profiler = MemoryProfiler()
+
+
+def profile_node(name: str, fn):
+    """Wraps a graph node so its allocations are recorded while profiling is enabled."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return fn(*args, **kwargs)
+        return profiler.run_node(name, fn, *args, **kwargs)
+    return wrapper
+
+
+def enable_from_env():
+    """Enables profiling when AUTOINTEL_MEMPROFILE=1."""
+    if os.getenv("AUTOINTEL_MEMPROFILE") != "1":
+        return
+    budget = os.getenv("AUTOINTEL_MEMORY_BUDGET_MB")
+    profiler.enable(
+        frames=int(os.getenv("AUTOINTEL_MEMPROFILE_FRAMES", 10)),
+        budget_mb=float(budget) if budget else None,
+    )
+    print("🧠 Memory profiling enabled")
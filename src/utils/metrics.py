@@ -0,0 +1,313 @@
+"""
+Lightweight Prometheus instrumentation for the agent.
+
+A small in-process registry of counters and histograms rendered in the
+Prometheus text exposition format. Recording is a dict lookup and a few
+additions under a lock, so it stays on in every process; exporting is opt-in:
+
+    AUTOINTEL_METRICS_PORT=9464          serve http://host:9464/metrics
+    AUTOINTEL_METRICS_FILE=/var/lib/node_exporter/autointel.prom
+                                         rewrite the file every
+                                         AUTOINTEL_METRICS_INTERVAL seconds (15)
+
+What is recorded:
+- graph node latency and raised errors (instrument_node)
+- LLM call latency, errors and token counts (MetricsCallbackHandler)
+- retrieval top-k similarity scores (observe_retrieval)
+- outbound HTTP timings by host and status (observe_http)
+- Groq scheduler queue time, admission and quota (src/utils/llm_scheduler.py)
+- backend call outcomes, hedges and circuit breaker state (src/utils/resilience.py)
+- speculative prefetch hit rate and latency saved (src/agent/prefetch.py)
+- log records dropped by the non-blocking log queue (src/utils/log.py)
+- cross-encoder rerank time and pairs scored, cached or skipped (src/tools/rerank.py)
+"""
+import atexit
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(k, list(v)) for k, v in self.values.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self.lock:
+            self.values[key] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        metric = Gauge(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+NODE_LATENCY = registry.histogram("autointel_node_latency_seconds", "Graph node wall time", ["node"])
+NODE_ERRORS = registry.counter("autointel_node_errors_total", "Exceptions raised by graph nodes", ["node"])
+LLM_LATENCY = registry.histogram("autointel_llm_latency_seconds", "LLM call wall time", ["model"])
+LLM_ERRORS = registry.counter("autointel_llm_errors_total", "Failed LLM calls", ["model"])
+LLM_TOKENS = registry.counter("autointel_llm_tokens_total", "LLM tokens used", ["model", "kind"])
+RETRIEVAL_SCORE = registry.histogram(
+    "autointel_retrieval_score", "Similarity score of each top-k retrieved chunk", ["source"], SCORE_BUCKETS
+)
+HTTP_LATENCY = registry.histogram("autointel_http_request_seconds", "Outbound HTTP request time", ["host", "status"])
+HTTP_ERRORS = registry.counter("autointel_http_errors_total", "Outbound HTTP requests that raised", ["host"])
+LLM_QUEUE_SECONDS = registry.histogram(
+    "autointel_llm_queue_seconds", "Time LLM requests waited for Groq quota", ["priority"]
+)
+LLM_ADMISSION = registry.counter(
+    "autointel_llm_admission_total", "LLM requests by admission outcome (admitted, rejected, timed_out)",
+    ["priority", "outcome"]
+)
+LLM_QUEUE_DEPTH = registry.gauge("autointel_llm_queue_depth", "LLM requests waiting for Groq quota", ["priority"])
+LLM_QUOTA = registry.gauge("autointel_llm_quota_remaining", "Groq quota left in the scheduler's buckets", ["kind"])
+CIRCUIT_STATE = registry.gauge(
+    "autointel_circuit_state", "Circuit breaker state per backend (0 closed, 1 half-open, 2 open)", ["backend"]
+)
+BACKEND_CALLS = registry.counter(
+    "autointel_backend_calls_total",
+    "Guarded backend calls by outcome (ok, error, rejected, deadline, short_circuit)", ["backend", "outcome"]
+)
+HEDGES = registry.counter("autointel_hedged_requests_total", "Hedged duplicate requests (fired, won)", ["backend", "outcome"])
+PREFETCH = registry.counter(
+    "autointel_prefetch_total", "Speculative prefetches by outcome (hit, miss, wasted)", ["kind", "outcome"]
+)
+PREFETCH_SAVED = registry.histogram(
+    "autointel_prefetch_saved_seconds", "Wall time a prefetch hit took off the critical path", ["kind"]
+)
+LOG_DROPPED = registry.counter(
+    "autointel_log_dropped_total", "Log records dropped because the log queue was full"
+)
+RERANK_SECONDS = registry.histogram("autointel_rerank_seconds", "Cross-encoder forward pass time per search")
+RERANK_PAIRS = registry.counter(
+    "autointel_rerank_pairs_total", "Reranked (question, chunk) pairs by outcome (scored, cached, skipped)", ["outcome"]
+)
+
+
+def instrument_node(name: str, fn):
+    """Wraps a graph node to record its latency and any exception it raises."""
+    @wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(state, *args, **kwargs)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_LATENCY.observe(time.perf_counter() - start, node=name)
+    return wrapper
+
+
+def observe_retrieval(source: str, scores):
+    for score in scores:
+        RETRIEVAL_SCORE.observe(float(score), source=source)
+
+
+def observe_http(host: str, status, seconds: float):
+    if status is None:
+        HTTP_ERRORS.inc(host=host)
+    HTTP_LATENCY.observe(seconds, host=host, status=status if status is not None else "error")
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callback recording LLM latency, errors and token usage."""
+
+    def __init__(self):
+        self.runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def _start(self, run_id, serialized, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        model = (metadata.get("ls_model_name") or params.get("model_name") or params.get("model")
+                 or (serialized or {}).get("name", "unknown"))
+        self.runs[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, start = self.runs.pop(run_id, ("unknown", None))
+        if start is not None:
+            LLM_LATENCY.observe(time.perf_counter() - start, model=model)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, kind="prompt")
+            LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        model, start = self.runs.pop(run_id, ("unknown", None))
+        LLM_ERRORS.inc(model=model)
+        if start is not None:
+            LLM_LATENCY.observe(time.perf_counter() - start, model=model)
+
+
+metrics_callback = MetricsCallbackHandler()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves /metrics from a daemon thread."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics on http://{addr}:{port}/metrics")
+    return server
+
+
+def write_metrics_file(path):
+    """Atomically rewrites `path` with the current metrics (node_exporter textfile format)."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(registry.render())
+    os.replace(tmp, path)
+
+
+def _file_loop(path, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError as e:
+            print(f"⚠️ Metrics file write failed: {e}")
+
+
+_started = False
+
+
+def start_from_env():
+    """Starts the exporters configured by AUTOINTEL_METRICS_PORT / AUTOINTEL_METRICS_FILE."""
+    global _started
+    if _started:
+        return
+    _started = True
+
+    port = os.getenv("AUTOINTEL_METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+
+    path = os.getenv("AUTOINTEL_METRICS_FILE")
+    if path:
+        interval = float(os.getenv("AUTOINTEL_METRICS_INTERVAL", 15))
+        threading.Thread(target=_file_loop, args=(path, interval), name="metrics-file", daemon=True).start()
+        atexit.register(write_metrics_file, path)
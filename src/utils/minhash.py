@@ -0,0 +1,79 @@
+"""
+MinHash signatures and an LSH index for finding near-duplicate texts.
+
+A text becomes the set of its word shingles (runs of SHINGLE_SIZE words,
+lowercased, punctuation dropped). Its MinHash signature keeps, for each of
+NUM_PERM hash functions, the smallest hash over the shingles; the share of
+equal positions in two signatures estimates the Jaccard similarity of the
+shingle sets.
+
+The LSH index cuts signatures into `bands` bands of NUM_PERM / bands rows.
+Texts that agree on every row of some band are candidates, so pairs above
+roughly (1 / bands) ** (bands / NUM_PERM) similarity are found without
+comparing every pair. Candidates are then checked with the full signature.
+"""
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+BANDS = 16
+PRIME = (1 << 31) - 1  # Keeps a * x + b inside uint64
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str):
+        """uint64 array of NUM_PERM minimums, or None for a text without words."""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) % PRIME for g in grams), dtype=np.uint64, count=len(grams))
+        return ((np.outer(hashes, self.a) + self.b) % PRIME).min(axis=0)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} permutations don't split into {bands} bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+
+    def _keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key, signature):
+        for band, bucket in self._keys(signature):
+            self.buckets[band][bucket].append(key)
+
+    def candidates(self, signature) -> set:
+        """Keys sharing at least one band with `signature`."""
+        seen = set()
+        for band, bucket in self._keys(signature):
+            seen.update(self.buckets[band].get(bucket, ()))
+        return seen
@@ -0,0 +1,217 @@
+"""
+int8-quantized ONNX backend for the MiniLM embedding model.
+
+Runs the same sentence-transformers/all-MiniLM-L6-v2 model as the default
+PyTorch path, without importing PyTorch: the model is an ONNX graph with
+int8 weights, executed by onnxruntime on the CPU. Pooling matches the
+sentence-transformers pipeline: mean over tokens, then L2 normalization.
+
+Build the model once per machine (it downloads the exported model.onnx and
+tokenizer.json from the Hub and quantizes the weights):
+
+    python -m src.utils.onnx_embeddings export [--out .cache/onnx/all-MiniLM-L6-v2]
+
+Its dependencies are not in requirements.txt; install requirements-onnx.txt.
+
+The int8 vectors must match the PyTorch ones closely enough to search the
+index those built. benchmarks/bench_embeddings.py checks that and records
+the result as validation.json next to the model. The backend refuses to load
+a model without a passing record (re-exporting drops it), so run
+
+    python -m benchmarks.bench_embeddings --backends torch onnx
+
+before selecting it with EMBEDDING_BACKEND=onnx (see src.utils.embeddings).
+Settings:
+
+    EMBEDDING_ONNX_DIR     model directory (.cache/onnx/all-MiniLM-L6-v2)
+    EMBEDDING_THREADS      onnxruntime threads for the whole process (2)
+    EMBEDDING_BATCH_SIZE   texts per inference call (32)
+    EMBEDDING_ONNX_UNVALIDATED=1   load without a validation record (the benchmark's own run)
+
+Inference is serialized, so the thread budget holds however many workers
+embed at once. Concurrent embed_query calls are batched dynamically: queries
+that arrive while a batch runs go into the next batch together.
+
+benchmarks/bench_embeddings.py also compares speed, import time and memory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+SOURCE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_MODEL_DIR = BASE_DIR / ".cache" / "onnx" / "all-MiniLM-L6-v2"
+MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+VALIDATION_FILE = "validation.json"
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length in sentence-transformers
+
+
+def export_quantized(out_dir=DEFAULT_MODEL_DIR) -> Path:
+    """Downloads the exported fp32 model and tokenizer and writes an int8 copy to `out_dir`."""
+    from huggingface_hub import hf_hub_download
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = hf_hub_download(SOURCE_MODEL, "onnx/model.onnx")
+    tokenizer_path = hf_hub_download(SOURCE_MODEL, TOKENIZER_FILE)
+
+    # A new model needs its own comparison against the PyTorch vectors
+    (out_dir / VALIDATION_FILE).unlink(missing_ok=True)
+    quantize_dynamic(fp32_path, str(out_dir / MODEL_FILE), weight_type=QuantType.QInt8)
+    (out_dir / TOKENIZER_FILE).write_bytes(Path(tokenizer_path).read_bytes())
+    print(f"✅ Wrote {out_dir / MODEL_FILE} ({(out_dir / MODEL_FILE).stat().st_size / 1e6:.1f} MB)")
+    return out_dir
+
+
+def model_digest(model_dir) -> str:
+    digest = hashlib.sha1()
+    with open(Path(model_dir) / MODEL_FILE, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_validation(model_dir, min_cosine: float, mean_cosine: float, probes: int, tolerance: float):
+    """Writes the bench_embeddings comparison for the model in `model_dir`."""
+    record = {
+        "model_sha1": model_digest(model_dir),
+        "min_cosine": min_cosine,
+        "mean_cosine": mean_cosine,
+        "probes": probes,
+        "tolerance": tolerance,
+        "passed": min_cosine >= tolerance,
+    }
+    with open(Path(model_dir) / VALIDATION_FILE, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def check_validation(model_dir):
+    """Raises unless bench_embeddings recorded a passing comparison for this exact model file."""
+    path = Path(model_dir) / VALIDATION_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        raise FileNotFoundError(
+            f"The ONNX model in {model_dir} hasn't been checked against the PyTorch vectors; "
+            "run `python -m benchmarks.bench_embeddings --backends torch onnx` first"
+        )
+    if record.get("model_sha1") != model_digest(model_dir):
+        raise FileNotFoundError(f"{path} is for a different model file; re-run benchmarks.bench_embeddings")
+    if not record.get("passed"):
+        raise ValueError(f"The ONNX model in {model_dir} failed validation: min cosine "
+                         f"{record.get('min_cosine'):.4f} < {record.get('tolerance')}")
+
+
+class _QueryBatcher:
+    """Runs queued single texts through `encode` in batches on one worker thread."""
+
+    def __init__(self, encode, max_batch: int):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        threading.Thread(target=self._loop, name="embed-batcher", daemon=True).start()
+
+    def submit(self, text: str):
+        future = Future()
+        self.queue.put((text, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            # No waiting for stragglers: whatever queued up during the last batch goes now
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self.encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_dir=None, threads: int = None, batch_size: int = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir or os.getenv("EMBEDDING_ONNX_DIR", str(DEFAULT_MODEL_DIR)))
+        if not (model_dir / MODEL_FILE).exists():
+            raise FileNotFoundError(
+                f"No ONNX model in {model_dir}; run `python -m src.utils.onnx_embeddings export` first"
+            )
+        if os.getenv("EMBEDDING_ONNX_UNVALIDATED") != "1":
+            check_validation(model_dir)
+        self.model_dir = model_dir
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or int(os.getenv("EMBEDDING_THREADS", 2))
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_dir / MODEL_FILE), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        self.lock = threading.Lock()
+        self.batcher = _QueryBatcher(self._encode, self.batch_size)
+
+    def _encode(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        with self.lock:
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list) -> list:
+        # Similar lengths share a batch, so little of each batch is padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            ids = order[start:start + self.batch_size]
+            for i, vector in zip(ids, self._encode([texts[i] for i in ids])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self.batcher.submit(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the int8 ONNX embedding model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_p = sub.add_parser("export", help="Download and quantize the model")
+    export_p.add_argument("--out", default=str(DEFAULT_MODEL_DIR))
+    args = parser.parse_args()
+    export_quantized(args.out)
@@ -0,0 +1,311 @@
+"""
+Deadlines, hedged requests and circuit breakers for external calls.
+
+Calls to Groq, Pinecone, NHTSA and the review sites go through
+`guarded_call(backend, fn)`:
+
+- Deadline: each turn gets AUTOINTEL_TURN_BUDGET_S seconds. The router puts
+  the deadline in the graph state and graph.wrap_node makes it current while a
+  node runs. A call may take its backend's timeout but never more than what is
+  left of the turn, less `reserve` seconds kept for the safety check that runs
+  last. `fn(timeout)` gets that limit to pass on to its client, and the wait
+  is enforced here either way; a call past it raises DeadlineExceeded.
+  Code running inside an attempt can read `call_time_left()` to stay within
+  it (the Groq scheduler caps its queue wait with it).
+- Hedging: for idempotent reads (hedge=True) a duplicate request goes out when
+  the first has not answered within the backend's recent p95 latency (once
+  HEDGE_MIN_SAMPLES calls have been timed), or at once if the first fails.
+  At most one duplicate per call; the first response wins. A GuardError from
+  the first attempt isn't hedged, since the duplicate would be turned away too.
+- Circuit breaker: after AUTOINTEL_BREAKER_FAILURES consecutive failures a
+  backend is open and calls fail at once with CircuitOpen. After
+  AUTOINTEL_BREAKER_RESET_S seconds one trial call is let through (half-open),
+  and the circuit closes again if it succeeds. A GuardError raised inside the
+  call (e.g. the Groq scheduler's AdmissionRejected) means the backend was
+  never asked, so it counts neither way.
+
+Callers catch GuardError, the base of both errors, to answer from a cache or
+with a degraded message. `snapshot()` and the autointel_circuit_state,
+autointel_backend_calls_total and autointel_hedged_requests_total metrics
+expose the state.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+
+from src.utils.metrics import CIRCUIT_STATE, BACKEND_CALLS, HEDGES
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+TURN_BUDGET_S = float(os.getenv("AUTOINTEL_TURN_BUDGET_S", 25))
+TURN_RESERVE_S = 2.0        # Left for the safety check when a node calls out
+MIN_TIMEOUT_S = 0.5         # Below this a call isn't worth starting
+FAILURE_THRESHOLD = int(os.getenv("AUTOINTEL_BREAKER_FAILURES", 5))
+RESET_AFTER_S = float(os.getenv("AUTOINTEL_BREAKER_RESET_S", 30))
+HEDGE_MIN_SAMPLES = 20      # Latencies needed before the p95 is trusted
+HEDGE_MIN_DELAY_S = 0.05
+LATENCY_WINDOW = 200
+
+# Per-call ceilings, whatever the turn budget says
+BACKEND_TIMEOUTS = {
+    "groq": 30.0,
+    "pinecone": 10.0,
+    "nhtsa": 10.0,
+    "reviews": 15.0,
+}
+DEFAULT_TIMEOUT = 15.0
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+_deadline = ContextVar("autointel_turn_deadline", default=None)
+_call_deadline = ContextVar("autointel_call_deadline", default=None)
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="guarded")
+
+
+class GuardError(Exception):
+    """A call was not made or not answered in time; answer in a degraded way."""
+
+
+class DeadlineExceeded(GuardError, TimeoutError):
+    pass
+
+
+class CircuitOpen(GuardError):
+    pass
+
+
+def new_deadline(budget: float = None) -> float:
+    return time.monotonic() + (TURN_BUDGET_S if budget is None else budget)
+
+
+@contextmanager
+def turn_deadline(deadline: float):
+    """Makes `deadline` (a time.monotonic() value, or None) current for guarded calls."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_node(fn):
+    """Wraps a graph node so its calls are bounded by the turn deadline in the state."""
+    @wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        deadline = state.get("deadline") if isinstance(state, dict) else None
+        with turn_deadline(deadline):
+            return fn(state, *args, **kwargs)
+    return wrapper
+
+
+def time_left():
+    """Seconds left in the current turn, or None outside a turn."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_time_left():
+    """Seconds before the guard gives up on the current attempt, or None outside guarded_call."""
+    deadline = _call_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        CIRCUIT_STATE.set(STATE_VALUES[self.state], backend=self.name)
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_after:
+                    return False
+                self.state = "half_open"
+                self.trial_running = False
+                self._publish()
+            # Half-open: one trial call at a time
+            if self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def success(self):
+        with self.lock:
+            if self.state != "closed":
+                log.warning("circuit.closed", "   🟢 %s circuit closed", self.name)
+            self.state = "closed"
+            self.failures = 0
+            self.trial_running = False
+            self._publish()
+
+    def release(self):
+        """The call never reached the backend; frees a half-open trial without judging it."""
+        with self.lock:
+            self.trial_running = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                log.warning("circuit.open", "   🔴 %s circuit open after %s failure(s)", self.name, self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._publish()
+
+
+class Backend:
+    """Breaker, latency window and timeout ceiling for one external dependency."""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(name)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def p95(self):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def call_timeout(self, reserve: float) -> float:
+        left = time_left()
+        if left is None:
+            return self.timeout
+        left -= reserve
+        if left < MIN_TIMEOUT_S:
+            BACKEND_CALLS.inc(backend=self.name, outcome="deadline")
+            raise DeadlineExceeded(f"turn budget spent before calling {self.name}")
+        return min(self.timeout, left)
+
+    def _submit(self, fn, timeout: float):
+        def attempt():
+            start = time.monotonic()
+            # Runs in its own context copy, so no reset is needed
+            _call_deadline.set(start + timeout)
+            result = fn(timeout)
+            with self.lock:
+                self.latencies.append(time.monotonic() - start)
+            return result
+        # Each attempt gets its own copy so tracing callbacks keep their parent run
+        return _pool.submit(copy_context().run, attempt)
+
+    def call(self, fn, hedge: bool = False, reserve: float = TURN_RESERVE_S):
+        timeout = self.call_timeout(reserve)
+        if not self.breaker.allow():
+            BACKEND_CALLS.inc(backend=self.name, outcome="short_circuit")
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+
+        start = time.monotonic()
+        end = start + timeout
+        first = self._submit(fn, timeout)
+        pending = {first}
+        can_hedge = hedge and self.breaker.state == "closed"
+        hedge_at = None
+        if can_hedge:
+            p95 = self.p95()
+            if p95 is not None and p95 < timeout:
+                hedge_at = start + max(HEDGE_MIN_DELAY_S, p95)
+
+        error = None
+        while pending:
+            wake = end if hedge_at is None else min(end, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is not first:
+                        HEDGES.inc(backend=self.name, outcome="won")
+                    self.breaker.success()
+                    BACKEND_CALLS.inc(backend=self.name, outcome="ok")
+                    return future.result()
+                error = future.exception()
+
+            now = time.monotonic()
+            slow = hedge_at is not None and now >= hedge_at
+            failed = not pending and not isinstance(error, GuardError)
+            if can_hedge and (slow or failed) and now < end:
+                can_hedge, hedge_at = False, None
+                pending.add(self._submit(fn, end - now))
+                HEDGES.inc(backend=self.name, outcome="fired")
+            elif now >= end:
+                break
+
+        for future in pending:
+            future.cancel()
+        if pending:
+            self.breaker.failure()
+            BACKEND_CALLS.inc(backend=self.name, outcome="deadline")
+            raise DeadlineExceeded(f"{self.name} did not answer within {timeout:.1f}s")
+
+        if isinstance(error, GuardError):
+            # Turned away locally (e.g. Groq quota admission); the backend wasn't asked
+            self.breaker.release()
+            BACKEND_CALLS.inc(backend=self.name, outcome="rejected")
+            raise error
+        if isinstance(error, ValueError):
+            # The backend answered; the caller couldn't use the answer (e.g. parsing)
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+        BACKEND_CALLS.inc(backend=self.name, outcome="error")
+        raise error
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str) -> Backend:
+    """Returns the shared state for `name`; "reviews:<host>" uses the "reviews" timeout."""
+    with _backends_lock:
+        if name not in _backends:
+            timeout = BACKEND_TIMEOUTS.get(name.split(":")[0], DEFAULT_TIMEOUT)
+            _backends[name] = Backend(name, timeout)
+        return _backends[name]
+
+
+def guarded_call(backend: str, fn, hedge: bool = False, reserve: float = TURN_RESERVE_S):
+    """
+    Runs `fn(timeout)` against `backend` under its breaker and the turn deadline.
+    Only pass hedge=True for idempotent reads.
+    """
+    return get_backend(backend).call(fn, hedge=hedge, reserve=reserve)
+
+
+def snapshot() -> dict:
+    """Breaker state and recent latency per backend, for monitoring."""
+    with _backends_lock:
+        backends = list(_backends.values())
+    out = {}
+    for b in backends:
+        p95 = b.p95()
+        out[b.name] = {
+            "state": b.breaker.state,
+            "consecutive_failures": b.breaker.failures,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "samples": len(b.latencies),
+        }
+    return out
@@ -0,0 +1,149 @@
+import re
+from typing import NamedTuple, Optional, List
+
+# Canonical make names and the spellings users actually type
+MAKE_ALIASES = {
+    "acura": "acura",
+    "alfaromeo": "alfa romeo",
+    "audi": "audi",
+    "bmw": "bmw",
+    "buick": "buick",
+    "cadillac": "cadillac",
+    "chevrolet": "chevrolet", "chevy": "chevrolet",
+    "chrysler": "chrysler",
+    "dodge": "dodge",
+    "ferrari": "ferrari",
+    "fiat": "fiat",
+    "ford": "ford",
+    "genesis": "genesis",
+    "gmc": "gmc",
+    "honda": "honda",
+    "hyundai": "hyundai",
+    "infiniti": "infiniti",
+    "jaguar": "jaguar",
+    "jeep": "jeep",
+    "kia": "kia",
+    "lamborghini": "lamborghini",
+    "landrover": "land rover",
+    "lexus": "lexus",
+    "lincoln": "lincoln",
+    "mahindra": "mahindra",
+    "maruti": "maruti suzuki", "marutisuzuki": "maruti suzuki",
+    "mazda": "mazda",
+    "mercedes": "mercedes-benz", "mercedesbenz": "mercedes-benz", "benz": "mercedes-benz", "merc": "mercedes-benz",
+    "mini": "mini",
+    "mitsubishi": "mitsubishi",
+    "nissan": "nissan",
+    "porsche": "porsche",
+    "ram": "ram",
+    "rivian": "rivian",
+    "skoda": "skoda",
+    "subaru": "subaru",
+    "suzuki": "suzuki",
+    "tata": "tata",
+    "tesla": "tesla",
+    "toyota": "toyota",
+    "volkswagen": "volkswagen", "vw": "volkswagen",
+    "volvo": "volvo",
+}
+
+# Two-word makes are joined into one token before matching
+MULTI_WORD_MAKES = re.compile(r"\b(land)\s+(rover)\b|\b(alfa)\s+(romeo)\b|\b(mercedes)[\s\-]+(benz)\b|\b(maruti)\s+(suzuki)\b")
+
+# Words that end a model name
+STOP_WORDS = {
+    "vs", "versus", "or", "and", "compare", "comparison", "with", "review", "reviews",
+    "recall", "recalls", "the", "a", "an", "is", "are", "my", "for", "of", "to", "in",
+    "on", "which", "what", "how", "best", "better", "top", "worth", "should", "i",
+    "buy", "get", "it", "does", "do", "take", "any", "there", "about", "car", "cars",
+    "suv", "sedan", "truck", "owner", "manual", "vehicle", "specs", "price", "pricing",
+    "owners", "user", "users", "guide", "handbook", "this", "that", "your", "has", "have",
+}
+
+# Filler words ignored when keying queries that name no vehicle
+TOPIC_STOP_WORDS = {
+    "the", "a", "an", "is", "are", "what", "whats", "which", "how", "should", "i", "me",
+    "my", "for", "of", "to", "in", "on", "and", "or", "do", "does", "it", "you", "your",
+    "buy", "get", "please", "tell", "about", "car", "cars", "review", "reviews",
+}
+
+YEAR_RE = re.compile(r"\b(19[89]\d|20[0-4]\d)\b")
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-\.]*")
+
+
+class VehicleEntity(NamedTuple):
+    """A normalized make/model/year mention."""
+    make: str
+    model: Optional[str] = None
+    year: Optional[int] = None
+
+    @property
+    def base_model(self) -> Optional[str]:
+        """
+        First model word. The parser takes up to two words after the make and
+        the second is as likely the sentence's ("BMW X5 towing", "x5 reliable").
+        """
+        return self.model.split()[0] if self.model else None
+
+    def key(self, with_year: bool = True) -> str:
+        """Normalized "year make model" key, using the first model word only."""
+        parts = [str(self.year) if with_year and self.year else None, self.make, self.base_model]
+        return " ".join(p for p in parts if p)
+
+
+def extract_vehicles(text: str) -> List[VehicleEntity]:
+    """
+    Finds make/model/year mentions in free text using the alias table above.
+
+    A year is attached to the vehicle it directly precedes or follows; up to two
+    model tokens are taken after the make ("BMW 5 Series", "Hyundai Creta").
+    """
+    text = MULTI_WORD_MAKES.sub(lambda m: "".join(g for g in m.groups() if g), text.lower())
+    tokens = TOKEN_RE.findall(text)
+    entities = []
+    i = 0
+    while i < len(tokens):
+        make = MAKE_ALIASES.get(tokens[i])
+        if make is None:
+            i += 1
+            continue
+
+        year = None
+        if i > 0 and YEAR_RE.fullmatch(tokens[i - 1]):
+            year = int(tokens[i - 1])
+
+        j = i + 1
+        model_tokens = []
+        while j < len(tokens) and len(model_tokens) < 2:
+            tok = tokens[j]
+            if tok in STOP_WORDS or tok in MAKE_ALIASES:
+                break
+            if YEAR_RE.fullmatch(tok):
+                year = year or int(tok)
+                j += 1
+                break
+            model_tokens.append(tok.strip(".-"))
+            j += 1
+            if tok.endswith("."):
+                # End of sentence ends the model name
+                break
+        else:
+            if year is None and j < len(tokens) and YEAR_RE.fullmatch(tokens[j]):
+                year = int(tokens[j])
+                j += 1
+
+        entities.append(VehicleEntity(make, " ".join(model_tokens) or None, year))
+        i = j
+
+    # Keep first mention of each vehicle
+    unique = []
+    for entity in entities:
+        if entity not in unique:
+            unique.append(entity)
+    return unique
+
+
+def topic_key(text: str) -> str:
+    """Order-insensitive key of the meaningful words in a query without vehicle names."""
+    words = {t for t in TOKEN_RE.findall(text.lower()) if t not in TOPIC_STOP_WORDS and len(t) > 1}
+    return " ".join(sorted(words))
@@ -1,13 +1,78 @@
-# A sample 'Golden Dataset' for your automotive agent
-eval_samples = [
-    {
-        "question": "How do I reset the oil life on a 2024 Ford F-150?",
-        "ground_truth": "Navigate to the 'Vehicle' menu on the instrument cluster, select 'Oil Life', and hold the 'OK' button until it resets to 100%.",
-        "reference_context": "The 2024 F-150 manual states: 'To reset oil life, use the steering wheel controls to find Settings > Vehicle > Oil Life Reset and hold OK.'"
-    },
-    {
-        "question": "What does the solid red battery light mean?",
-        "ground_truth": "A solid red battery light indicates a fault in the charging system, meaning the battery is not being charged.",
-        "reference_context": "Dashboard lights section: 'Red Battery Icon: Charging system failure. The vehicle is running on battery power alone.'"
+"""
+Loader for the evaluation datasets in tests/eval_data.
+
+A dataset is a JSONL file with one sample per line:
+
+    {"id": "tire-pressure", "question": "...", "expected": "...",
+     "key_facts": ["240", "kPa"], "reference_context": "..."}
+
+Only `question` and `expected` are required (`ground_truth` is accepted as an
+alias of `expected`). CSV files with the same columns, `key_facts` encoded as a
+JSON list, and Parquet files (needs pyarrow) are read too. Samples are yielded
+lazily so regression sets of any size can be streamed.
+"""
+import csv
+import json
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent / "eval_data"
+DEFAULT_DATASET = DATA_DIR / "golden.jsonl"
+
+
+def _normalize(raw: dict, default_id: str) -> dict:
+    expected = raw.get("expected", raw.get("ground_truth"))
+    if not raw.get("question") or expected is None:
+        raise ValueError(f"Sample {raw.get('id', default_id)} needs 'question' and 'expected'")
+
+    key_facts = raw.get("key_facts") or []
+    if isinstance(key_facts, str):
+        key_facts = json.loads(key_facts)
+
+    return {
+        "id": str(raw.get("id") or default_id),
+        "question": raw["question"],
+        "expected": expected,
+        "key_facts": list(key_facts),
+        "reference_context": raw.get("reference_context") or "",
     }
-]
\ No newline at end of file
+
+
+def _iter_raw(path: Path):
+    if path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.suffix == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported dataset format: {path.suffix}")
+
+
+def iter_samples(path=DEFAULT_DATASET):
+    """Yields normalized samples; rows without an id get `<file stem>-<row>`."""
+    path = Path(path)
+    for n, raw in enumerate(_iter_raw(path), start=1):
+        yield _normalize(raw, f"{path.stem}-{n}")
+
+
+def iter_batches(path=DEFAULT_DATASET, batch_size: int = 64):
+    """Yields lists of up to `batch_size` samples."""
+    batch = []
+    for sample in iter_samples(path):
+        batch.append(sample)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_samples(path=DEFAULT_DATASET) -> list:
+    """Loads a whole dataset; use `iter_batches` for large regression sets."""
+    return list(iter_samples(path))
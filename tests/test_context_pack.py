@@ -0,0 +1,41 @@
+"""
+Unit tests for src/tools/context_pack.py: sentence splitting must not alter
+the figures the RAG prompt quotes.
+
+Usage: python -m pytest tests/test_context_pack.py
+"""
+from langchain_core.documents import Document
+
+from src.tools.context_pack import pack_context, _trim_to_tokens
+
+MANUAL = (
+    "Engine oil capacity is 4.5 L with the filter. "
+    "Brake pad minimum thickness: 1.0-1.1 mm (0.039-0.043 in.) at the inner pad. "
+    "Replace with part no. 58101-J9A00 or equivalent. "
+    "Tire pressure (cold) is 2.4 bar, approx. 35 psi, e.g. for the 2021 Creta 1.5L MPi.\n"
+    "Check it monthly!"
+)
+
+
+def doc(text, **metadata):
+    return Document(page_content=text, metadata={"source": "creta.pdf", "page": 1, **metadata})
+
+
+def test_numbers_and_abbreviations_come_through_unchanged():
+    context = pack_context([(doc(MANUAL), 0.9)], 1500)
+    assert context == f"Source: creta.pdf\nContent: {MANUAL}"
+    for fact in ("4.5 L", "1.0-1.1 mm (0.039-0.043 in.)", "58101-J9A00", "2.4 bar", "approx. 35 psi", "1.5L MPi"):
+        assert fact in context
+
+
+def test_repeated_sentences_are_dropped_without_touching_the_rest():
+    repeated = "Engine oil capacity is 4.5 L with the filter. Use SAE 0W-20 oil rated API SP."
+    other = doc(repeated, page=7)
+    context = pack_context([(doc(MANUAL), 0.9), (other, 0.5)], 1500)
+    assert context.count("Engine oil capacity is 4.5 L with the filter.") == 1
+    assert context.endswith("Content: Use SAE 0W-20 oil rated API SP.")
+
+
+def test_trim_stops_at_a_sentence_boundary():
+    trimmed = _trim_to_tokens(MANUAL, 30)
+    assert trimmed == "Engine oil capacity is 4.5 L with the filter."
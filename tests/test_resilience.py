@@ -0,0 +1,225 @@
+"""
+Unit tests for src/utils/resilience.py: circuit breaker, hedging and turn deadlines.
+
+Each test builds its own Backend, so the process-wide registry behind
+guarded_call is left alone.
+
+Usage: python -m pytest tests/test_resilience.py
+"""
+import threading
+import time
+
+import pytest
+
+from src.utils import resilience
+from src.utils.resilience import (
+    Backend, CircuitBreaker, CircuitOpen, DeadlineExceeded, GuardError,
+    call_time_left, new_deadline, time_left, turn_deadline,
+)
+
+
+def fail(timeout):
+    raise ConnectionError("backend down")
+
+
+def ok(timeout):
+    return "ok"
+
+
+def backend(timeout: float = 1.0, failures: int = 3, reset_after: float = 0.1) -> Backend:
+    b = Backend("test", timeout)
+    b.breaker = CircuitBreaker("test", failure_threshold=failures, reset_after=reset_after)
+    return b
+
+
+# --- Circuit breaker ---
+
+def test_breaker_opens_after_consecutive_failures():
+    b = backend(failures=3)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            b.call(fail)
+    assert b.breaker.state == "open"
+
+    called = []
+    with pytest.raises(CircuitOpen):
+        b.call(lambda timeout: called.append(timeout))
+    assert not called
+
+
+def test_success_resets_failure_count():
+    b = backend(failures=3)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            b.call(fail)
+    assert b.call(ok) == "ok"
+    with pytest.raises(ConnectionError):
+        b.call(fail)
+    assert b.breaker.state == "closed"
+
+
+def test_half_open_trial_closes_or_reopens():
+    b = backend(failures=1, reset_after=0.05)
+    with pytest.raises(ConnectionError):
+        b.call(fail)
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        b.call(fail)
+    assert b.breaker.state == "open"
+
+    time.sleep(0.06)
+    assert b.call(ok) == "ok"
+    assert b.breaker.state == "closed"
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_after=0)
+    breaker.failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_guard_error_inside_call_is_not_counted():
+    b = backend(failures=1, reset_after=0)
+
+    def rejected(timeout):
+        raise GuardError("turned away locally")
+
+    for _ in range(3):
+        with pytest.raises(GuardError):
+            b.call(rejected)
+    assert b.breaker.state == "closed"
+
+    # A rejected half-open trial frees the slot for the next call
+    with pytest.raises(ConnectionError):
+        b.call(fail)
+    with pytest.raises(GuardError):
+        b.call(rejected)
+    assert b.call(ok) == "ok"
+
+
+def test_value_error_means_the_backend_answered():
+    b = backend(failures=1)
+
+    def unparseable(timeout):
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        b.call(unparseable)
+    assert b.breaker.state == "closed"
+
+
+# --- Hedging ---
+
+def test_failed_first_attempt_is_hedged_without_latency_samples():
+    b = backend()
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            raise ConnectionError("reset by peer")
+        return "second"
+
+    assert b.call(flaky, hedge=True) == "second"
+    assert len(attempts) == 2
+
+
+def test_slow_first_attempt_is_hedged_after_p95():
+    b = backend(timeout=2.0)
+    b.latencies.extend([0.01] * resilience.HEDGE_MIN_SAMPLES)
+    attempts = []
+    lock = threading.Lock()
+
+    def slow_then_fast(timeout):
+        with lock:
+            attempts.append(timeout)
+            first = len(attempts) == 1
+        if first:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert b.call(slow_then_fast, hedge=True) == "fast"
+    assert time.monotonic() - start < 0.5
+    assert len(attempts) == 2
+
+
+def test_at_most_one_hedge_and_none_without_hedge_flag():
+    b = backend(failures=10)
+    attempts = []
+
+    def counted_fail(timeout):
+        attempts.append(timeout)
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        b.call(counted_fail, hedge=True)
+    assert len(attempts) == 2
+
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        b.call(counted_fail)
+    assert len(attempts) == 1
+
+
+def test_guard_error_is_not_hedged():
+    b = backend()
+    attempts = []
+
+    def rejected(timeout):
+        attempts.append(timeout)
+        raise GuardError("turned away locally")
+
+    with pytest.raises(GuardError):
+        b.call(rejected, hedge=True)
+    assert len(attempts) == 1
+
+
+# --- Deadlines ---
+
+def test_no_deadline_outside_a_turn():
+    assert time_left() is None
+    assert call_time_left() is None
+    assert backend(timeout=1.5).call(lambda timeout: timeout) == 1.5
+
+
+def test_timeout_is_capped_by_the_turn_less_reserve():
+    b = backend(timeout=30.0)
+    with turn_deadline(new_deadline(5.0)):
+        timeout = b.call(lambda timeout: timeout, reserve=2.0)
+    assert 2.5 < timeout <= 3.0
+
+
+def test_attempt_sees_its_own_call_deadline():
+    b = backend(timeout=1.0)
+    left = b.call(lambda timeout: call_time_left())
+    assert 0.9 < left <= 1.0
+    assert call_time_left() is None
+
+
+def test_spent_turn_raises_before_calling():
+    b = backend()
+    called = []
+    with turn_deadline(new_deadline(1.0)):
+        with pytest.raises(DeadlineExceeded):
+            b.call(lambda timeout: called.append(timeout), reserve=2.0)
+    assert not called
+    assert b.breaker.failures == 0
+
+
+def test_slow_call_raises_deadline_exceeded_and_counts_as_failure():
+    b = backend(timeout=0.1)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        b.call(lambda timeout: time.sleep(0.5))
+    assert time.monotonic() - start < 0.4
+    assert b.breaker.failures == 1
+
+
+def test_deadline_node_makes_the_state_deadline_current():
+    node = resilience.deadline_node(lambda state: time_left())
+    left = node({"deadline": new_deadline(10.0)})
+    assert 9.5 < left <= 10.0
+    assert node({}) is None